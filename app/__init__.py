@@ -1,6 +1,10 @@
+import os
 from flask import Flask
 from flask_login import LoginManager
 from app.controller import CinemaController
+from app.models import Base, DATABASE_DIRECTORY, SCREENING_SEATS_DIRECTORY
+from app.shared import SharedSeatState
+from app.storage import SQLiteStorage, WriteBehindStorage
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
 
@@ -13,10 +17,39 @@ bcrypt = Bcrypt(app)
 app.secret_key = 'somesecretkeythatonlyishouldknow'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Several worker processes (e.g. gunicorn -w 4) sharing the seat state through the SQLite database (see shared.py)
+app.config['SHARED_STATE'] = os.environ.get('CINEMA_SHARED_STATE') == '1'
+# Storage backend: 'json' (default) or 'sqlite' (default and required with shared state)
+app.config['STORAGE_BACKEND'] = os.environ.get('CINEMA_STORAGE_BACKEND', 'sqlite' if app.config['SHARED_STATE'] else 'json')
+app.config['SQLITE_DATABASE'] = os.environ.get('CINEMA_SQLITE_DATABASE', 'app/database/cinema.db')
+# JSON backend: seconds between background flushes, or synchronous writes (e.g. for tests)
+app.config['WRITE_BEHIND_INTERVAL'] = float(os.environ.get('CINEMA_WRITE_BEHIND_INTERVAL', '1.0'))
+app.config['SYNCHRONOUS_WRITES'] = os.environ.get('CINEMA_SYNCHRONOUS_WRITES') == '1'
+# Optional pickle snapshot of the loaded data for fast worker starts, e.g. 'app/database/cinema.snapshot'
+app.config['DATABASE_SNAPSHOT'] = os.environ.get('CINEMA_DATABASE_SNAPSHOT')
+
+if app.config['SHARED_STATE'] and app.config['STORAGE_BACKEND'] != 'sqlite':
+    raise ValueError("CINEMA_SHARED_STATE requires the sqlite storage backend")
+
+if app.config['STORAGE_BACKEND'] == 'sqlite':
+    Base.use_storage(SQLiteStorage(app.config['SQLITE_DATABASE'], data_directory=DATABASE_DIRECTORY,
+                                   document_directories=[SCREENING_SEATS_DIRECTORY],
+                                   log_changes=app.config['SHARED_STATE']))
+else:
+    Base.use_storage(WriteBehindStorage(interval=app.config['WRITE_BEHIND_INTERVAL'],
+                                        synchronous=app.config['SYNCHRONOUS_WRITES']))
+
+# Created before the data is loaded, so that changes made by other workers during the load are not missed
+shared_seat_state = SharedSeatState(app.config['SQLITE_DATABASE']) if app.config['SHARED_STATE'] else None
 
 # Create an instance of CinemaController and load the database during application startup
 LincolnCinema = CinemaController()
-LincolnCinema.load_database()
+if app.config['DATABASE_SNAPSHOT']:
+    LincolnCinema.load_database_cached(app.config['DATABASE_SNAPSHOT'])
+else:
+    LincolnCinema.load_database()
+if shared_seat_state is not None:
+    LincolnCinema.use_shared_state(shared_seat_state)
 print(LincolnCinema.all_halls)
 print(LincolnCinema.all_customers)
 
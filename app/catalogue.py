@@ -0,0 +1,406 @@
+"""! @brief Movie Catalogue"""
+
+##
+# @file catalogue.py
+#
+# @brief Movie Catalogue Query Engine for Cinema System
+#
+# @section description_catalogue Description
+# The catalogue.py module contains the MovieCatalogue class, which indexes the movies kept by
+# the CinemaController and answers movie queries with all criteria at once:
+#
+# - Facet indexes map each language and genre (case-insensitive) to the IDs of its movies.
+# - A sorted (release date, movie ID) list answers release date ranges with bisect.
+# - Title criteria use the TitleSearchIndex of search.py.
+# - Facet counts map each language and genre (case-insensitive) to its number of movies, over all
+#   movies and over the active ones, for the filter dropdowns. Each value is shown in its most
+#   common spelling, so "English" and "english" are one dropdown entry.
+#
+# The module also contains the ResultCache class, a bounded LRU cache of query results that
+# are only valid for the catalogue version they were computed at.
+#
+# A query estimates how many movies each criterion matches (facet sizes, the date range width
+# and the title trigram postings) and takes the candidates of the most selective one. Those are
+# intersected with the ID sets of the other facets and checked against the remaining criteria.
+# Results can be sorted by relevance, title, release date or movie ID and paginated with offset
+# and limit.
+#
+# @section notes_catalogue Notes
+# - The catalogue is updated incrementally; the controller calls add from add_movie and update
+#   from cancel_movie.
+#
+# @section author_cinema Author
+# Created by Elaine Xu on 28/09/2023
+
+# Imports
+from collections import OrderedDict
+import bisect
+import heapq
+import threading
+
+from .search import TitleSearchIndex, normalise
+
+
+## Sort orders accepted by MovieCatalogue.query.
+SORT_ORDERS = ("relevance", "title", "release_date", "id")
+
+## Facets indexed by the catalogue (movie attributes with a single value each).
+FACETS = ("language", "genre")
+
+
+def date_key(value):
+    """! Get the sort key of a release date given as a date or an ISO date string.
+    @param value (date|str): The date.
+    @return (str): The date as "YYYY-MM-DD".
+    """
+    return str(value)[:10]
+
+
+class MovieCatalogue:
+    """! The MovieCatalogue class: Facet, release date and title indexes over the movies, with a query API."""
+
+    def __init__(self):
+        """! Constructor for the MovieCatalogue class."""
+        self.__movies = {}              # movie ID -> movie
+        self.__titles = {}              # movie ID -> normalised title, for sorting
+        self.__facets = {facet: {} for facet in FACETS}   # facet -> normalised value -> set of movie IDs
+        self.__facet_values = {}        # movie ID -> {facet: value as entered}
+        self.__facet_counts = {(facet, active_only): {} for facet in FACETS for active_only in (False, True)}
+                                        # (facet, active only) -> normalised value -> number of movies
+        self.__spellings = {facet: {} for facet in FACETS}   # facet -> normalised value -> {value as entered: number of movies}
+        self.__facet_lists = {}         # (facet, active only) -> (sorted normalised values, their spellings), until the values change
+        self.__release_dates = []       # sorted (release date, movie ID)
+        self.__release_date_of = {}     # movie ID -> release date key
+        self.__needs_sort = False       # entries were appended to the release date list
+        self.__active = set()           # IDs of the active movies
+        self.__title_index = TitleSearchIndex()
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        """! Pickle the catalogue without its lock (see CinemaController.save_snapshot)."""
+        state = self.__dict__.copy()
+        del state["_MovieCatalogue__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__movies)
+
+    @property
+    def title_index(self):
+        """! Get the title search index of the catalogue.
+        @return (TitleSearchIndex): The title search index.
+        """
+        return self.__title_index
+
+    # ========== maintenance ==========
+    def add(self, movie):
+        """! Add a movie to the catalogue, or re-index it if it is already there.
+        @param movie (Movie): The movie to add.
+        """
+        with self.__lock:
+            self.__remove(movie.id)
+            self.__movies[movie.id] = movie
+            self.__titles[movie.id] = normalise(movie.title)
+            values = self.__values_of(movie)
+            self.__facet_values[movie.id] = values
+            for facet, value in values.items():
+                self.__facets[facet].setdefault(normalise(value), set()).add(movie.id)
+                self.__spell(facet, value, 1)
+                self.__count(facet, value, False, 1)
+                if movie.is_active:
+                    self.__count(facet, value, True, 1)
+            release_date = date_key(movie.release_date)
+            self.__release_date_of[movie.id] = release_date
+            self.__release_dates.append((release_date, movie.id))
+            self.__needs_sort = True
+            if movie.is_active:
+                self.__active.add(movie.id)
+        self.__title_index.add(movie)
+
+    def update(self, movie):
+        """! Update the catalogue after a movie changed, e.g. was archived.
+        @param movie (Movie): The movie that changed.
+        """
+        with self.__lock:
+            values = self.__facet_values.get(movie.id)
+            unchanged = (values == self.__values_of(movie)
+                         and self.__release_date_of.get(movie.id) == date_key(movie.release_date))
+            if unchanged and movie.is_active != (movie.id in self.__active):
+                for facet, value in values.items():
+                    self.__count(facet, value, True, 1 if movie.is_active else -1)
+                if movie.is_active:
+                    self.__active.add(movie.id)
+                else:
+                    self.__active.discard(movie.id)
+        if unchanged:
+            self.__title_index.update(movie)
+        else:
+            self.add(movie)
+
+    def remove(self, movie):
+        """! Remove a movie from the catalogue.
+        @param movie (Movie): The movie to remove.
+        """
+        with self.__lock:
+            self.__remove(movie.id)
+        self.__title_index.remove(movie)
+
+    def __remove(self, movie_id):
+        """! Remove a movie from the facet and release date indexes; the caller holds the lock.
+        @param movie_id (int): The ID of the movie to remove.
+        """
+        if self.__movies.pop(movie_id, None) is None:
+            return
+        del self.__titles[movie_id]
+        for facet, value in self.__facet_values.pop(movie_id).items():
+            movie_ids = self.__facets[facet][normalise(value)]
+            movie_ids.discard(movie_id)
+            if not movie_ids:
+                del self.__facets[facet][normalise(value)]
+            self.__spell(facet, value, -1)
+            self.__count(facet, value, False, -1)
+            if movie_id in self.__active:
+                self.__count(facet, value, True, -1)
+        self.__sort()
+        entry = (self.__release_date_of.pop(movie_id), movie_id)
+        index = bisect.bisect_left(self.__release_dates, entry)
+        if index < len(self.__release_dates) and self.__release_dates[index] == entry:
+            del self.__release_dates[index]
+        self.__active.discard(movie_id)
+
+    @staticmethod
+    def __values_of(movie):
+        """! Get the facet values of a movie.
+        @param movie (Movie): The movie.
+        @return (dict): The value of each facet, as entered.
+        """
+        return {facet: str(getattr(movie, facet)) for facet in FACETS}
+
+    def __count(self, facet, value, active_only, delta):
+        """! Change the number of movies with a facet value (case-insensitive); the caller holds the lock.
+        @param facet (str): The facet.
+        @param value (str): The value, as entered.
+        @param active_only (bool): Whether to change the count of active movies, or of all movies.
+        @param delta (int): The change, 1 or -1.
+        """
+        counts = self.__facet_counts[(facet, active_only)]
+        key = normalise(value)
+        count = counts.get(key, 0) + delta
+        if count > 0:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
+        if count in (0, 1):
+            # A value appeared or disappeared
+            self.__facet_lists.pop((facet, active_only), None)
+
+    def __spell(self, facet, value, delta):
+        """! Change the number of movies that spell a facet value this way; the caller holds the lock.
+        @param facet (str): The facet.
+        @param value (str): The value, as entered.
+        @param delta (int): The change, 1 or -1.
+        """
+        key = normalise(value)
+        spellings = self.__spellings[facet].setdefault(key, {})
+        shown = self.__display(spellings)
+        count = spellings.get(value, 0) + delta
+        if count > 0:
+            spellings[value] = count
+        else:
+            spellings.pop(value, None)
+        if not spellings:
+            del self.__spellings[facet][key]
+        elif self.__display(spellings) != shown:
+            for active_only in (False, True):
+                self.__facet_lists.pop((facet, active_only), None)
+
+    @staticmethod
+    def __display(spellings):
+        """! Get the spelling a facet value is shown in: the most common one, then the first in sort order.
+        @param spellings (dict): The number of movies by spelling.
+        @return (str): The spelling, or None if there are none.
+        """
+        return min(spellings, key=lambda spelling: (-spellings[spelling], spelling), default=None)
+
+    def __sort(self):
+        """! Sort the release date list if entries were appended; the caller holds the lock."""
+        if self.__needs_sort:
+            self.__release_dates.sort()
+            self.__needs_sort = False
+
+    # ========== queries ==========
+    def facet_counts(self, facet, active_only=False):
+        """! Get the number of movies with each value of a facet.
+        @param facet (str): "language" or "genre".
+        @param active_only (bool): Whether to count the active movies only.
+        @return (dict): The number of movies by value (case-insensitive, in its most common spelling); a copy, in value order.
+        """
+        with self.__lock:
+            counts = self.__facet_counts[(facet, active_only)]
+            keys, values = self.__values(facet, active_only)
+            return {value: counts[key] for key, value in zip(keys, values)}
+
+    def facet_values(self, facet, active_only=False):
+        """! Get the sorted distinct values of a facet. The list is kept until a value appears or disappears.
+        @param facet (str): "language" or "genre".
+        @param active_only (bool): Whether to consider the active movies only.
+        @return (tuple): The values (case-insensitive, each in its most common spelling).
+        """
+        with self.__lock:
+            return self.__values(facet, active_only)[1]
+
+    def __values(self, facet, active_only):
+        """! Get the sorted distinct normalised values of a facet and their spellings; the caller holds the lock."""
+        entry = self.__facet_lists.get((facet, active_only))
+        if entry is None:
+            keys = tuple(sorted(self.__facet_counts[(facet, active_only)]))
+            spellings = self.__spellings[facet]
+            entry = (keys, tuple(self.__display(spellings[key]) for key in keys))
+            self.__facet_lists[(facet, active_only)] = entry
+        return entry
+
+    def query(self, title=None, language=None, genre=None, date_from=None, date_to=None,
+              active_only=False, sort="relevance", descending=False, offset=0, limit=None):
+        """! Find the movies matching all of the given criteria.
+        @param title (str): Text the title must contain (case-insensitive), or None.
+        @param language (str): The language (case-insensitive), or None for all languages.
+        @param genre (str): The genre (case-insensitive), or None for all genres.
+        @param date_from (date|str): The earliest release date, or None.
+        @param date_to (date|str): The latest release date, or None.
+        @param active_only (bool): Whether to leave archived movies out.
+        @param sort (str): One of SORT_ORDERS. "relevance" ranks title matches (exact, prefix, word prefix,
+        substring) and falls back to movie ID order without a title.
+        @param descending (bool): Whether to reverse the sort order.
+        @param offset (int): The number of results to skip.
+        @param limit (int): The maximum number of results (all if not given).
+        @return (list): The matching movies of the requested page.
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order {sort!r}, expected one of {SORT_ORDERS}")
+        title = normalise(title)
+        title_estimate = self.__title_index.estimate(title) if title else None
+
+        with self.__lock:
+            self.__sort()
+            # Each criterion: (estimated number of matches, candidate IDs, check of a single movie ID,
+            # and the set of matching IDs where the index keeps one, to intersect with instead of checking)
+            criteria = []
+            for facet, value in (("language", language), ("genre", genre)):
+                if value:
+                    movie_ids = self.__facets[facet].get(normalise(value), set())
+                    criteria.append((len(movie_ids), lambda movie_ids=movie_ids: movie_ids, None, movie_ids))
+            if date_from or date_to:
+                low = date_key(date_from) if date_from else ""
+                high = date_key(date_to) if date_to else "9999-12-31"
+                start = bisect.bisect_left(self.__release_dates, (low,))
+                end = bisect.bisect_left(self.__release_dates, (high + "~",))
+                criteria.append((max(end - start, 0),
+                                 lambda start=start, end=end: [movie_id for _, movie_id in self.__release_dates[start:end]],
+                                 lambda movie_id: low <= self.__release_date_of[movie_id] <= high, None))
+            if title:
+                def title_candidates():
+                    return self.__title_index.matching_ids(title)
+                criteria.append((title_estimate, title_candidates,
+                                 lambda movie_id: self.__title_index.title_contains(movie_id, title), None))
+            if active_only:
+                active = self.__active
+                criteria.append((len(active), lambda: active, None, active))
+
+            if criteria:
+                criteria.sort(key=lambda criterion: criterion[0])
+                candidates = criteria[0][1]()
+                members = [movie_ids for _, _, _, movie_ids in criteria[1:] if movie_ids is not None]
+                if members:
+                    candidates = set(candidates).intersection(*members)
+                checks = [check for _, _, check, movie_ids in criteria[1:] if movie_ids is None]
+                movie_ids = [movie_id for movie_id in candidates if all(check(movie_id) for check in checks)]
+            else:
+                movie_ids = list(self.__movies)
+
+            if sort == "relevance" and title:
+                key = lambda movie_id: self.__title_index.rank_key(movie_id, title)
+            elif sort == "title":
+                key = lambda movie_id: (self.__titles[movie_id], movie_id)
+            elif sort == "release_date":
+                key = lambda movie_id: (self.__release_date_of[movie_id], movie_id)
+            else:
+                key = None
+
+            if limit is not None and not descending:
+                page = heapq.nsmallest(offset + limit, movie_ids, key=key)[offset:]
+            elif limit is not None:
+                page = heapq.nlargest(offset + limit, movie_ids, key=key)[offset:]
+            else:
+                page = sorted(movie_ids, key=key, reverse=descending)[offset:]
+            return [self.__movies[movie_id] for movie_id in page]
+
+
+class ResultCache:
+    """! The ResultCache class: A bounded LRU cache of results tagged with the catalogue version they were computed at."""
+
+    def __init__(self, max_size=256):
+        """! Constructor for the ResultCache class.
+        @param max_size (int): The maximum number of results kept; the least recently used ones are dropped first.
+        """
+        self.__max_size = max_size
+        self.__entries = OrderedDict()  # key -> (version, result), least recently used first
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        """! Pickle the cache settings only; cached results are not kept in snapshots."""
+        return {"_ResultCache__max_size": self.__max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["_ResultCache__max_size"])
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, version):
+        """! Get a cached result.
+        @param key (tuple): The key of the result.
+        @param version (int): The current catalogue version; results of older versions are stale.
+        @return (object): The result, or None if it is not cached or stale.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.__entries[key]
+            self.__misses += 1
+            return None
+
+    def put(self, key, version, result):
+        """! Cache a result, dropping the least recently used one if the cache is full.
+        @param key (tuple): The key of the result.
+        @param version (int): The catalogue version the result was computed at.
+        @param result (object): The result (not None).
+        """
+        with self.__lock:
+            self.__entries[key] = (version, result)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        """! Drop all cached results and reset the counters."""
+        with self.__lock:
+            self.__entries.clear()
+            self.__hits = self.__misses = 0
+
+    def stats(self):
+        """! Get the cache counters.
+        @return (dict): The number of hits and misses, the number of cached results and the maximum size.
+        """
+        with self.__lock:
+            return {"hits": self.__hits, "misses": self.__misses,
+                    "size": len(self.__entries), "max_size": self.__max_size}
@@ -62,7 +62,19 @@
 
 
 # Imports
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+import hashlib
+import json
+import os
+import pickle
+import threading
 from .models import *
+from .catalogue import MovieCatalogue, ResultCache, date_key
+from .locks import ReadWriteLock
+from .timers import TimerWheel
+from .search import normalise
 
 
 class CinemaController:
@@ -78,8 +90,55 @@ class CinemaController:
         self.__halls = []
         self.__coupons = []
         self.__payments = []
+        self.__load_timings = {}
+        # Username registry: username -> (user, role), plus one username -> user map per role
+        self.__users = {}
+        self.__users_by_role = {role: {} for role in self.USER_ROLES}
+        # Screening and booking indexes, maintained by add_screening, add_booking and the booking status updates
+        self.__screenings = {}              # screening_id -> Screening
+        self.__bookings = {}                # booking_id -> Booking, in booking order
+        self.__screening_bookings = {}      # screening_id -> {booking_id: Booking}
+        self.__bookings_by_status = {}      # status -> {booking_id: Booking}
+        self.__indexed_status = {}          # booking_id -> status the booking is indexed under
+        # Facet, release date and title indexes over all movies, including archived ones
+        self.__catalogue = MovieCatalogue()
+        # Movie filter results by (normalised criteria, user role), valid while the catalogue version is unchanged;
+        # the version is bumped by every movie and screening change
+        self.__catalogue_version = 0
+        self.__filter_cache = ResultCache(self.FILTER_CACHE_SIZE)
+        # Seat holds of pending bookings: booking_id -> Booking, expired by the timer wheel (see hold_seats)
+        self.__seat_holds = {}
+        self.__hold_timers = TimerWheel()
+        # Seat state shared with other worker processes (see use_shared_state), None for a single process
+        self.__shared = None
+        self.__next_hold_sweep = 0
+        # Held shared while a request is served, and exclusively while the data is replaced (see reload_database)
+        self.__request_lock = ReadWriteLock()
+        # Serialises applying the changes of other worker processes (see sync_shared_state)
+        self.__sync_lock = threading.Lock()
     
 
+    # Bumped whenever the pickled object layout changes, so old snapshots are not loaded
+    SNAPSHOT_FORMAT = 20
+    # Maximum number of movie filter results kept in the filter cache
+    FILTER_CACHE_SIZE = 256
+    # Number of seconds the seats of a pending booking are held for its payment
+    SEAT_HOLD_SECONDS = 600
+    # User roles in lookup priority order, for usernames that exist under more than one role
+    USER_ROLES = ("customer", "admin", "staff")
+    # ID counters of the models numbered in load order, as they are before the first load (see reload_database)
+    FIRST_IDS = {model: model.next_id for model in (Movie, Screening, Booking, Notification)}
+    # Shared ID counter of each model numbered with next_id (see use_shared_state)
+    SHARED_ID_COUNTERS = {Movie: "movies", Screening: "screenings", Booking: "bookings", Notification: "notifications"}
+    # Attributes that belong to this process rather than to the loaded data, kept by reload_database
+    PROCESS_ATTRIBUTES = ("seat_holds", "hold_timers", "shared", "next_hold_sweep", "request_lock", "sync_lock")
+    # Tables whose changed rows sync_shared_state applies to the objects in memory, in the order they link up;
+    # a change of any other table reloads the data
+    SYNCED_TABLES = (CUSTOMER_FILENAME, MOVIES_FILENAME, SCREENINGS_FILENAME, PAYMENTS_FILENAME, BOOKINGS_FILENAME,
+                     NOTIFICATION_FILENAME)
+    # Synced tables that are also saved as a whole (e.g. by cancel_movie), which sync_shared_state then reads in full
+    WHOLE_SYNCED_TABLES = (MOVIES_FILENAME, SCREENINGS_FILENAME)
+
     # =========== Methods to get controller object list ==========
     @property
     def all_admins(self):
@@ -137,17 +196,30 @@ class CinemaController:
         return self.__payments
 
 
+    @property
+    def all_bookings(self):
+        """! Get a list of all bookings of all customers, in booking order.
+        @return (list): A list of all booking objects.
+        """
+        return list(self.__bookings.values())
+
+
 
     # ============ methods to find objects from controller ============
+    def find_user(self, username: str):
+        """! Find a user of any role by its username with a single registry lookup.
+        @param username (str): The username to search for.
+        @return (tuple): The (user, role) pair, role being "customer", "admin" or "staff", or (None, None) if not found.
+        """
+        return self.__users.get(username, (None, None))
+
+
     def find_admin(self, username: str):
         """! Find an admin by its username.
         @param username (str): The ID to search for.
         @return (Customer): The admin object if found, or None.
         """
-        for admin in self.all_admins:
-            if admin.username == username:
-                return admin
-        return None
+        return self.__users_by_role["admin"].get(username)
     
 
     def find_staff(self, username: str):
@@ -155,10 +227,7 @@ class CinemaController:
         @param username (str): The ID to search for.
         @return (Customer): The staff object if found, or None.
         """
-        for staff in self.all_front_desk_staffs:
-            if staff.username == username:
-                return staff
-        return None
+        return self.__users_by_role["staff"].get(username)
     
 
     def find_customer(self, username: str):
@@ -166,10 +235,39 @@ class CinemaController:
         @param username (str): The ID to search for.
         @return (Customer): The customer object if found, or None.
         """
-        for customer in self.all_customers:
-            if customer.username == username:
-                return customer
-        return None
+        return self.__users_by_role["customer"].get(username)
+
+
+    def find_screening(self, screening_id):
+        """! Find a screening of any movie by its ID.
+        @param screening_id (int): The ID of the screening to find.
+        @return (Screening): The screening object if found, or None.
+        """
+        return self.__screenings.get(int(screening_id))
+
+
+    def find_booking(self, booking_id):
+        """! Find a booking of any customer by its ID.
+        @param booking_id (int): The ID of the booking to find.
+        @return (Booking): The booking object if found, or None.
+        """
+        return self.__bookings.get(int(booking_id))
+
+
+    def find_screening_bookings(self, screening_id):
+        """! Find all bookings made for a screening.
+        @param screening_id (int): The ID of the screening.
+        @return (list): The bookings of the screening, in booking order.
+        """
+        return list(self.__screening_bookings.get(int(screening_id), {}).values())
+
+
+    def find_bookings_by_status(self, status):
+        """! Find all bookings with a status.
+        @param status (str): The booking status, e.g. 'Pending', 'Paid', 'Canceled' or 'Refunded'.
+        @return (list): The bookings with the status.
+        """
+        return list(self.__bookings_by_status.get(status, {}).values())
 
 
     def find_movie(self, movie_id: int):
@@ -216,26 +314,36 @@ class CinemaController:
         return None
     
         
-    def get_language_list(self):
+    def get_language_list(self, active_only=False):
         """! Get a list of unique languages from the movies.
-        @return: A list of unique languages used in the movies.
+        @param active_only (bool): Whether to consider the active movies only.
+        @return: A sorted list of unique languages used in the movies.
         """
-        language_list = []
-        for movie in self.all_movies:
-            if movie.language not in language_list:
-                language_list.append(movie.language)
-        return language_list
+        return list(self.__catalogue.facet_values("language", active_only))
     
 
-    def get_genre_list(self):
+    def get_genre_list(self, active_only=False):
         """! Get a list of unique genres from the movies.
-        @return: A list of unique genres used in the movies.
+        @param active_only (bool): Whether to consider the active movies only.
+        @return: A sorted list of unique genres used in the movies.
         """
-        genre_list = []
-        for movie in self.all_movies:
-            if movie.genre not in genre_list:
-                genre_list.append(movie.genre)
-        return genre_list
+        return list(self.__catalogue.facet_values("genre", active_only))
+
+
+    def get_language_counts(self, active_only=False):
+        """! Get the number of movies in each language, maintained by add_movie and cancel_movie.
+        @param active_only (bool): Whether to count the active movies only.
+        @return (dict): The number of movies by language, in language order.
+        """
+        return self.__catalogue.facet_counts("language", active_only)
+
+
+    def get_genre_counts(self, active_only=False):
+        """! Get the number of movies in each genre, maintained by add_movie and cancel_movie.
+        @param active_only (bool): Whether to count the active movies only.
+        @return (dict): The number of movies by genre, in genre order.
+        """
+        return self.__catalogue.facet_counts("genre", active_only)
 
 
     def find_screening_by_date_and_time(self, movie, screening_date, start_time):
@@ -262,11 +370,37 @@ class CinemaController:
 
 
     # ========== methods to append new object ===========
+    def user_role(self, user):
+        """! Get the role of a user.
+        @param user: The user, or None.
+        @return (str): "customer", "admin", "staff" or "guest".
+        """
+        if isinstance(user, Customer):
+            return "customer"
+        if isinstance(user, Admin):
+            return "admin"
+        if isinstance(user, FrontDeskStaff):
+            return "staff"
+        return "guest"
+
+
+    def register_username(self, user, role):
+        """! Add a user to the username registry.
+        @param user (User): The customer, admin or front desk staff object.
+        @param role (str): The role of the user, one of USER_ROLES.
+        """
+        self.__users_by_role[role].setdefault(user.username, user)
+        registered_user, registered_role = self.find_user(user.username)
+        if registered_user is None or self.USER_ROLES.index(role) < self.USER_ROLES.index(registered_role):
+            self.__users[user.username] = (user, role)
+
+
     def add_customer(self, customer):
         """! Add a customer to the list of customers.
         @param customer: The customer object to be added.
         """
         self.__customers.append(customer)
+        self.register_username(customer, "customer")
     
 
     def add_admin(self, admin):
@@ -274,6 +408,7 @@ class CinemaController:
         @param admin: The admin object to be added.
         """
         self.__admins.append(admin)
+        self.register_username(admin, "admin")
 
 
     def add_front_desk_staff(self, front_desk_staff):
@@ -281,6 +416,7 @@ class CinemaController:
         @param front_desk_staff: The front desk staff object to be added.
         """
         self.__front_desk_staffs.append(front_desk_staff)
+        self.register_username(front_desk_staff, "staff")
 
 
     def add_movie(self, movie_object):
@@ -288,6 +424,45 @@ class CinemaController:
         @param movie_object: The movie object to be added.
         """
         self.__movies.append(movie_object)
+        self.__catalogue.add(movie_object)
+        self.__catalogue_version += 1
+
+
+    def add_screening(self, movie, screening):
+        """! Add a screening to a movie and to the screening index.
+        @param movie (Movie): The movie the screening belongs to.
+        @param screening (Screening): The screening object to be added.
+        """
+        movie.add_screening(screening)
+        self.__screenings[screening.screening_id] = screening
+        self.__catalogue_version += 1
+
+
+    def add_booking(self, customer, booking):
+        """! Add a booking to a customer and to the booking indexes.
+        @param customer (Customer): The customer who made the booking.
+        @param booking (Booking): The booking object to be added.
+        @return (bool): True if the booking was added, False if the customer already has a pending booking for the screening.
+        """
+        if not customer.add_booking(booking):
+            return False
+        self.__bookings[booking.booking_id] = booking
+        self.__screening_bookings.setdefault(booking.screening.screening_id, {})[booking.booking_id] = booking
+        self.index_booking_status(booking)
+        return True
+
+
+    def index_booking_status(self, booking):
+        """! Move a booking to the status index entry of its current status.
+        @param booking (Booking): The booking whose status was set or changed.
+        """
+        old_status = self.__indexed_status.get(booking.booking_id)
+        if old_status == booking.status:
+            return
+        if old_status is not None:
+            self.__bookings_by_status[old_status].pop(booking.booking_id, None)
+        self.__bookings_by_status.setdefault(booking.status, {})[booking.booking_id] = booking
+        self.__indexed_status[booking.booking_id] = booking.status
 
 
     def add_hall(self, hall_object):
@@ -328,10 +503,7 @@ class CinemaController:
         @param username (str): The username to search for.
         @return (Customer): The customer object if found, or None.
         """
-        for customer in self.__customers:
-            if customer.username == username:
-                return True
-        return False
+        return username in self.__users_by_role["customer"]
     
 
     def check_duplicate_email(self, email):
@@ -362,21 +534,85 @@ class CinemaController:
     def check_seat_availability(self, booking):
         """! Check seat availability for a booking.
         @param booking: The booking object for which seat availability is checked.
-        @return: True if the selected seats are available, False if any seat is already reserved.
+        @return: True if the selected seats are held for the booking or free, False if any seat is already reserved or held.
         """
-        selected_seats = booking.selected_seats
-        screening = booking.screening
-        reserved_seats = [seat.seat_id for seat in screening.seats if seat.is_reserved == True]
-    
-        for selected_seat in selected_seats:
-            if selected_seat.seat_id in reserved_seats:
-                return False
-        
-        return True
+        self.expire_holds()
+        if booking.booking_id in self.__seat_holds or (self.__shared is not None and self.__shared.has_hold(booking.booking_id)):
+            return True
+        return booking.screening.are_seats_free([seat.seat_id for seat in booking.selected_seats])
     
 
 
     # ========== filter movies ==========       
+    def search_movies(self, title, active_only=False, limit=None):
+        """! Search movies by title with the title search index.
+        @param title (str): The text to search for in the titles (case-insensitive substring or prefix).
+        @param active_only (bool): Whether to leave archived movies out.
+        @param limit (int): The maximum number of results (all if not given).
+        @return (list): The matching movies, best match first (exact title, prefix, word prefix, substring).
+        """
+        return self.__catalogue.title_index.search(title, active_only=active_only, limit=limit)
+
+
+    def query_movies(self, title=None, language=None, genre=None, date_from=None, date_to=None,
+                     active_only=False, sort="relevance", descending=False, offset=0, limit=None):
+        """! Find the movies matching all of the given criteria in one pass over the movie catalogue indexes.
+        The most selective criterion (language, genre, release date range or title) provides the candidates,
+        which are then checked against the other criteria.
+        @param title (str): Text the title must contain (case-insensitive), or None.
+        @param language (str): The language, or None for all languages.
+        @param genre (str): The genre, or None for all genres.
+        @param date_from (date|str): The earliest release date, or None.
+        @param date_to (date|str): The latest release date, or None.
+        @param active_only (bool): Whether to leave archived movies out.
+        @param sort (str): "relevance" (best title match first, catalogue order without a title), "title",
+        "release_date" or "id".
+        @param descending (bool): Whether to reverse the sort order.
+        @param offset (int): The number of results to skip.
+        @param limit (int): The maximum number of results (all if not given).
+        @return (list): The matching movies.
+        """
+        return self.__catalogue.query(title=title, language=language, genre=genre, date_from=date_from,
+                                      date_to=date_to, active_only=active_only, sort=sort,
+                                      descending=descending, offset=offset, limit=limit)
+
+
+    def filter_movies(self, title, selected_language, selected_genre, date_from, date_to, user=None):
+        """! Filter movies based on the movie filter form: title, language, genre, and date range.
+        @param title (str): The title of the movie to filter by.
+        @param selected_language (str): The selected language to filter by ('all' for any).
+        @param selected_genre (str): The selected genre to filter by ('all' for any).
+        @param date_from (str): The start date of the date range to filter by.
+        @param date_to (str): The end date of the date range to filter by.
+        @param user: The user performing the filtering.
+        @return (list): A list of filtered movies that match the criteria.
+        """
+        if selected_language == 'all':
+            selected_language = None
+        if selected_genre == 'all':
+            selected_genre = None
+        if not date_from or not date_to:
+            date_from = date_to = None
+
+        # Results are cached by the normalised criteria and the user role, for the current catalogue version
+        key = (normalise(title), normalise(selected_language), normalise(selected_genre),
+               date_key(date_from) if date_from else "", date_key(date_to) if date_to else "", self.user_role(user))
+        version = self.__catalogue_version
+        filtered_movies = self.__filter_cache.get(key, version)
+        if filtered_movies is None:
+            filtered_movies = tuple(self.query_movies(title=title, language=selected_language, genre=selected_genre,
+                                                      date_from=date_from, date_to=date_to))
+            self.__filter_cache.put(key, version, filtered_movies)
+        return list(filtered_movies)
+
+
+    def filter_cache_stats(self):
+        """! Get the movie filter cache counters.
+        @return (dict): The number of hits and misses, the number of cached results, the maximum size and the catalogue version.
+        """
+        return dict(self.__filter_cache.stats(), catalogue_version=self.__catalogue_version)
+
+
     def customer_filter_movies(self, title, selected_language, selected_genre, date_from, date_to, user):
         """! Filter movies for a customer based on title, language, genre, and date range.
 
@@ -389,24 +625,7 @@ class CinemaController:
 
         @return: A list of filtered movies that match the criteria.
         """
-        filtered_movies = self.all_movies
-        if title:
-            filtered_movies = user.search_movie_title(title, filtered_movies)
-        if selected_language:
-            if selected_language == 'all':
-                filtered_movies = filtered_movies
-            else:
-                filtered_movies = user.search_movie_lang(selected_language, filtered_movies)
-        if selected_genre:
-            if selected_genre == 'all':
-                filtered_movies = filtered_movies
-            else:
-                filtered_movies = user.search_movie_genre(selected_genre, filtered_movies)
-        if not date_from or not date_to:
-            filtered_movies = filtered_movies
-        else:
-            filtered_movies = user.search_movie_date(date_from, date_to, filtered_movies)
-        return filtered_movies
+        return self.filter_movies(title, selected_language, selected_genre, date_from, date_to, user)
 
 
     # ============= update database info ==============
@@ -414,20 +633,245 @@ class CinemaController:
         """! Save a new booking to a JSON file.
         @param booking: The booking object to be saved.
         """
-        self.save_new_bookings_to_json(booking)
+        Booking.save_new_bookings_to_json(booking)
+
+
+    def try_reserve(self, screening, seat_ids, hold_id=None, expected_version=None):
+        """! Atomically reserve seats of a screening if all of them are free, and save the screening's seat state.
+        The check and the reservation happen under the screening's own lock, so two buyers can never both get
+        the same seat, while reservations for different screenings do not wait for each other.
+        @param screening (Screening): The screening.
+        @param seat_ids (list): The IDs of the seats to reserve.
+        @param hold_id (int): The ID of the booking the seats are held for, if any; a live hold is converted to the reservation.
+        @param expected_version (int): The seat version of the screening the seats were chosen from, if known (see seats_still_free).
+        @return (bool): True if all seats were reserved, False (and nothing reserved) if any seat is taken or unknown.
+        """
+        self.expire_holds()
+        seat_ids = list(seat_ids)
+        with Screening.seat_locks(screening.screening_id):
+            with self.__seat_transaction(screening) as connection:
+                is_held = hold_id is not None and self.__take_hold(connection, hold_id)
+                if not is_held and not self.seats_still_free(screening, seat_ids, expected_version):
+                    return False
+                reserved_seats_id = screening.reserve_seats(seat_ids)
+            # With shared state the seat shard was saved in the seat transaction (see SharedSeatState.seats)
+            if self.__shared is None:
+                Screening.update_reserved_seats_to_json(screening.screening_id, reserved_seats_id, True)
+        return True
+
+
+    @staticmethod
+    def seats_still_free(screening, seat_ids, expected_version=None):
+        """! Check that the seats chosen from a seat map are still free; the caller holds the screening's lock.
+        The fast path is an unchanged seat version: no seat changed since the seat map was drawn, and the chosen
+        seats are read from the reservation vector in place. Otherwise the chosen seats are checked against a
+        fresh snapshot, so a change to other seats of the screening never refuses a stale seat map; only a
+        chosen seat that was taken meanwhile does.
+        @param screening (Screening): The screening.
+        @param seat_ids (list): The IDs of the chosen seats.
+        @param expected_version (int): The seat version of the seat map, if known.
+        @return (bool): True if there are seats and all of them are free.
+        """
+        if not seat_ids:
+            return False
+        if expected_version is not None and screening.version == expected_version:
+            return screening.are_seats_free_in_place(seat_ids)
+        return screening.are_seats_free(seat_ids)
+
+
+    def release(self, screening, seat_ids):
+        """! Release seats of a screening under the screening's lock, and save the screening's seat state.
+        @param screening (Screening): The screening.
+        @param seat_ids (list): The IDs of the seats to release.
+        @return (list): The IDs of the seats that were released.
+        """
+        with Screening.seat_locks(screening.screening_id):
+            with self.__seat_transaction(screening):
+                released_seats_id = screening.release_seats(list(seat_ids))
+            if self.__shared is None:
+                Screening.update_reserved_seats_to_json(screening.screening_id, released_seats_id, False)
+        return released_seats_id
+
+
+    def hold_seats(self, booking, seconds=None, expected_version=None):
+        """! Place a time-limited hold on the selected seats of a pending booking, if they are all free.
+        Held seats are shown as taken and cannot be booked by others; reserve_seats converts the hold to a
+        reservation, and expire_holds releases the hold (and expires the booking) when the time is up.
+        @param booking: The pending booking.
+        @param seconds (float): The length of the hold (SEAT_HOLD_SECONDS if not given).
+        @param expected_version (int): The seat version of the seat map the seats were chosen from, if known (see seats_still_free).
+        @return (bool): True if the seats are held, False if any of them is reserved or held.
+        """
+        self.expire_holds()
+        screening = booking.screening
+        seat_ids = [seat.seat_id for seat in booking.selected_seats]
+        seconds = self.SEAT_HOLD_SECONDS if seconds is None else seconds
+        with Screening.seat_locks(screening.screening_id):
+            with self.__seat_transaction(screening) as connection:
+                if not self.seats_still_free(screening, seat_ids, expected_version):
+                    return False
+                screening.hold_seats(seat_ids)
+                self.__add_hold(connection, booking, seat_ids, seconds)
+        return True
+
+
+    def restore_hold(self, booking, seconds=None):
+        """! Turn the reserved seats of a booking back into a seat hold, e.g. when its payment fails after reserve_seats.
+        The seats go from reserved to held in one step, so no one else can take them in between, and the hold
+        starts a new lease, so expire_holds expires the booking if it is not paid in time.
+        @param booking: The pending booking whose seats were reserved.
+        @param seconds (float): The length of the hold (SEAT_HOLD_SECONDS if not given).
+        """
+        screening = booking.screening
+        seat_ids = [seat.seat_id for seat in booking.selected_seats]
+        seconds = self.SEAT_HOLD_SECONDS if seconds is None else seconds
+        with Screening.seat_locks(screening.screening_id):
+            with self.__seat_transaction(screening) as connection:
+                held_seats_id = screening.hold_seats(seat_ids)
+                self.__add_hold(connection, booking, seat_ids, seconds)
+            # Held seats are saved as free in the seat shard
+            if self.__shared is None:
+                Screening.update_reserved_seats_to_json(screening.screening_id, held_seats_id, False)
+
+
+    def __add_hold(self, connection, booking, seat_ids, seconds):
+        """! Start the lease of a seat hold whose seats are held; the caller holds the screening's lock.
+        @param connection (sqlite3.Connection): The connection of the seat transaction, None without shared state.
+        @param booking: The pending booking.
+        @param seat_ids (list): The IDs of the held seats.
+        @param seconds (float): The length of the hold.
+        """
+        self.__seat_holds[booking.booking_id] = booking
+        if connection is None:
+            self.__hold_timers.schedule(booking.booking_id, seconds)
+        else:
+            # Other workers expire the hold by the wall clock, as they do not share this process's timers
+            self.__shared.add_hold(connection, booking.booking_id, booking.screening.screening_id, seat_ids,
+                                   datetime.now().timestamp() + seconds)
+
+
+    def release_hold(self, booking):
+        """! Release the seat hold of a booking, e.g. when the pending booking is canceled.
+        @param booking: The booking.
+        @return (bool): True if the booking had a hold.
+        """
+        screening = booking.screening
+        with Screening.seat_locks(screening.screening_id):
+            with self.__seat_transaction(screening) as connection:
+                if not self.__take_hold(connection, booking.booking_id):
+                    return False
+                screening.release_held_seats([seat.seat_id for seat in booking.selected_seats])
+        return True
+
+
+    def expire_holds(self, now=None):
+        """! Release the seat holds whose time is up and expire their bookings if they are still pending.
+        The timer wheel only visits the timers that are due, so this is cheap enough to call on every request.
+        With shared state the holds of all workers are expired instead, looking them up at most once per second.
+        @param now (float): The current time.monotonic(), or time.time() with shared state (for tests).
+        @return (int): The number of holds that expired.
+        """
+        if self.__shared is not None:
+            return self.__expire_shared_holds(now)
+        expired = 0
+        for booking_id in self.__hold_timers.advance(now):
+            booking = self.__seat_holds.get(booking_id)
+            if booking is None:
+                continue
+            with Screening.seat_locks(booking.screening.screening_id):
+                # The hold may have been converted to a reservation in the meantime
+                if self.__seat_holds.pop(booking_id, None) is None:
+                    continue
+                booking.screening.release_held_seats([seat.seat_id for seat in booking.selected_seats])
+            if booking.status == 'Pending':
+                booking.status = 'Expired'
+                self.update_status_to_canceled(booking_id, 'Expired')
+            expired += 1
+        return expired
+
+
+    def __expire_shared_holds(self, now=None):
+        """! Release the shared seat holds whose time is up, made by any worker (see expire_holds).
+        @param now (float): The current time.time().
+        @return (int): The number of holds that expired.
+        """
+        now = datetime.now().timestamp() if now is None else now
+        if now < self.__next_hold_sweep:
+            return 0
+        self.__next_hold_sweep = now + 1
+        expired = 0
+        for booking_id, screening_id, seat_ids in self.__shared.due_holds(now):
+            screening = self.find_screening(screening_id)
+            if screening is None:
+                continue
+            with Screening.seat_locks(screening_id):
+                with self.__seat_transaction(screening) as connection:
+                    # Another worker may have converted or expired the hold in the meantime
+                    if not self.__take_hold(connection, booking_id):
+                        continue
+                    screening.release_held_seats(seat_ids)
+            booking = self.find_booking(booking_id)
+            if booking is not None and booking.status == 'Pending':
+                booking.status = 'Expired'
+                self.update_status_to_canceled(booking_id, 'Expired')
+            expired += 1
+        return expired
+
+
+    def __seat_transaction(self, screening):
+        """! Get the context in which the seats of a screening are checked and changed; the caller holds the screening's lock.
+        With shared state this is a transaction against the other workers (see SharedSeatState.seats).
+        @param screening (Screening): The screening.
+        @return: The context manager, giving the transaction's connection, or None without shared state.
+        """
+        return nullcontext() if self.__shared is None else self.__shared.seats(screening)
+
+
+    def __take_hold(self, connection, booking_id):
+        """! Remove the seat hold of a booking, without releasing its seats; the caller holds the screening's lock.
+        @param connection (sqlite3.Connection): The connection of the seat transaction, None without shared state.
+        @param booking_id (int): The ID of the booking.
+        @return (bool): True if the booking had a hold.
+        """
+        is_held = self.__seat_holds.pop(booking_id, None) is not None
+        self.__hold_timers.cancel(booking_id)
+        if connection is not None:
+            # The hold may have been made by another worker
+            is_held = self.__shared.take_hold(connection, booking_id)
+        return is_held
+
+
+    def best_available_seats(self, screening, count, position="centre", row_from=None, row_to=None):
+        """! Find the best block of adjacent free seats of a screening for a group booking (see Screening.best_available).
+        Held seats count as taken. The block is not held: hold_seats does that once the booking is made.
+        @param screening (Screening): The screening.
+        @param count (int): The number of seats.
+        @param position (str): "centre" or "aisle".
+        @param row_from (int): The first row to consider (1-based, optional).
+        @param row_to (int): The last row to consider (1-based, optional).
+        @return (tuple): The seat version the block was found at and the IDs of its seats, empty if there is no such block.
+        """
+        self.expire_holds()
+        return screening.best_available(count, position, row_from, row_to)
 
 
     def reserve_seats(self, booking):
-        reserved_seats_id = []
-        for seat in booking.selected_seats:
-            for screening_seat in booking.screening.seats:
-                if seat.seat_id == screening_seat.seat_id:
-                    screening_seat.is_reserved = True
-                    reserved_seats_id.append(seat.seat_id)
-                    print('seat reserved successfully!')
-        is_reserved = True  
-        screening_id = booking.screening.screening_id
-        Screening.update_reserved_seats_to_json(screening_id, reserved_seats_id, is_reserved)
+        """! Reserve the selected seats of a booking, converting its seat hold if it has one (see try_reserve).
+        @param booking: The booking whose seats are reserved.
+        @return (bool): True if the seats were reserved, False if any of them has been taken in the meantime.
+        """
+        is_reserved = self.try_reserve(booking.screening, [seat.seat_id for seat in booking.selected_seats],
+                                       hold_id=booking.booking_id)
+        if is_reserved:
+            print(f'{len(booking.selected_seats)} seats reserved successfully!')
+        return is_reserved
+
+
+    def release_seats(self, booking):
+        """! Release the selected seats of a booking, e.g. when it is refunded (see restore_hold for a failed payment).
+        @param booking: The booking whose seats are released.
+        """
+        self.release(booking.screening, [seat.seat_id for seat in booking.selected_seats])
 
 
 
@@ -445,11 +889,31 @@ class CinemaController:
         if movie_to_cancel:
             # Remove the movie from the movies list
             movie_to_cancel.deactivate()
+            self.__catalogue.update(movie_to_cancel)
+            self.__catalogue_version += 1
 
             # Update the JSON file to remove the canceled movie
             Movie.update_movies_json(self.all_movies)
 
 
+    def cancel_screening(self, screening_id):
+        """! Cancel a screening based on its ID.
+        @param screening_id (int): The ID of the screening to cancel.
+        @return (bool): True if the screening was cancelled, False if it was not found.
+        """
+        screening = self.find_screening(screening_id)
+        if screening is None:
+            return False
+        # Set the screening as inactive and update it in JSON
+        screening.is_active = False
+        Screening.update_screening_status_to_inactive_to_json(screening.screening_id)
+        movie = self.find_movie(screening.movie_id)
+        if movie is not None:
+            movie.invalidate_upcoming_screenings()
+        self.__catalogue_version += 1
+        return True
+
+
     def update_booking_payment_and_status(self, booking_id, payment_id, new_status, payment_method):
         """! Update the payment and status of a booking.
         @param booking_id: The ID of the booking to update.
@@ -457,6 +921,9 @@ class CinemaController:
         @param new_status: The new status of the booking.
         """
         Booking.update_payment_and_status(booking_id, payment_id, new_status, payment_method)
+        booking = self.find_booking(booking_id)
+        if booking is not None:
+            self.index_booking_status(booking)
     
     
     def update_booking_payment_method(self, booking_id, payment_method, new_status):
@@ -466,6 +933,9 @@ class CinemaController:
         @param new_status: The new status of the booking.
         """
         Booking.update_payment_method(booking_id, payment_method, new_status)
+        booking = self.find_booking(booking_id)
+        if booking is not None:
+            self.index_booking_status(booking)
 
 
     def update_status_to_canceled(self, booking_id, new_status):
@@ -474,6 +944,9 @@ class CinemaController:
         @param new_status: The new status to set, which should be 'canceled'.
         """
         Booking.update_status_to_canceled(booking_id, new_status)
+        booking = self.find_booking(booking_id)
+        if booking is not None:
+            self.index_booking_status(booking)
 
         
     def save_new_screening_to_json(self, new_screening):
@@ -485,65 +958,77 @@ class CinemaController:
 
 
     # ============ Initialise Database =============
-    def initialise_bookings(self):
+    def initialise_bookings(self, bookings_info=None):
         """! Create booking objects and add them to the corresponding customer records.
-        @param username: The username of the customer to associate the bookings with.
+        @param bookings_info (list): Parsed booking data, read from the file if not given.
         """
-        bookings_info = Booking.read_from_file(BOOKINGS_FILENAME)
+        # Snapshot plus the booking journal tail
+        if bookings_info is None:
+            bookings_info = Booking.read_bookings_from_file()
+
+        # Lookup tables built once, so linking is linear in the number of bookings
+        customers_by_username = {customer.username: customer for customer in self.all_customers}
+        movies_by_id = {movie.id: movie for movie in self.__movies}
+        payments_by_id = {payment.payment_id: payment for payment in self.all_payments}
+
         for booking_info in bookings_info:
-            for customer in self.all_customers:
-                if booking_info["customer_username"] == customer.username:
-                    # find customer
-                    customer = self.find_customer(booking_info["customer_username"])
-
-                    # Convert the movie_id from string to integer
-                    movie_id = int(booking_info["movie_id"])
-                    movie = self.find_movie(movie_id)
-
-                    screening_id = int(booking_info["screening_id"])
-                    screening = movie.find_screening(screening_id)
-                    if screening is None:
-                        print(f"screening with ID {screening_id} not found.")
-
-                    num_of_seats = booking_info["num_of_seats"]
-                    selected_seats_id_list = booking_info["selected_seats"]
-                    selected_seats = []
-                    for seat_id in selected_seats_id_list:
-                        seat = screening.find_seat_by_id(int(seat_id))
-                        if seat:
-                            selected_seats.append(seat)
-                        else:
-                            print(f"Seat with ID {seat_id} not found for booking {booking_info['booking_id']}.")
-
-                    created_on = date.fromisoformat(booking_info["created_on"])
-                    total_amount = float(booking_info["total_amount"])
-                    status = booking_info["status"]
-                    print(status)
-                    payment_method = booking_info["payment_method"]
-                    payment_id = booking_info["payment_id"]
-                    if payment_id:
-                        payment = self.find_payment(int(payment_id))
-                    else:
-                        payment = None
-
-                    booking = Booking(
-                        customer=customer,
-                        movie=movie,
-                        screening=screening,
-                        num_of_seats=num_of_seats,
-                        selected_seats=selected_seats,
-                        created_on=created_on,
-                        total_amount=total_amount,
-                        status=status,
-                        payment_method=payment_method,
-                        payment=payment)
-                    customer.add_booking(booking)
-
-
-    def initialise_payments(self):
+            customer = customers_by_username.get(booking_info["customer_username"])
+            if customer is None:
+                continue
+
+            # Convert the movie_id from string to integer
+            movie_id = int(booking_info["movie_id"])
+            movie = movies_by_id.get(movie_id)
+
+            screening_id = int(booking_info["screening_id"])
+            screening = self.__screenings.get(screening_id)
+            if screening is None:
+                print(f"screening with ID {screening_id} not found.")
+                continue
+
+            num_of_seats = booking_info["num_of_seats"]
+            selected_seats_id_list = booking_info["selected_seats"]
+            selected_seats = []
+            for seat_id in selected_seats_id_list:
+                seat = screening.find_seat_by_id(int(seat_id))
+                if seat:
+                    selected_seats.append(seat)
+                else:
+                    print(f"Seat with ID {seat_id} not found for booking {booking_info['booking_id']}.")
+
+            created_on = date.fromisoformat(booking_info["created_on"])
+            total_amount = float(booking_info["total_amount"])
+            status = booking_info["status"]
+            payment_method = booking_info["payment_method"]
+            payment_id = booking_info["payment_id"]
+            if payment_id:
+                payment = payments_by_id.get(int(payment_id))
+            else:
+                payment = None
+
+            # Keep the stored booking ID: bookings that were never saved (e.g. their seats could not be held) leave gaps
+            booking_id = booking_info.get("booking_id")
+            booking = Booking(
+                customer=customer,
+                movie=movie,
+                screening=screening,
+                num_of_seats=num_of_seats,
+                selected_seats=selected_seats,
+                created_on=created_on,
+                total_amount=total_amount,
+                status=status,
+                payment_method=payment_method,
+                payment=payment,
+                booking_id=None if booking_id is None else int(booking_id))
+            self.add_booking(customer, booking)
+
+
+    def initialise_payments(self, payments_data=None):
         """! Create Payment objects from payment data and add them to the list of payments.
+        @param payments_data (list): Parsed payment data, read from the file if not given.
         """
-        payments_data = Payment.read_payments_from_file()
+        if payments_data is None:
+            payments_data = Payment.read_payments_from_file()
         for item in payments_data:
             payment_id = item.get('payment_id')
             amount = item.get('amount')
@@ -568,10 +1053,12 @@ class CinemaController:
             self.__payments.append(payment)
 
 
-    def initialise_movies(self):
+    def initialise_movies(self, movies_data=None):
         """! Create Movie objects from movie data and add them to the list of movies.
+        @param movies_data (list): Parsed movie data, read from the file if not given.
         """
-        movies_data = Movie.read_from_file(MOVIES_FILENAME)
+        if movies_data is None:
+            movies_data = Movie.read_from_file(MOVIES_FILENAME)
         for movie_info in movies_data:
             title = movie_info.get("title", "")
             language = movie_info.get("language", "")
@@ -580,15 +1067,19 @@ class CinemaController:
             release_date = movie_info.get("release_date", "")
             duration_in_minutes = movie_info.get("duration", 0)  
             description = movie_info.get("description", "")
-            movie_object = Movie(title, language, genre, country, release_date, duration_in_minutes, description)
+            movie_id = movie_info.get("movie_id")
+            movie_object = Movie(title, language, genre, country, release_date, duration_in_minutes, description,
+                                 movie_id=None if movie_id is None else int(movie_id))
             self.add_movie(movie_object)
 
 
-    def initialise_screenings(self):
+    def initialise_screenings(self, screening_data_list=None):
         """! Add screenings to their respective movies.
         Iterate through screening data and associate screenings with their movies.
+        @param screening_data_list (list): Parsed screening data, read from the files if not given.
         """
-        screening_data_list = Screening.read_from_file(SCREENINGS_FILENAME)
+        if screening_data_list is None:
+            screening_data_list = Screening.read_screenings_from_file()
         for screening_data in screening_data_list:
             movie_id = screening_data["movie_id"]
             movie = self.find_movie(int(movie_id))
@@ -598,71 +1089,73 @@ class CinemaController:
                 start_time = screening_data["start_time"]
                 end_time = screening_data["end_time"]
                 hall_name = screening_data["hall_name"]
-                seats_data = screening_data.get("seats", [])
 
                 hall = self.find_hall(hall_name)
 
-                seats = []
-                for seat_data in seats_data:
-                    seat_number = seat_data.get("seat_number")
-                    row_number = seat_data.get("row_number")
-                    is_reserved = seat_data.get("is_reserved")
-                    seat_price = seat_data.get("seat_price")
-
-                    seat = CinemaHallSeat(seat_number, row_number, is_reserved, seat_price)
-                    seats.append(seat)
+                # The compact seat state (reservation bitmap and price tiers) becomes the screening's
+                # reservation vector over a seat layout shared with the other screenings of the same grid
+                seats = screening_data["seat_state"]
 
                 is_active = screening_data["is_active"]  # Use the correct attribute name
-                screening = Screening(movie_id, screening_date, start_time, end_time, hall, seats, is_active)
-                movie.add_screening(screening)
-                print(screening.screening_id)
-                print(f'just to check {movie.screenings}')
+                screening_id = screening_data.get("screening_id")
+                screening = Screening(movie_id, screening_date, start_time, end_time, hall, seats, is_active,
+                                      screening_id=None if screening_id is None else int(screening_id))
+                self.add_screening(movie, screening)
             else:
                 print(f"Movie with ID {movie_id} not found.")
 
 
-    def initialise_coupons(self):
+    def initialise_coupons(self, coupons_data=None):
         """! Read coupons data from a file and add them to the list of coupons.
+        @param coupons_data (list): Parsed coupon data, read from the file if not given.
         """
-        coupons = Coupon.read_coupons_from_json()
+        coupons = Coupon.read_coupons_from_json(coupons_data)
         for coupon in coupons:
             self.__coupons.append(coupon)
 
 
-    def initialise_notifications(self):
+    def initialise_notifications(self, notification_data=None):
         """! Create Notification objects and add them to the corresponding customer records.
-        @param username: The username of the customer to associate notifications with.
+        @param notification_data (list): Parsed notification data, read from the file if not given.
         """
-        notification_data = Notification.read_from_file(NOTIFICATION_FILENAME)
+        if notification_data is None:
+            notification_data = Notification.read_from_file(NOTIFICATION_FILENAME)
+        # Lookup table built once, so linking is linear in the number of notifications
+        customers_by_username = {customer.username: customer for customer in self.all_customers}
+
         for data in notification_data:
-            for customer in self.all_customers:
-                if data["customer_username"] == customer.username:
-                    date_time = datetime.strptime(data["date_time"], '%Y-%m-%d %H:%M:%S.%f')
-                    booking_id = data["booking_id"]
-
-                    # Find the booking by booking_id
-                    booking = None
-                    if booking_id is not None:
-                        booking = customer.find_booking(booking_id)
-                        if booking is None:
-                            print(f"Booking with ID {booking_id} not found.")
-
-                    # Create and add the notification to the customer
-                    notification = Notification(
-                        customer=customer,
-                        subject=data["subject"],
-                        message=data["message"],
-                        date_time=date_time,
-                        booking=booking
-                    )
-
-                    customer.add_notification(notification)
-
-
-    def initialise_admins(self):
+            customer = customers_by_username.get(data["customer_username"])
+            if customer is None:
+                continue
+            date_time = datetime.strptime(data["date_time"], '%Y-%m-%d %H:%M:%S.%f')
+            booking_id = data["booking_id"]
+
+            # Find the booking by booking_id
+            booking = None
+            if booking_id is not None:
+                booking = self.__bookings.get(int(booking_id))
+                if booking is None:
+                    print(f"Booking with ID {booking_id} not found.")
+
+            # Create and add the notification to the customer
+            notification = Notification(
+                customer=customer,
+                subject=data["subject"],
+                message=data["message"],
+                date_time=date_time,
+                booking=booking,
+                notification_id=None if data.get("notification_id") is None else int(data["notification_id"])
+            )
+
+            customer.add_notification(notification)
+
+
+    def initialise_admins(self, admins_data=None):
         """! Initialise the list of admin objects from a file.
+        @param admins_data (list): Parsed admin data, read from the file if not given.
         """
-        admins_data = Admin.read_from_file(ADMIN_FILENAME)
+        if admins_data is None:
+            admins_data = Admin.read_from_file(ADMIN_FILENAME)
         for admin_data in admins_data:
             name = admin_data["name"]
             address = admin_data["address"]
@@ -674,10 +1167,12 @@ class CinemaController:
             self.add_admin(admin_object)
 
 
-    def initialise_staffs(self):
+    def initialise_staffs(self, staffs_data=None):
         """! Initialise the list of admin objects from a file.
+        @param staffs_data (list): Parsed front desk staff data, read from the file if not given.
         """
-        staffs_data = FrontDeskStaff.read_from_file(FRONT_DESK_STAFF_FILENAME)
+        if staffs_data is None:
+            staffs_data = FrontDeskStaff.read_from_file(FRONT_DESK_STAFF_FILENAME)
         for staff_data in staffs_data:
             name = staff_data["name"]
             address = staff_data["address"]
@@ -689,10 +1184,12 @@ class CinemaController:
             self.add_front_desk_staff(staff_object)
 
 
-    def initialise_customers(self):
+    def initialise_customers(self, customers_data=None):
         """! Initialise the list of customer objects from a file.
+        @param customers_data (list): Parsed customer data, read from the file if not given.
         """
-        customers_data = Customer.read_customers_from_file()
+        if customers_data is None:
+            customers_data = Customer.read_customers_from_file()
         for cus_data in customers_data:
             name = cus_data["name"]
             address = cus_data["address"]
@@ -704,10 +1201,12 @@ class CinemaController:
             self.add_customer(customer_object)
 
 
-    def initialise_halls(self):
+    def initialise_halls(self, halls_data=None):
         """! Initialise the list of cinema hall objects from a file.
+        @param halls_data (list): Parsed hall data, read from the file if not given.
         """
-        halls_data = CinemaHall.read_from_file(HALL_FILENAME)
+        if halls_data is None:
+            halls_data = CinemaHall.read_from_file(HALL_FILENAME)
         for hall_data in halls_data:
             hall_name = hall_data["hall_name"]
             capacity = hall_data["hall_capacity"]
@@ -715,16 +1214,342 @@ class CinemaController:
             self.__halls.append(hall_object)
 
 
+    def read_database_files(self, max_workers=None):
+        """! Read and parse all data files concurrently on a thread pool.
+        The tables are independent until they are linked, so the file I/O and JSON parsing overlap.
+        @param max_workers (int): The number of reader threads (one per table if not given).
+        @return (dict): The parsed data of each table, keyed by table name.
+        """
+        readers = {
+            "admins": lambda: Admin.read_from_file(ADMIN_FILENAME),
+            "customers": Customer.read_customers_from_file,
+            "staffs": lambda: FrontDeskStaff.read_from_file(FRONT_DESK_STAFF_FILENAME),
+            "halls": lambda: CinemaHall.read_from_file(HALL_FILENAME),
+            "movies": lambda: Movie.read_from_file(MOVIES_FILENAME),
+            "screenings": Screening.read_screenings_from_file,
+            "coupons": lambda: Coupon.read_from_file(COUPON_FILENAME),
+            "payments": Payment.read_payments_from_file,
+            "bookings": Booking.read_bookings_from_file,
+            "notifications": lambda: Notification.read_from_file(NOTIFICATION_FILENAME),
+        }
+
+        def timed_read(table, reader):
+            start_time = perf_counter()
+            data = reader()
+            self.__load_timings[f"read {table}"] = perf_counter() - start_time
+            return data
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(readers), thread_name_prefix="load-database") as executor:
+            futures = {table: executor.submit(timed_read, table, reader) for table, reader in readers.items()}
+            return {table: future.result() for table, future in futures.items()}
+
+
     def load_database(self):
         """! Load data from various sources to initialise the system's database.
+        Stage 1 parses all files concurrently, stage 2 creates and links the objects in dependency order.
+        The time spent in each stage is available from load_timings.
+        """
+        self.__load_timings = {}
+        load_start_time = perf_counter()
+        database_data = self.read_database_files()
+        self.__load_timings["read files"] = perf_counter() - load_start_time
+
+        # Linking order: halls before screenings, movies before screenings,
+        # coupons before payments, payments before bookings, bookings before notifications
+        linking_stages = [
+            ("admins", self.initialise_admins),
+            ("customers", self.initialise_customers),
+            ("staffs", self.initialise_staffs),
+            ("halls", self.initialise_halls),
+            ("movies", self.initialise_movies),
+            ("screenings", self.initialise_screenings),
+            ("coupons", self.initialise_coupons),
+            ("payments", self.initialise_payments),
+            ("bookings", self.initialise_bookings),
+            ("notifications", self.initialise_notifications),
+        ]
+        for table, initialise in linking_stages:
+            start_time = perf_counter()
+            initialise(database_data[table])
+            self.__load_timings[f"link {table}"] = perf_counter() - start_time
+
+        self.__load_timings["total"] = perf_counter() - load_start_time
+        print("Database loaded: " + ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in self.__load_timings.items()))
+
+
+    # ========== database snapshot ==========
+    # An optional pickle of the linked controller state, keyed by a hash of the data files it was built from.
+    # A worker whose data files are unchanged loads the snapshot instead of parsing and linking every file.
+
+    def database_fingerprint(self, snapshot_filename=None):
+        """! Compute a content hash of the data files under DATABASE_DIRECTORY.
+        @param snapshot_filename (str): The snapshot file, which is left out of the hash.
+        @return (str): The hex digest of the file names and contents.
+        """
+        excluded = {os.path.normpath(snapshot_filename)} if snapshot_filename else set()
+        digest = hashlib.blake2b(str(self.SNAPSHOT_FORMAT).encode(), digest_size=20)
+        for directory, subdirectories, filenames in os.walk(DATABASE_DIRECTORY):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                path = os.path.normpath(os.path.join(directory, filename))
+                # Temporary and SQLite shared-memory files are not part of the data
+                if path in excluded or filename.endswith((".tmp", "-shm")):
+                    continue
+                digest.update(path.encode() + b"\0")
+                try:
+                    with open(path, "rb") as file:
+                        for chunk in iter(lambda: file.read(1 << 20), b""):
+                            digest.update(chunk)
+                except FileNotFoundError:
+                    continue
+                digest.update(b"\0")
+        return digest.hexdigest()
+
+
+    def save_snapshot(self, snapshot_filename, fingerprint, background=True):
+        """! Pickle the linked controller state and the model ID counters into a snapshot file.
+        The state is pickled straight away so it matches the data files it was loaded from;
+        only the file write happens in the background.
+        @param snapshot_filename (str): The file to write the snapshot to.
+        @param fingerprint (str): The database_fingerprint of the data files the state was loaded from.
+        @param background (bool): Whether to write the file on a background thread.
+        @return (threading.Thread|None): The writer thread if writing in the background.
+        """
+        process_attributes = {f"_CinemaController__{name}" for name in self.PROCESS_ATTRIBUTES}
+        snapshot = pickle.dumps({
+            "fingerprint": fingerprint,
+            "controller": {name: value for name, value in self.__dict__.items() if name not in process_attributes},
+            "counters": {model.__name__: model.next_id for model in (Movie, Screening, Booking, Notification)},
+            "journal_records": Booking._journal_records,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def write_snapshot():
+            temporary_filename = snapshot_filename + ".tmp"
+            try:
+                with open(temporary_filename, "wb") as file:
+                    file.write(snapshot)
+                os.replace(temporary_filename, snapshot_filename)
+            except OSError as e:
+                print(f"Could not write the database snapshot: {e}")
+
+        if not background:
+            write_snapshot()
+            return None
+        writer = threading.Thread(target=write_snapshot, name="database-snapshot", daemon=True)
+        writer.start()
+        return writer
+
+
+    def load_snapshot(self, snapshot_filename, fingerprint):
+        """! Restore the controller state from a snapshot file if it was built from the same data files.
+        @param snapshot_filename (str): The snapshot file to load.
+        @param fingerprint (str): The database_fingerprint of the current data files.
+        @return (bool): True if the snapshot was valid and loaded, False otherwise.
+        """
+        try:
+            with open(snapshot_filename, "rb") as file:
+                snapshot = pickle.load(file)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            # Unreadable or written by an incompatible version of the models
+            print(f"Ignoring the database snapshot: {e}")
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get("fingerprint") != fingerprint:
+            return False
+
+        self.__dict__.update(snapshot["controller"])
+        for model in (Movie, Screening, Booking, Notification):
+            model.next_id = snapshot["counters"][model.__name__]
+        Booking._journal_records = snapshot["journal_records"]
+        return True
+
+
+    def load_database_cached(self, snapshot_filename):
+        """! Load the database from a valid snapshot, or from the data files if the snapshot is missing or stale.
+        After a full load a fresh snapshot is written in the background for the next worker start.
+        @param snapshot_filename (str): The snapshot file to load and regenerate.
+        @return (bool): True if the snapshot was used, False if the data files were loaded.
+        """
+        start_time = perf_counter()
+        if self.load_snapshot(snapshot_filename, self.database_fingerprint(snapshot_filename)):
+            self.__load_timings = {"load snapshot": perf_counter() - start_time}
+            print(f"Database loaded from snapshot in {self.__load_timings['load snapshot'] * 1000:.1f} ms")
+            return True
+
+        self.load_database()
+        # The load can change the files it read (seats moved to shards, the booking journal compacted), so the
+        # snapshot is fingerprinted once those changes, and any writes still held by the storage engine, are on disk
+        Booking.wait_for_compaction()
+        Base.flush_storage()
+        self.save_snapshot(snapshot_filename, self.database_fingerprint(snapshot_filename))
+        return False
+
+
+    @property
+    def load_timings(self):
+        """! Get the time spent in each stage of the last load_database call.
+        @return (dict): Seconds per stage, e.g. {"read movies": 0.002, "link movies": 0.001, "total": 0.01}.
+        """
+        return self.__load_timings
+
+    # ========== shared state ==========
+    # Several worker processes can serve the cinema from one SQLite database. Each keeps the linked objects
+    # in memory, while the seats, seat holds and booking IDs are shared through a SharedSeatState.
+
+    def use_shared_state(self, shared):
+        """! Share the seat state with other worker processes, once the data is loaded.
+        The screenings adopt the stored seats, and new movies, screenings, bookings and notifications take their
+        IDs from shared counters, so that two workers never create the same ID.
+        @param shared (SharedSeatState): The shared state, created before the data was loaded.
+        """
+        self.__shared = shared
+        for model, counter in self.SHARED_ID_COUNTERS.items():
+            model.id_allocator = lambda floor, counter=counter: shared.next_id(counter, floor)
+        shared.attach(self.__screenings.values())
+
+
+    def sync_shared_state(self):
+        """! Apply the changes other worker processes have made since the last call; cheap when there are none.
+        Seat changes are applied to the screenings in memory, and the changed rows of the SYNCED_TABLES are read
+        through their key index and applied to the objects and indexes in memory. Only a change to another table,
+        or changes trimmed from the log before this process saw them, reload the data.
+        @return (bool): True if the data was reloaded.
+        """
+        if self.__shared is None:
+            return False
+        changes = self.__shared.poll()
+        if not changes:
+            if changes is None:
+                self.reload_database()
+                return True
+            return False
+        with self.__sync_lock, self.__request_lock.reading():
+            is_applied = self.__apply_changes(changes)
+        if not is_applied:
+            self.reload_database()
+        return not is_applied
+
+
+    def __apply_changes(self, changes):
+        """! Apply changes of other worker processes to the objects in memory (see sync_shared_state).
+        @param changes (list): The (kind, key) of the changes, in order (see SharedSeatState.poll).
+        @return (bool): True if all changes were applied, False if the data must be reloaded instead.
+        """
+        screening_ids = set()
+        # Synced table -> keys of its changed rows ((key column, value) in change order), or None to read it all
+        changed_rows = {filename: {} for filename in self.SYNCED_TABLES}
+        for kind, key in changes:
+            if kind == "seats":
+                screening_ids.add(int(key))
+            elif kind == "row":
+                filename, column, value = json.loads(key)
+                if filename not in changed_rows:
+                    return False
+                if changed_rows[filename] is not None:
+                    changed_rows[filename][(column, value)] = None
+            elif key.startswith(SCREENING_SEATS_DIRECTORY):
+                # Seat shards are written along with every seat change, which the shared seats already cover
+                continue
+            elif key in self.WHOLE_SYNCED_TABLES:
+                changed_rows[key] = None
+            else:
+                return False
+
+        for filename, keys in changed_rows.items():
+            if keys is None:
+                records = Base.read_from_file(filename)
+            else:
+                records = [record for column, value in keys for record in Base.storage.find_records(filename, column, value)]
+            if records:
+                self.__apply_records(filename, records)
+        for screening_id in screening_ids:
+            screening = self.find_screening(screening_id)
+            if screening is not None:
+                with Screening.seat_locks(screening_id):
+                    self.__shared.refresh(screening)
+        return True
+
+
+    def __apply_records(self, filename, records):
+        """! Add the stored records of a synced table that are new to this process, and update the others in memory.
+        @param filename (str): One of the SYNCED_TABLES.
+        @param records (list): The current records of the changed rows.
+        """
+        if filename == CUSTOMER_FILENAME:
+            self.initialise_customers([record for record in records if self.find_customer(record["username"]) is None])
+        elif filename == MOVIES_FILENAME:
+            self.initialise_movies([record for record in records if self.find_movie(int(record["movie_id"])) is None])
+            for record in records:
+                movie = self.find_movie(int(record["movie_id"]))
+                if movie is not None and movie.is_active and not record.get("is_active", True):
+                    movie.deactivate()
+                    self.__catalogue.update(movie)
+                    self.__catalogue_version += 1
+        elif filename == SCREENINGS_FILENAME:
+            new_screenings = []
+            for record in records:
+                screening_id = int(record["screening_id"])
+                screening = self.find_screening(screening_id)
+                if screening is None:
+                    new_screenings.append(dict(record, seat_state=Screening.read_seats_from_file(screening_id)))
+                elif screening.is_active != record["is_active"]:
+                    screening.is_active = record["is_active"]
+                    movie = self.find_movie(screening.movie_id)
+                    if movie is not None:
+                        movie.invalidate_upcoming_screenings()
+                    self.__catalogue_version += 1
+            self.initialise_screenings(new_screenings)
+            screenings = (self.find_screening(int(record["screening_id"])) for record in new_screenings)
+            self.__shared.attach([screening for screening in screenings if screening is not None])
+        elif filename == PAYMENTS_FILENAME:
+            self.initialise_payments([record for record in records if self.find_payment(record["payment_id"]) is None])
+        elif filename == BOOKINGS_FILENAME:
+            for record in records:
+                booking = self.find_booking(int(record["booking_id"]))
+                if booking is None:
+                    self.initialise_bookings([record])
+                    continue
+                payment_id = record.get("payment_id")
+                booking.payment = self.find_payment(int(payment_id)) if payment_id else None
+                booking.payment_method = record["payment_method"]
+                booking.status = record["status"]
+                self.index_booking_status(booking)
+        elif filename == NOTIFICATION_FILENAME:
+            new_notifications = []
+            for record in records:
+                customer = self.find_customer(record["customer_username"])
+                if customer is not None and not any(notification.notification_id == int(record["notification_id"])
+                                                    for notification in customer.notifications):
+                    new_notifications.append(record)
+            self.initialise_notifications(new_notifications)
+
+
+    def begin_request(self):
+        """! Hold the data of this process for a request, so that reload_database waits until the request is done.
+        Call sync_shared_state before, and end_request when the request is done.
+        """
+        self.__request_lock.acquire_read()
+
+
+    def end_request(self):
+        """! Release the data of this process after a request (see begin_request)."""
+        self.__request_lock.release_read()
+
+
+    def reload_database(self):
+        """! Load the database again, e.g. after another worker process changed it.
+        The data is replaced once the requests being served are done, and new requests wait for it (see begin_request).
+        The locks, seat holds and shared state of this process are kept; everything else is replaced.
         """
-        self.initialise_admins()
-        self.initialise_customers()
-        self.initialise_staffs()
-        self.initialise_halls()
-        self.initialise_movies()
-        self.initialise_screenings()
-        self.initialise_coupons()
-        self.initialise_payments()
-        self.initialise_bookings()
-        self.initialise_notifications()
\ No newline at end of file
+        with self.__request_lock.writing():
+            for model, first_id in self.FIRST_IDS.items():
+                model.next_id = first_id
+            reloaded = CinemaController()
+            reloaded.load_database()
+            process_attributes = {f"_CinemaController__{name}" for name in self.PROCESS_ATTRIBUTES}
+            self.__dict__.update({name: value for name, value in reloaded.__dict__.items() if name not in process_attributes})
+            self.__seat_holds = {booking_id: self.__bookings[booking_id] for booking_id in self.__seat_holds
+                                 if booking_id in self.__bookings}
+            if self.__shared is not None:
+                self.__shared.attach(self.__screenings.values())
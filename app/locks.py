@@ -0,0 +1,118 @@
+"""! @brief Keyed Locks"""
+
+##
+# @file locks.py
+#
+# @brief Fine-grained Locks for Cinema System
+#
+# @section description_locks Description
+# The locks.py module contains the KeyedLocks class, a table of locks created on demand, one per
+# key. The Screening class keeps one lock per screening (Screening.seat_locks), which the CinemaController
+# holds while it checks and changes the seats, so that seat reservations for the same screening are
+# serialised while reservations for different screenings never wait for each other.
+#
+# It also contains the ReadWriteLock class, which the CinemaController holds shared while it serves a
+# request and exclusively while it replaces its data (see CinemaController.reload_database).
+#
+# @section notes_locks Notes
+# - Locks are never removed from the table; there is one small lock per screening ever reserved.
+# - The table pickles as an empty table, as locks belong to the process.
+#
+# @section author_cinema Author
+# Created by Elaine Xu on 28/09/2023
+
+# Imports
+from contextlib import contextmanager
+import threading
+
+
+class KeyedLocks:
+    """! The KeyedLocks class: One lock per key, created the first time the key is used."""
+
+    def __init__(self, lock_type=threading.Lock):
+        """! Constructor for the KeyedLocks class.
+        @param lock_type (callable): The lock factory, e.g. threading.Lock or threading.RLock.
+        """
+        self.__lock_type = lock_type
+        self.__locks = {}                   # key -> lock
+        self.__guard = threading.Lock()     # Guards the creation of locks
+
+    def __getstate__(self):
+        """! Pickle the lock type only; the locks themselves are created again on demand."""
+        return {"_KeyedLocks__lock_type": self.__lock_type}
+
+    def __setstate__(self, state):
+        self.__init__(state["_KeyedLocks__lock_type"])
+
+    def __len__(self):
+        return len(self.__locks)
+
+    def __call__(self, key):
+        """! Get the lock of a key.
+        @param key (hashable): The key, e.g. a screening ID.
+        @return (Lock): The lock of the key, to be used in a with statement.
+        """
+        lock = self.__locks.get(key)
+        if lock is None:
+            with self.__guard:
+                lock = self.__locks.setdefault(key, self.__lock_type())
+        return lock
+
+
+class ReadWriteLock:
+    """! The ReadWriteLock class: Held by many readers at once or by one writer; a waiting writer holds off new readers."""
+
+    def __init__(self):
+        """! Constructor for the ReadWriteLock class."""
+        self.__condition = threading.Condition()
+        self.__readers = 0                  # Number of threads holding the lock shared
+        self.__writer = False               # Whether a thread holds the lock exclusively
+        self.__waiting_writers = 0
+
+    def __getstate__(self):
+        """! Pickle as a fresh lock; the holders belong to the process."""
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def acquire_read(self):
+        """! Hold the lock shared, waiting while a writer holds it or waits for it. Not reentrant."""
+        with self.__condition:
+            while self.__writer or self.__waiting_writers:
+                self.__condition.wait()
+            self.__readers += 1
+
+    def release_read(self):
+        """! Release a shared hold of the lock."""
+        with self.__condition:
+            self.__readers -= 1
+            if self.__readers == 0:
+                self.__condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        """! Hold the lock shared for a with block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        """! Hold the lock exclusively for a with block, once the current readers are done."""
+        with self.__condition:
+            self.__waiting_writers += 1
+            try:
+                while self.__writer or self.__readers:
+                    self.__condition.wait()
+            finally:
+                self.__waiting_writers -= 1
+            self.__writer = True
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__writer = False
+                self.__condition.notify_all()
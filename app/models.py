@@ -34,40 +34,95 @@
 from abc import ABC, abstractmethod
 from datetime import date, datetime, time
 from typing import List, Optional, Union
+import base64
+import bisect
 import json
+import math
 import os
+import threading
 
+from .locks import KeyedLocks
+from .storage import WriteBehindStorage
 
+
+DATABASE_DIRECTORY = "app/database"
 PAYMENT_FILENAME = 'app/database/payments.json'
 NOTIFICATION_FILENAME = "app/database/notifications.json"
 BOOKINGS_FILENAME = "app/database/bookings.json"
 MOVIES_FILENAME = "app/database/movies.json"
 SCREENINGS_FILENAME = "app/database/screenings.json"
+SCREENING_SEATS_DIRECTORY = "app/database/screening_seats"
 PAYMENTS_FILENAME = "app/database/payments.json"
 COUPON_FILENAME = "app/database/coupons.json"
 HALL_FILENAME = "app/database/cinema_hall.json"
 ADMIN_FILENAME = "app/database/admins.json"
 CUSTOMER_FILENAME = "app/database/customers.json"
 FRONT_DESK_STAFF_FILENAME = "app/database/front_desk_staffs.json"
+BOOKINGS_JOURNAL_FILENAME = "app/database/bookings.journal"
+BOOKINGS_JOURNAL_COMPACT_THRESHOLD = 200
 
 
 class Base:
     """The Base class defines common methods and properties for searching and file I/O operations."""
+    # No instance attributes, so that slotted subclasses do not get a __dict__
+    __slots__ = ()
+    # Storage engine shared by all models (see storage.py), JSON files by default.
+    # Replaced by the engine configured in app/__init__.py at startup.
+    storage = WriteBehindStorage(synchronous=True)
+    # Hands out the IDs of new objects of a model numbered with next_id when several worker processes share
+    # the data (see CinemaController.use_shared_state); called with the lowest acceptable ID, None to use next_id
+    id_allocator = None
+
+    @classmethod
+    def use_storage(cls, engine):
+        """! Select the storage engine used by all models.
+        @param engine (StorageEngine): The storage engine to use.
+        """
+        Base.storage = engine
+
+    @classmethod
+    def flush_storage(cls):
+        """! Write all data the storage engine still holds in memory to disk."""
+        Base.storage.flush()
+
+    @classmethod
+    def allocate_id(cls, stored_id=None):
+        """! Get the ID of an object of a model numbered with next_id, and move next_id past it.
+        @param stored_id (int): The ID of an object read from the data files, or None for a new object.
+        @return (int): The stored ID, or else the next ID from the model's id_allocator, or else next_id.
+        """
+        if stored_id is None:
+            stored_id = cls.next_id if cls.id_allocator is None else cls.id_allocator(cls.next_id)
+        cls.next_id = max(cls.next_id, stored_id + 1)
+        return stored_id
+
     @classmethod
     def read_from_file(cls, filename):
         """Read data from a file and return it."""
-        try:
-            with open(filename, 'r') as file:
-                return json.load(file)
-        except FileNotFoundError:
-            print(f"File not found: {filename}")
-            return []
+        return Base.storage.read(filename)
 
     @classmethod
     def save_to_file(cls, data, filename):
         """Save data to a file in JSON format."""
-        with open(filename, 'w') as file:
-            json.dump(data, file, indent=4)
+        Base.storage.save(data, filename)
+
+    @classmethod
+    def append_to_file(cls, record, filename):
+        """! Append a single record to a file.
+        @param record (dict): The record to append.
+        @param filename (str): The file to append to.
+        """
+        Base.storage.append_record(record, filename)
+
+    @classmethod
+    def update_in_file(cls, filename, key, value, modifier):
+        """! Update the records of a file whose key field matches a value.
+        @param filename (str): The file to update.
+        @param key (str): The key field, e.g. "booking_id".
+        @param value: The key value of the records to update.
+        @param modifier (callable): Called with each matching record and changes it in place.
+        """
+        Base.storage.update_records(filename, key, value, modifier)
 
     @classmethod
     def search_movie_title(self, title: str, movies):
@@ -167,13 +222,9 @@ class Guest(General, Base):
         """
         # Create a new customer object
         customer = Customer(name, address, email, phone, username, hashed_password)
-        existing_data = cls.read_from_file(CUSTOMER_FILENAME)
 
-        # Append the new customer data to the existing data
-        existing_data.append(customer.to_dict())
-
-        # Write the updated data back to the file
-        cls.save_to_file(existing_data, CUSTOMER_FILENAME)
+        # Append the new customer data to the file
+        cls.append_to_file(customer.to_dict(), CUSTOMER_FILENAME)
 
         return customer
 
@@ -337,12 +388,7 @@ class Admin(User, Base):
         @param booking_id (str): The ID of the booking to cancel.
         @param new_status (str): The new status to set for the booking.
         """
-        bookings_info = cls.read_from_file(BOOKINGS_FILENAME)
-        for booking_info in bookings_info:
-            if booking_info["booking_id"] == int(booking_id):
-                booking_info["status"] = new_status
-
-        cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+        Booking.update_status_to_canceled(booking_id, new_status)
 
     
     def search_movie_title(self, title: str, movies):
@@ -424,12 +470,7 @@ class FrontDeskStaff(User, Base):
         @param booking_id (str): The ID of the booking to cancel.
         @param new_status (str): The new status for the booking.
         """
-        bookings_info = cls.read_from_file(BOOKINGS_FILENAME)
-        for booking_info in bookings_info:
-            if booking_info["booking_id"] == int(booking_id):
-                booking_info["status"] = new_status
-
-        cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+        Booking.update_status_to_canceled(booking_id, new_status)
 
 
     @classmethod
@@ -437,8 +478,7 @@ class FrontDeskStaff(User, Base):
         """! Save booking information to a file.
         @param bookings_info (List[Dict]): A list of booking information to save.
         """
-        with open(BOOKINGS_FILENAME, 'w') as file:
-            json.dump(bookings_info, file, indent=4)
+        cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
 
 
     @classmethod
@@ -658,7 +698,7 @@ class Movie(Base):
     """! The Movie class: Represents a movie with details."""
     next_id = 100
 
-    def __init__(self, title: str, language: str, genre: str, country: str, release_date: date, duration_in_mins: int, description: str, is_active = True) -> None:
+    def __init__(self, title: str, language: str, genre: str, country: str, release_date: date, duration_in_mins: int, description: str, is_active = True, movie_id = None) -> None:
         """! Constructor for the Movie class.
         @param title (str): The title of the movie.
         @param language (str): The language of the movie.
@@ -668,8 +708,9 @@ class Movie(Base):
         @param duration_in_mins (int): The duration of the movie in minutes.
         @param description (str): A description of the movie.
         @param screenings (list): A list of screenings of the movie.
+        @param movie_id (Optional[int]): The ID of a stored movie; new movies get the next ID.
         """
-        self.__id = Movie.next_id          # Unique movie ID
+        self.__id = Movie.allocate_id(movie_id)  # Unique movie ID
         self.__title = title               # The title of the movie
         self.__language = language         # The language of the movie
         self.__genre = genre               # The genre of the movie
@@ -677,9 +718,10 @@ class Movie(Base):
         self.__release_date = release_date # The release date of the movie
         self.__duration_in_mins = duration_in_mins  # Duration of the movie in minutes
         self.__description = description   # A description of the movie
-        self.__screenings = []             # List of screenings for this movie
+        self.__screenings = []             # List of screenings for this movie, in start order
+        self.__screening_keys = []         # Parallel list of the (date, start time, screening ID) of each screening
         self.__is_active = True            # Movie status
-        Movie.next_id += 1                 # Increment the movie ID counter
+        self.__upcoming = None             # Cached (as of date, {date: active screenings}), see upcoming_screenings_by_date
 
     @property
     def id(self):
@@ -755,8 +797,35 @@ class Movie(Base):
         """! Add a screening to the movie's list of screenings.
         @param screening_object (Screening): The screening to add.
         """
-        self.__screenings.append(screening_object)
-        self.__screenings.sort(key=lambda x: x.screening_date)
+        key = (screening_object.show_date, screening_object.show_time, screening_object.screening_id)
+        # Insert in start order instead of re-sorting the list, so loading many screenings is not quadratic
+        index = bisect.bisect_right(self.__screening_keys, key)
+        self.__screening_keys.insert(index, key)
+        self.__screenings.insert(index, screening_object)
+        self.__upcoming = None
+
+    def screenings_between(self, start, end, active_only=False):
+        """! Get the screenings of the movie starting in a period.
+        @param start (datetime|date): The start of the period; a date means the start of that day.
+        @param end (datetime|date): The end of the period (inclusive); a date means the end of that day.
+        @param active_only (bool): Whether to leave inactive screenings out.
+        @return (List[Screening]): The screenings, in start order.
+        """
+        if isinstance(start, datetime):
+            start_key = (start.date(), start.time())
+        else:
+            start_key = (start, time.min)
+        if isinstance(end, datetime):
+            end_key = (end.date(), end.time(), float("inf"))
+        else:
+            end_key = (end, time.max, float("inf"))
+        first = bisect.bisect_left(self.__screening_keys, start_key)
+        last = bisect.bisect_right(self.__screening_keys, end_key)
+        return [screening for screening in self.__screenings[first:last] if screening.is_active or not active_only]
+
+    def invalidate_upcoming_screenings(self):
+        """! Drop the cached upcoming screenings, e.g. after a screening of the movie was deactivated."""
+        self.__upcoming = None
 
         
     def find_screening(self, screening_id):
@@ -765,27 +834,32 @@ class Movie(Base):
         @return (Optional[Screening]): The screening object if found, or None if not found.
         """
         for screening in self.screenings:
-            print(f'debug{screening}')
             if screening.screening_id == int(screening_id):
-                print(f"debug {screening.screening_id}")
                 return screening
         return None
     
         
+    def upcoming_screenings_by_date(self):
+        """! Get the active screenings from the current date on, grouped by date.
+        The index is cached until a screening is added, a screening is deactivated (see invalidate_upcoming_screenings) or the date changes.
+        @return (dict): The screenings of each date, in date order and by start time within a date.
+        """
+        current_date = date.today()
+        if self.__upcoming is None or self.__upcoming[0] != current_date:
+            screenings_by_date = {}
+            # The screenings are kept in start order, so the upcoming ones are the tail of the list
+            first = bisect.bisect_left(self.__screening_keys, (current_date,))
+            for screening in self.__screenings[first:]:
+                if screening.is_active:
+                    screenings_by_date.setdefault(screening.show_date, []).append(screening)
+            self.__upcoming = (current_date, screenings_by_date)
+        return self.__upcoming[1]
+
     def get_screening_date_list(self):
         """! Get a list of unique screening dates that are active and after the current date.
         @return (List[date]): A list of unique screening dates.
         """
-        current_date = date.today()
-        # Create a set of unique dates that are after the current date
-        unique_dates = set()
-        for screening in self.screenings:
-            screening_date = datetime.strptime(screening.screening_date, "%Y-%m-%d").date()
-            if screening_date >= current_date and screening.is_active == True:
-                unique_dates.add(screening_date)
-        # Convert to a list
-        screening_date_list = sorted(list(unique_dates))
-        return screening_date_list
+        return list(self.upcoming_screenings_by_date())
 
     @classmethod
     def update_movies_json(cls, movies):
@@ -801,12 +875,8 @@ class Movie(Base):
         """! Save a new movie to a JSON file.
         @param movie (Movie): The movie object to be added to the JSON file.
         """
-        # Load existing movie data from movies.json if it exists
-        movies_data = cls.read_from_file(MOVIES_FILENAME)
-        # Append the new movie data to the existing data
-        movies_data.append(movie.to_dict())
-        # Save the updated movie data back to movies.json
-        cls.save_to_file(movies_data, MOVIES_FILENAME)
+        # Append the new movie data to movies.json
+        cls.append_to_file(movie.to_dict(), MOVIES_FILENAME)
 
 
     def to_dict(self):
@@ -833,6 +903,8 @@ class Movie(Base):
 
 class CinemaHallSeat:
     """! The CinemaHallSeat class: Represents a seat in a cinema hall with details such as seat number, row number, reservation status, and price."""
+    # Slotted: there is one seat object per seat of every screening
+    __slots__ = ("__seat_id", "__seat_number", "__row_number", "__is_reserved", "__seat_price")
     def __init__(self, seat_number, row_number, is_reserved, seat_price):
         """! Constructor for CinemaHallSeat class.
         @param seat_number (int): The seat number.
@@ -923,6 +995,280 @@ class CinemaHallSeat:
         return seats
 
 
+    # ========== compact seat state ==========
+    # The seats of a screening are stored as a grid of `rows` x `seats_per_row` seats in
+    # row-major order: a reservation bitmap (one bit per seat, base64) and a price tier table
+    # with, if there is more than one tier, one tier index byte per seat (base64).
+    @classmethod
+    def pack_seats(cls, seats_data, hall_name=None):
+        """! Pack seat dictionaries into the compact seat state format.
+        @param seats_data (list): Seat dictionaries as returned by CinemaHallSeat.to_json.
+        @param hall_name (str): The name of the hall the seats belong to (optional).
+        @return (dict): The packed seat state.
+        """
+        rows = max((seat_data["row_number"] for seat_data in seats_data), default=0)
+        seats_per_row = max((seat_data["seat_number"] for seat_data in seats_data), default=0)
+        reserved = bytearray((rows * seats_per_row + 7) // 8)
+        price_map = bytearray(rows * seats_per_row)
+        price_tiers = []
+        for seat_data in seats_data:
+            index = (seat_data["row_number"] - 1) * seats_per_row + seat_data["seat_number"] - 1
+            if seat_data["is_reserved"]:
+                reserved[index // 8] |= 1 << (index % 8)
+            if seat_data["seat_price"] not in price_tiers:
+                price_tiers.append(seat_data["seat_price"])
+            price_map[index] = price_tiers.index(seat_data["seat_price"])
+
+        seat_state = {
+            "hall_name": hall_name,
+            "rows": rows,
+            "seats_per_row": seats_per_row,
+            "reserved": base64.b64encode(bytes(reserved)).decode("ascii"),
+            "price_tiers": price_tiers,
+        }
+        if len(price_tiers) > 1:
+            seat_state["price_map"] = base64.b64encode(bytes(price_map)).decode("ascii")
+        return seat_state
+
+
+    @classmethod
+    def unpack_seats(cls, seat_state):
+        """! Create the seats of a screening from its packed seat state.
+        @param seat_state (dict): The packed seat state.
+        @return (List[CinemaHallSeat]): The seats in row-major order.
+        """
+        seats_per_row = seat_state["seats_per_row"]
+        reserved_bits = int.from_bytes(base64.b64decode(seat_state["reserved"]), "little")
+        price_tiers = seat_state["price_tiers"]
+        price_map = base64.b64decode(seat_state["price_map"]) if "price_map" in seat_state else None
+        seats = []
+        for index in range(seat_state["rows"] * seats_per_row):
+            seat_price = price_tiers[price_map[index]] if price_map else price_tiers[0]
+            row_number, seat_number = divmod(index, seats_per_row)
+            seats.append(CinemaHallSeat(seat_number + 1, row_number + 1, bool(reserved_bits >> index & 1), seat_price))
+        return seats
+
+
+    @classmethod
+    def update_reserved_bitmap(cls, seat_state, seat_ids, is_reserved):
+        """! Set the reservation bits of some seats in a packed seat state.
+        @param seat_state (dict): The packed seat state.
+        @param seat_ids (list): The IDs of the seats to update.
+        @param is_reserved (bool): The reservation status to set.
+        @return (str): The updated reservation bitmap (base64).
+        """
+        seats_per_row = seat_state["seats_per_row"]
+        seat_indexes = {}
+        for index in range(seat_state["rows"] * seats_per_row):
+            row_number, seat_number = divmod(index, seats_per_row)
+            seat_indexes[str(row_number + 1) + str(seat_number + 1)] = index
+
+        reserved = bytearray(base64.b64decode(seat_state["reserved"]))
+        for seat_id in seat_ids:
+            index = seat_indexes.get(str(seat_id))
+            if index is None:
+                continue
+            if is_reserved:
+                reserved[index // 8] |= 1 << (index % 8)
+            else:
+                reserved[index // 8] &= ~(1 << (index % 8))
+        return base64.b64encode(bytes(reserved)).decode("ascii")
+
+
+    def __str__(self):
+        """! Get a string representation of the seat.
+        @return (str): A string representing the seat's status.
+        """
+        return f"Seat {self.seat_id} - {'Reserved' if self.is_reserved else 'Available'} - Price {self.seat_price}"
+
+
+class SeatLayout:
+    """! The SeatLayout class: The immutable seat grid of a hall (seat IDs, coordinates and price tier map).
+    Layouts are shared by every screening with the same grid and price tier map (see SeatLayout.shared),
+    so a screening only holds its own reservation vector and tier prices.
+    """
+    __slots__ = ("__rows", "__seats_per_row", "__tier_map", "__seat_ids", "__positions")
+    # Shared layouts, keyed by (rows, seats_per_row, tier_map)
+    _layouts = {}
+    _layouts_lock = threading.Lock()
+
+    def __init__(self, rows, seats_per_row, tier_map=None):
+        """! Constructor for the SeatLayout class. Use SeatLayout.shared to get a shared layout.
+        @param rows (int): The number of rows.
+        @param seats_per_row (int): The number of seats in each row.
+        @param tier_map (bytes): The price tier index of each seat in row-major order, or None if all seats are in tier 0.
+        """
+        self.__rows = rows
+        self.__seats_per_row = seats_per_row
+        self.__tier_map = tier_map
+        self.__seat_ids = tuple(str(row_number) + str(seat_number)
+                                for row_number in range(1, rows + 1) for seat_number in range(1, seats_per_row + 1))
+        self.__positions = {seat_id: index for index, seat_id in enumerate(self.__seat_ids)}
+
+    @classmethod
+    def shared(cls, rows, seats_per_row, tier_map=None):
+        """! Get the shared layout for a seat grid, creating it on first use.
+        @param rows (int): The number of rows.
+        @param seats_per_row (int): The number of seats in each row.
+        @param tier_map (bytes): The price tier index of each seat, or None if all seats are in tier 0.
+        @return (SeatLayout): The shared layout.
+        """
+        if tier_map is not None and not any(tier_map):
+            tier_map = None
+        key = (rows, seats_per_row, bytes(tier_map) if tier_map is not None else None)
+        layout = cls._layouts.get(key)
+        if layout is None:
+            with cls._layouts_lock:
+                layout = cls._layouts.setdefault(key, SeatLayout(*key))
+        return layout
+
+    def __reduce__(self):
+        """! Pickle layouts by their key, so unpickled screenings share the cached layouts again."""
+        return (SeatLayout.shared, (self.__rows, self.__seats_per_row, self.__tier_map))
+
+    def __len__(self):
+        return len(self.__seat_ids)
+
+    @property
+    def rows(self):
+        """! Get the number of rows.
+        @return (int): The number of rows.
+        """
+        return self.__rows
+
+    @property
+    def seats_per_row(self):
+        """! Get the number of seats in each row.
+        @return (int): The number of seats per row.
+        """
+        return self.__seats_per_row
+
+    @property
+    def tier_map(self):
+        """! Get the price tier index of each seat.
+        @return (bytes|None): One tier index per seat in row-major order, or None if all seats are in tier 0.
+        """
+        return self.__tier_map
+
+    def seat_id(self, index):
+        """! Get the ID of the seat at a position.
+        @param index (int): The row-major position of the seat.
+        @return (str): The seat ID.
+        """
+        return self.__seat_ids[index]
+
+    def coordinates(self, index):
+        """! Get the row and seat number of the seat at a position.
+        @param index (int): The row-major position of the seat.
+        @return (tuple): The (row_number, seat_number) of the seat.
+        """
+        row_number, seat_number = divmod(index, self.__seats_per_row)
+        return row_number + 1, seat_number + 1
+
+    def position(self, seat_id):
+        """! Get the position of a seat.
+        @param seat_id (str): The seat ID.
+        @return (int|None): The row-major position of the seat, or None if the layout has no such seat.
+        """
+        return self.__positions.get(str(seat_id))
+
+    def tier(self, index):
+        """! Get the price tier of the seat at a position.
+        @param index (int): The row-major position of the seat.
+        @return (int): The index of the seat's price tier.
+        """
+        return self.__tier_map[index] if self.__tier_map is not None else 0
+
+
+class ScreeningSeat:
+    """! The ScreeningSeat class: A seat of a screening, as a view on the screening's seat layout and reservation vector.
+    It has the same properties as CinemaHallSeat; reading or setting them reads or updates the screening.
+    """
+    __slots__ = ("__screening", "__index")
+
+    def __init__(self, screening, index):
+        """! Constructor for the ScreeningSeat class.
+        @param screening (Screening): The screening the seat belongs to.
+        @param index (int): The row-major position of the seat in the screening's layout.
+        """
+        self.__screening = screening
+        self.__index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, ScreeningSeat) and self.__screening is other.__screening
+                and self.__index == other.__index)
+
+    def __hash__(self):
+        return hash((id(self.__screening), self.__index))
+
+    @property
+    def index(self):
+        """! Get the position of the seat in the screening's layout.
+        @return (int): The row-major position of the seat.
+        """
+        return self.__index
+
+    @property
+    def seat_id(self):
+        """! Get the unique identifier of the seat.
+        @return (str): The seat's unique ID.
+        """
+        return self.__screening.layout.seat_id(self.__index)
+
+    @property
+    def seat_number(self):
+        """! Get the seat number.
+        @return (int): The seat number.
+        """
+        return self.__screening.layout.coordinates(self.__index)[1]
+
+    @property
+    def row_number(self):
+        """! Get the row number.
+        @return (int): The row number.
+        """
+        return self.__screening.layout.coordinates(self.__index)[0]
+
+    @property
+    def is_reserved(self):
+        """! Get the reservation status of the seat.
+        @return (bool): True if the seat is reserved, False if it's available.
+        """
+        return self.__screening.is_seat_reserved(self.__index)
+
+    @is_reserved.setter
+    def is_reserved(self, value):
+        """! Set the reservation status of the seat.
+        @param value (bool): True to mark the seat as reserved, False to mark it as available.
+        """
+        self.__screening.set_seat_reserved(self.__index, value)
+
+    @property
+    def seat_price(self):
+        """! Get the price of the seat.
+        @return (float): The seat's price.
+        """
+        return self.__screening.seat_price(self.__index)
+
+    @seat_price.setter
+    def seat_price(self, price):
+        """! Set the price of the seat.
+        @param price (float): The new price for the seat.
+        """
+        self.__screening.set_seat_price(self.__index, price)
+
+    def to_json(self):
+        """! Convert the seat information to a dictionary.
+        @return (Dict): A dictionary representation of the seat.
+        """
+        row_number, seat_number = self.__screening.layout.coordinates(self.__index)
+        return {
+            "seat_number": seat_number,
+            "row_number": row_number,
+            "is_reserved": self.is_reserved,
+            "seat_price": self.seat_price,
+        }
+
     def __str__(self):
         """! Get a string representation of the seat.
         @return (str): A string representing the seat's status.
@@ -974,26 +1320,54 @@ class CinemaHall(Base):
 
 class Screening(Base):
     """! The Screening class: Represents a movie screening with details."""
+    __slots__ = ("__screening_id", "__movie_id", "__screening_date", "__start_time", "__end_time", "__hall",
+                 "__is_active", "__layout", "__reserved", "__price_tiers", "__show_date", "__show_time", "__version",
+                 "__free_runs", "__longest_run")
     next_id = 100
-    def __init__(self, movie_id, screening_date, start_time, end_time, hall: CinemaHall, seats, is_active=True) -> None:
+    # Value of a seat in the reservation vector while it is held for a pending booking (0 is free, 1 reserved)
+    SEAT_HELD = 2
+    # Seat position preferences of best_available: blocks near the middle of the row, or next to an aisle (a row end)
+    SEAT_POSITIONS = ("centre", "aisle")
+    # One lock per screening ID, held by the controller while the seats are checked and changed; reentrant so that
+    # a lock-free read falling back to it (see seat_snapshot) cannot deadlock a thread that already holds it
+    seat_locks = KeyedLocks(threading.RLock)
+    # Lock-free attempts of seat_snapshot and best_available before they wait for the screening's lock instead
+    OPTIMISTIC_READS = 3
+    def __init__(self, movie_id, screening_date, start_time, end_time, hall: CinemaHall, seats, is_active=True, screening_id=None) -> None:
         """! Constructor for the Screening class.
         @param movie_id (int): The ID of the associated movie.
         @param screening_date (str): The date of the screening.
         @param start_time (str): The start time of the screening.
         @param end_time (str): The end time of the screening.
         @param hall (CinemaHall): The cinema hall where the screening takes place.
-        @param seats (list): The list of CinemaHallSeat objects for the screening.
+        @param seats (list|dict): The list of CinemaHallSeat objects for the screening, or its packed seat state (see CinemaHallSeat.pack_seats).
         @param is_active (bool): The status of the screening (active or inactive).
+        @param screening_id (int): The ID of a stored screening; new screenings get the next ID.
         """
-        self.__screening_id = Screening.next_id
+        self.__screening_id = Screening.allocate_id(screening_id)
         self.__movie_id = movie_id
         self.__screening_date = screening_date
         self.__start_time = start_time
+        # Parsed once here, so that pages listing screenings do not parse the strings on every request
+        self.__show_date = date.fromisoformat(str(screening_date))
+        self.__show_time = time.fromisoformat(str(start_time))
         self.__end_time = end_time
         self.__hall = hall  
-        self.__seats = seats
         self.__is_active = is_active
-        Screening.next_id += 1
+        # The seats are a shared layout plus this screening's reservation vector (one byte per seat) and tier prices
+        seat_state = seats if isinstance(seats, dict) else CinemaHallSeat.pack_seats([seat.to_json() for seat in seats])
+        tier_map = base64.b64decode(seat_state["price_map"]) if "price_map" in seat_state else None
+        self.__layout = SeatLayout.shared(seat_state["rows"], seat_state["seats_per_row"], tier_map)
+        reserved_bits = int.from_bytes(base64.b64decode(seat_state["reserved"]), "little")
+        self.__reserved = bytearray(reserved_bits >> index & 1 for index in range(len(self.__layout)))
+        self.__price_tiers = list(seat_state["price_tiers"])
+        # Bumped to an odd number while the seats are being changed and to the next even number when done
+        self.__version = 0
+        # Free runs of each row, (first seat offset, length) in seat order, and the longest run length of each row,
+        # kept up to date with the reservation vector for best_available
+        self.__free_runs = [()] * self.__layout.rows
+        self.__longest_run = [0] * self.__layout.rows
+        self.__index_free_runs(range(self.__layout.rows))
 
     @property
     def screening_id(self):
@@ -1029,6 +1403,20 @@ class Screening(Base):
         @return (str): The time when the screening ends.
         """
         return self.__end_time
+
+    @property
+    def show_date(self):
+        """! Get the parsed date of the screening.
+        @return (date): The date when the screening takes place.
+        """
+        return self.__show_date
+
+    @property
+    def show_time(self):
+        """! Get the parsed start time of the screening.
+        @return (time): The time when the screening begins.
+        """
+        return self.__show_time
     
     @property
     def hall(self):
@@ -1040,9 +1428,202 @@ class Screening(Base):
     @property
     def seats(self):
         """! Get the list of seats available in the screening.
-        @return (list): A list of CinemaHallSeat objects representing the seats in the screening.
+        @return (list): A list of ScreeningSeat views (with the CinemaHallSeat properties) in row-major order.
         """
-        return self.__seats
+        return [ScreeningSeat(self, index) for index in range(len(self.__layout))]
+
+    @property
+    def layout(self):
+        """! Get the shared seat layout of the screening.
+        @return (SeatLayout): The seat layout.
+        """
+        return self.__layout
+
+    def is_seat_reserved(self, index):
+        """! Check the reservation status of the seat at a position.
+        @param index (int): The row-major position of the seat.
+        @return (bool): True if the seat is reserved or held for a pending booking.
+        """
+        return bool(self.__reserved[index])
+
+    def is_seat_held(self, index):
+        """! Check whether the seat at a position is held for a pending booking.
+        @param index (int): The row-major position of the seat.
+        @return (bool): True if the seat is held.
+        """
+        return self.__reserved[index] == Screening.SEAT_HELD
+
+    def set_seat_reserved(self, index, is_reserved):
+        """! Set the reservation status of the seat at a position.
+        @param index (int): The row-major position of the seat.
+        @param is_reserved (bool): True to reserve the seat, False to release it.
+        """
+        self.__write_seats([index], 1 if is_reserved else 0)
+
+    @property
+    def version(self):
+        """! Get the seat version of the screening, bumped by every change of its seats.
+        @return (int): The version; odd while a change is in progress.
+        """
+        return self.__version
+
+    def seat_snapshot(self):
+        """! Get a consistent copy of the reservation vector without locking.
+        The copy is retried if a writer changed the seats meanwhile (the version was odd or moved). After
+        OPTIMISTIC_READS failed attempts the copy is taken under the screening's lock, so a reader waits for
+        a slow writer (e.g. one waiting for the shared database) instead of spinning.
+        @return (tuple): The even version and the reservation vector (bytes, 0 free, 1 reserved, SEAT_HELD held) in row-major order.
+        """
+        for _ in range(Screening.OPTIMISTIC_READS):
+            version = self.__version
+            if version % 2 == 0:
+                reserved = bytes(self.__reserved)
+                if self.__version == version:
+                    return version, reserved
+        with Screening.seat_locks(self.__screening_id):
+            return self.__version, bytes(self.__reserved)
+
+    def adopt_seats(self, version, reserved):
+        """! Replace the reservation vector and seat version with ones kept outside this process (see shared.py).
+        @param version (int): The seat version of the stored vector (even).
+        @param reserved (bytes): The stored reservation vector, in row-major order.
+        """
+        if version == self.__version:
+            return
+        self.__version += 1 if self.__version % 2 == 0 else 0
+        self.__reserved[:] = reserved
+        self.__index_free_runs(range(self.__layout.rows))
+        self.__version = version
+
+    def __write_seats(self, positions, value):
+        """! Set the reservation vector at some positions, bumping the version around the change.
+        Writers are serialised by the screening's lock in seat_locks.
+        @param positions (list): The row-major positions of the seats.
+        @param value (int): 0 for free, 1 for reserved or SEAT_HELD for held.
+        """
+        self.__version += 1
+        for index in positions:
+            self.__reserved[index] = value
+        self.__index_free_runs({index // self.__layout.seats_per_row for index in positions})
+        self.__version += 1
+
+    def __index_free_runs(self, rows):
+        """! Recompute the free runs of some rows from the reservation vector.
+        @param rows (iterable): The 0-based indexes of the rows whose seats changed.
+        """
+        seats_per_row = self.__layout.seats_per_row
+        for row in rows:
+            base = row * seats_per_row
+            runs = []
+            start = None
+            for offset in range(seats_per_row):
+                if self.__reserved[base + offset] == 0:
+                    if start is None:
+                        start = offset
+                elif start is not None:
+                    runs.append((start, offset - start))
+                    start = None
+            if start is not None:
+                runs.append((start, seats_per_row - start))
+            self.__free_runs[row] = tuple(runs)
+            self.__longest_run[row] = max((length for _, length in runs), default=0)
+
+    def best_available(self, count, position="centre", row_from=None, row_to=None):
+        """! Find the best block of adjacent free seats in one row, for a group booking.
+        Rows nearest the middle of the row range come first (the row further from the screen on a tie).
+        Within a row, blocks that leave no single free seat next to them come first, then blocks nearest
+        the preferred position. Rows are visited from the middle outwards until one has a block, rows whose
+        longest free run is too short are skipped, and only a few blocks of each free run are scored, so the
+        search takes O(rows log rows) to order the rows plus a few steps per free run of the rows it visits,
+        rather than visiting every seat.
+        @param count (int): The number of seats.
+        @param position (str): One of SEAT_POSITIONS.
+        @param row_from (int): The first row to consider (1-based, the first row if not given).
+        @param row_to (int): The last row to consider (1-based, the last row if not given).
+        @return (tuple): The seat version the block was found at and the IDs of its seats from left to right,
+            or an empty list if no row in the range has enough adjacent free seats.
+        """
+        if position not in Screening.SEAT_POSITIONS:
+            raise ValueError(f"Unknown seat position {position!r}, expected one of {Screening.SEAT_POSITIONS}")
+        if count < 1:
+            raise ValueError(f"The number of seats must be at least 1, got {count}")
+        first_row = 1 if row_from is None else max(1, row_from)
+        last_row = self.__layout.rows if row_to is None else min(self.__layout.rows, row_to)
+        # Read without locking like seat_snapshot: retry if the seats changed during the search,
+        # and search under the screening's lock once OPTIMISTIC_READS attempts have failed
+        for _ in range(Screening.OPTIMISTIC_READS):
+            version = self.__version
+            if version % 2 == 0:
+                block = self.__best_block(count, position, first_row, last_row)
+                if self.__version == version:
+                    break
+        else:
+            with Screening.seat_locks(self.__screening_id):
+                version = self.__version
+                block = self.__best_block(count, position, first_row, last_row)
+        if block is None:
+            return version, []
+        row, offset = block
+        base = row * self.__layout.seats_per_row + offset
+        return version, [self.__layout.seat_id(index) for index in range(base, base + count)]
+
+    def __best_block(self, count, position, first_row, last_row):
+        """! Score the candidate blocks of the free runs of a row range (see best_available).
+        @return (tuple|None): The 0-based row and first seat offset of the best block, or None if there is none.
+        """
+        seats_per_row = self.__layout.seats_per_row
+        middle_row = (first_row + last_row) / 2
+        middle_offset = (seats_per_row - count) / 2
+        best_score = best_block = None
+        # Rows from the middle outwards, so the search stops at the first row further out than a row with a block
+        for row in sorted(range(first_row - 1, last_row), key=lambda row: (abs(row + 1 - middle_row), -row)):
+            row_distance = abs(row + 1 - middle_row)
+            if best_score is not None and row_distance > best_score[0]:
+                break
+            if self.__longest_run[row] < count:
+                continue
+            for start, length in self.__free_runs[row]:
+                if length < count:
+                    continue
+                last_offset = start + length - count
+                # The run's ends and the offsets around the middle, which between them include the best block
+                candidates = {start, last_offset}
+                if position == "centre":
+                    for offset in (math.floor(middle_offset) - 1, math.floor(middle_offset), math.ceil(middle_offset), math.ceil(middle_offset) + 1):
+                        candidates.add(min(max(offset, start), last_offset))
+                for offset in candidates:
+                    single_gaps = (offset - start == 1) + (last_offset - offset == 1)
+                    if position == "centre":
+                        seat_distance = abs(offset - middle_offset)
+                    else:
+                        seat_distance = min(offset, seats_per_row - count - offset)
+                    score = (row_distance, single_gaps, seat_distance, -row, offset)
+                    if best_score is None or score < best_score:
+                        best_score, best_block = score, (row, offset)
+        return best_block
+
+    def seat_price(self, index):
+        """! Get the price of the seat at a position.
+        @param index (int): The row-major position of the seat.
+        @return (float): The seat's price.
+        """
+        return self.__price_tiers[self.__layout.tier(index)]
+
+    def set_seat_price(self, index, price):
+        """! Set the price of the seat at a position.
+        The tier map is part of the shared layout, so moving a seat to another tier switches the screening to another layout.
+        @param index (int): The row-major position of the seat.
+        @param price (float): The new price for the seat.
+        """
+        self.__version += 1
+        if price not in self.__price_tiers:
+            self.__price_tiers.append(price)
+        tier = self.__price_tiers.index(price)
+        if tier != self.__layout.tier(index):
+            tier_map = bytearray(self.__layout.tier_map or bytes(len(self.__layout)))
+            tier_map[index] = tier
+            self.__layout = SeatLayout.shared(self.__layout.rows, self.__layout.seats_per_row, bytes(tier_map))
+        self.__version += 1
     
     @property
     def is_active(self):
@@ -1080,30 +1661,200 @@ class Screening(Base):
         @param seat_number (int): The seat number.
         @return (CinemaHallSeat|None): The CinemaHallSeat object if found, None if not found.
         """
-        for seat in self.seats:
-            if seat.row_number == row_number and seat.seat_number == seat_number:
-                return seat  
-        return None 
+        return self.find_seat_by_id(str(row_number) + str(seat_number))
     
     def find_seat_by_id(self, seat_id):
         """! Find a seat in the screening by its unique identifier.
         @param seat_id (str): The unique identifier of the seat.
-        @return (CinemaHallSeat|None): The CinemaHallSeat object if found, None if not found.
+        @return (ScreeningSeat|None): The seat if found, None if not found.
+        """
+        index = self.__layout.position(seat_id)
+        return ScreeningSeat(self, index) if index is not None else None
+
+    def seat_positions(self, seat_ids):
+        """! Get the layout positions of the given seats, ignoring unknown and repeated IDs.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (list): The row-major positions of the seats found, in the order of seat_ids.
+        """
+        positions = {}
+        for seat_id in seat_ids:
+            index = self.__layout.position(seat_id)
+            if index is not None:
+                positions[index] = None
+        return list(positions)
+
+    def find_seats(self, seat_ids):
+        """! Find the seats with the given identifiers, ignoring unknown and repeated IDs.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (list): The ScreeningSeat views found, in the order of seat_ids.
+        """
+        return [ScreeningSeat(self, index) for index in self.seat_positions(seat_ids)]
+
+    def are_seats_free(self, seat_ids):
+        """! Check that all of the given seats exist and are not reserved.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (bool): True if every seat is free, False if any seat is reserved or unknown.
+        """
+        _, reserved = self.seat_snapshot()
+        for seat_id in seat_ids:
+            index = self.__layout.position(seat_id)
+            if index is None or reserved[index]:
+                return False
+        return True
+
+    def are_seats_free_in_place(self, seat_ids):
+        """! Check that all of the given seats exist and are not reserved, reading the reservation vector in place.
+        Only for callers holding the screening's lock in seat_locks, so that no writer can change the seats meanwhile.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (bool): True if every seat is free, False if any seat is reserved or unknown.
+        """
+        for seat_id in seat_ids:
+            index = self.__layout.position(seat_id)
+            if index is None or self.__reserved[index]:
+                return False
+        return True
+
+    def reserve_seats(self, seat_ids):
+        """! Mark all of the given seats as reserved.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (list): The IDs of the seats that were found and reserved.
+        """
+        positions = self.seat_positions(seat_ids)
+        self.__write_seats(positions, 1)
+        return [self.__layout.seat_id(index) for index in positions]
+
+    def hold_seats(self, seat_ids):
+        """! Mark all of the given seats as held for a pending booking.
+        Held seats are not free, but they are not saved as reserved in the seat state.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (list): The IDs of the seats that were found and held.
         """
-        for seat in self.seats:
-            if seat.seat_id == str(seat_id):
-                return seat  
-        return None  
+        positions = self.seat_positions(seat_ids)
+        self.__write_seats(positions, Screening.SEAT_HELD)
+        return [self.__layout.seat_id(index) for index in positions]
+
+    def release_held_seats(self, seat_ids):
+        """! Mark the given seats that are still held as available again; reserved seats are left alone.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (list): The IDs of the seats that were released.
+        """
+        positions = [index for index in self.seat_positions(seat_ids) if self.__reserved[index] == Screening.SEAT_HELD]
+        self.__write_seats(positions, 0)
+        return [self.__layout.seat_id(index) for index in positions]
+
+    def release_seats(self, seat_ids):
+        """! Mark all of the given seats as available again.
+        @param seat_ids (list): The unique identifiers of the seats.
+        @return (list): The IDs of the seats that were found and released.
+        """
+        positions = self.seat_positions(seat_ids)
+        self.__write_seats(positions, 0)
+        return [self.__layout.seat_id(index) for index in positions]
+
+    def has_reserved_seats(self):
+        """! Check whether any seat of the screening is reserved or held.
+        @return (bool): True if at least one seat is reserved or held.
+        """
+        return any(self.__reserved)
     
 
+    # ========== screening storage ==========
+    # screenings.json is a small index of the screenings without their seats. The seat
+    # state of each screening is stored in its own shard under SCREENING_SEATS_DIRECTORY,
+    # so reserving or refunding seats only rewrites the shard of that screening.
+    # Shards use the compact seat state format of CinemaHallSeat.pack_seats.
+    @classmethod
+    def seats_filename(cls, screening_id):
+        """! Get the shard file holding the seats of a screening.
+        @param screening_id (int): The ID of the screening.
+        @return (str): The shard file path.
+        """
+        return os.path.join(SCREENING_SEATS_DIRECTORY, f"{screening_id}.json")
+
+
+    @classmethod
+    def index_entry(cls, screening_data):
+        """! Get the screening index entry of a screening dictionary (everything except the seats).
+        @param screening_data (dict): A screening dictionary.
+        @return (dict): The screening dictionary without its seats.
+        """
+        return {key: value for key, value in screening_data.items() if key not in ("seats", "seat_state")}
+
+
+    def seat_state(self):
+        """! Get the compact seat state of the screening.
+        @return (dict): The packed seat state (see CinemaHallSeat.pack_seats).
+        """
+        reserved = bytearray((len(self.__reserved) + 7) // 8)
+        for index, is_reserved in enumerate(self.__reserved):
+            if is_reserved == 1:
+                reserved[index // 8] |= 1 << (index % 8)
+        seat_state = {
+            "hall_name": self.hall.hall_name,
+            "rows": self.__layout.rows,
+            "seats_per_row": self.__layout.seats_per_row,
+            "reserved": base64.b64encode(bytes(reserved)).decode("ascii"),
+            "price_tiers": list(self.__price_tiers),
+        }
+        if len(self.__price_tiers) > 1:
+            seat_state["price_map"] = base64.b64encode(self.__layout.tier_map or bytes(len(self.__layout))).decode("ascii")
+        return seat_state
+
+
+    @classmethod
+    def save_seats_to_file(cls, screening_id, seat_state):
+        """! Save the seat state of a screening to its shard.
+        @param screening_id (int): The ID of the screening.
+        @param seat_state (dict): The packed seat state of the screening.
+        """
+        cls.save_to_file(dict(seat_state, screening_id=screening_id), cls.seats_filename(screening_id))
+
+
+    @classmethod
+    def read_seats_from_file(cls, screening_id):
+        """! Read the seat state of a screening from its shard.
+        Shards in the old verbose format (one dictionary per seat) are converted and rewritten.
+        @param screening_id (int): The ID of the screening.
+        @return (dict): The packed seat state of the screening.
+        """
+        shard = cls.read_from_file(cls.seats_filename(screening_id))
+        if not shard:
+            return CinemaHallSeat.pack_seats([])
+        if "seats" in shard:
+            seat_state = CinemaHallSeat.pack_seats(shard["seats"])
+            cls.save_seats_to_file(screening_id, seat_state)
+            return seat_state
+        return shard
+
+
+    @classmethod
+    def read_screenings_from_file(cls):
+        """! Read all screenings with their seat state.
+        Screenings still stored in the old single-file format (seats embedded in screenings.json)
+        are moved to shards on the way.
+        @return (list): A list of screening dictionaries including their packed "seat_state".
+        """
+        screening_data_list = cls.read_from_file(SCREENINGS_FILENAME)
+        is_migrated = False
+        for screening_data in screening_data_list:
+            if "seats" in screening_data:
+                screening_data["seat_state"] = CinemaHallSeat.pack_seats(screening_data.pop("seats"), screening_data["hall_name"])
+                cls.save_seats_to_file(screening_data["screening_id"], screening_data["seat_state"])
+                is_migrated = True
+            else:
+                screening_data["seat_state"] = cls.read_seats_from_file(screening_data["screening_id"])
+        if is_migrated:
+            cls.save_to_file([cls.index_entry(screening_data) for screening_data in screening_data_list], SCREENINGS_FILENAME)
+        return screening_data_list
+
+
     @classmethod
     def save_new_screening_to_json(cls, new_screening):
         """! Save a new screening to a JSON file.
         @param new_screening (Screening): The new screening object to be saved.
         """
-        existing_data = cls.read_from_file(SCREENINGS_FILENAME)
-        existing_data.append(new_screening.to_dict())
-        cls.save_to_file(existing_data, SCREENINGS_FILENAME)
+        cls.save_seats_to_file(new_screening.screening_id, new_screening.seat_state())
+        cls.append_to_file(cls.index_entry(new_screening.to_dict()), SCREENINGS_FILENAME)
 
 
     @classmethod
@@ -1111,13 +1862,10 @@ class Screening(Base):
         """! Update the status of a screening to inactive in the JSON file.
         @param screening_id (int): The ID of the screening to be updated.
         """
-        screenings_data = cls.read_from_file(SCREENINGS_FILENAME)
-
-        for screening_data in screenings_data:
-            if screening_data["screening_id"] == screening_id:
-                screening_data["is_active"] = False
+        def deactivate(screening_data):
+            screening_data["is_active"] = False
 
-        cls.save_to_file(screenings_data, SCREENINGS_FILENAME)
+        cls.update_in_file(SCREENINGS_FILENAME, "screening_id", screening_id, deactivate)
 
 
     @classmethod
@@ -1127,16 +1875,9 @@ class Screening(Base):
         @param reserved_seats_id (list): List of seat IDs to be updated.
         @param is_reserved (bool): The reservation status to be set for the seats.
         """
-        screening_data_list = cls.read_from_file(SCREENINGS_FILENAME)
-
-        for screening_data in screening_data_list:
-            if screening_data["screening_id"] == screening_id:
-                for reserved_seat_id in reserved_seats_id:
-                    for seat_data in screening_data["seats"]:
-                        if reserved_seat_id == str(seat_data["row_number"]) + str(seat_data["seat_number"]):
-                            seat_data["is_reserved"] = is_reserved
-
-        cls.save_to_file(screening_data_list, SCREENINGS_FILENAME)
+        seat_state = cls.read_seats_from_file(screening_id)
+        reserved = CinemaHallSeat.update_reserved_bitmap(seat_state, reserved_seats_id, is_reserved)
+        cls.save_seats_to_file(screening_id, dict(seat_state, reserved=reserved))
 
 
     def __str__(self):
@@ -1195,12 +1936,14 @@ class Coupon(Base):
         
 
     @classmethod
-    def read_coupons_from_json(cls):  
+    def read_coupons_from_json(cls, coupons_data=None):  
         """! Read coupon data from a JSON file and create Coupon objects.
+        @param coupons_data (list): Parsed coupon data, read from the file if not given.
         @return (list): A list of Coupon objects.
         """  
         coupons = []    
-        coupons_data = cls.read_from_file(COUPON_FILENAME)
+        if coupons_data is None:
+            coupons_data = cls.read_from_file(COUPON_FILENAME)
         for item in coupons_data:
             coupon_code = item.get('coupon_code', '')
             discount = item.get('discount_percentage', 0.0)
@@ -1216,6 +1959,7 @@ class Coupon(Base):
 
 class Payment(ABC):
     """! The Payment class: Represents a payment with common attributes."""
+    __slots__ = ("_payment_id", "_amount", "_created_on", "_coupon")
     def __init__(self, payment_id: int, amount: float, created_on: datetime, coupon: Optional[Coupon]):
         """! Constructor for the Payment class.
         @param payment_id (int): The unique payment ID.
@@ -1239,17 +1983,12 @@ class Payment(ABC):
         """! Read payment data from a file and return a list of payment records.
         @return (list): A list of payment data.
         """
-        try:
-            with open(PAYMENTS_FILENAME, 'r') as file:
-                data = json.load(file)
-                return data
-        except FileNotFoundError:
-            print(f"File not found: {PAYMENTS_FILENAME}")
-            return []
+        return Base.read_from_file(PAYMENTS_FILENAME)
 
 
 class CreditCard(Payment, Base):
     """! The CreditCard class: Represents a credit card payment with additional attributes."""
+    __slots__ = ("__credit_card_number", "__card_type", "__expiry_date", "__name_on_card")
     def __init__(self, payment_id:int, amount: float, created_on: datetime, coupon: Optional[Coupon],
                  credit_card_number: str, card_type: str, expiry_date: datetime, name_on_card: str):
         """! Constructor for the CreditCard class.
@@ -1333,13 +2072,12 @@ class CreditCard(Payment, Base):
         """
         if payment is None:
             return
-        existing_data = cls.read_from_file(PAYMENTS_FILENAME)
-        existing_data.append(payment.to_dict())
-        cls.save_to_file(existing_data, PAYMENTS_FILENAME)
+        cls.append_to_file(payment.to_dict(), PAYMENTS_FILENAME)
 
 
 class DebitCard(Payment):
     """! The DebitCard class: Represents a payment made using a debit card."""
+    __slots__ = ("__card_number", "__bank_name", "__name_on_card")
     def __init__(self, payment_id: int, amount: float, created_on: datetime, coupon: Optional[Coupon],
                  card_number: str, bank_name: str, name_on_card: str):
         """! Constructor for the DebitCard class.
@@ -1365,8 +2103,10 @@ class DebitCard(Payment):
 
 class Booking(Base):
     """! The Notification class: Represents a notification sent to a user. """
+    __slots__ = ("__booking_id", "__customer", "__movie", "__screening", "__num_of_seats", "__selected_seats",
+                 "__created_on", "__total_amount", "__status", "__payment_method", "__payment", "__coupon")
     next_id = 1
-    def __init__(self, customer: Customer, movie: Movie, screening: Screening, num_of_seats: int, selected_seats: List[CinemaHallSeat], created_on: date, total_amount: float, status: str, payment_method: str, payment = None, coupon = None) -> None:
+    def __init__(self, customer: Customer, movie: Movie, screening: Screening, num_of_seats: int, selected_seats: List[CinemaHallSeat], created_on: date, total_amount: float, status: str, payment_method: str, payment = None, coupon = None, booking_id = None) -> None:
         """! Constructor for the Booking class.
         @param customer (Customer): The customer who made the booking.
         @param movie (Movie): The movie being booked.
@@ -1378,8 +2118,9 @@ class Booking(Base):
         @param status (str): The status of the booking (e.g., 'active', 'canceled').
         @param payment (Optional[Payment]): The payment associated with the booking.
         @param coupon (Optional[Coupon]): An optional coupon applied to the booking.
+        @param booking_id (Optional[int]): The ID of a stored booking; new bookings get the next ID.
         """
-        self.__booking_id = Booking.next_id
+        self.__booking_id = Booking.allocate_id(booking_id)
         self.__customer = customer
         self.__movie = movie
         self.__screening = screening
@@ -1391,7 +2132,6 @@ class Booking(Base):
         self.__payment_method = payment_method
         self.__payment = payment
         self.__coupon = coupon
-        Booking.next_id += 1
     
     @property
     def booking_id(self):
@@ -1546,14 +2286,11 @@ class Booking(Base):
         @param payment_id (int): The ID of the associated payment.
         @param new_status (str): The new status of the booking.
         """
-        bookings_info = cls.read_from_file(BOOKINGS_FILENAME)
-        for booking_info in bookings_info:
-            if booking_info["booking_id"] == int(booking_id):
-                booking_info["payment_id"] = payment_id
-                booking_info["status"] = new_status
-                booking_info["payment_method"] = payment_method
-
-        cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+        cls.update_booking_record(booking_id, {
+            "payment_id": payment_id,
+            "status": new_status,
+            "payment_method": payment_method,
+        })
 
 
     @classmethod
@@ -1562,12 +2299,7 @@ class Booking(Base):
         @param booking_id (int): The ID of the booking to update.
         @param new_status (str): The new status to set for the booking.
         """
-        bookings_info = cls.read_from_file(BOOKINGS_FILENAME)
-        for booking_info in bookings_info:
-            if booking_info["booking_id"] == int(booking_id):
-                booking_info["status"] = new_status
-
-        cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+        cls.update_booking_record(booking_id, {"status": new_status})
 
 
     @classmethod
@@ -1576,13 +2308,10 @@ class Booking(Base):
         @param booking_id (int): The ID of the booking to update.
         @param new_status (str): The new status to set for the booking.
         """
-        bookings_info = cls.read_from_file(BOOKINGS_FILENAME)
-        for booking_info in bookings_info:
-            if booking_info["booking_id"] == int(booking_id):
-                booking_info["payment_method"] = payment_method
-                booking_info["status"] = new_status
-
-        cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+        cls.update_booking_record(booking_id, {
+            "payment_method": payment_method,
+            "status": new_status,
+        })
 
 
     @classmethod
@@ -1591,19 +2320,183 @@ class Booking(Base):
         @param booking: The booking object to be saved.
         @type booking: Booking
         """
+        if Base.storage.row_level:
+            cls.append_to_file(booking.to_dict(), BOOKINGS_FILENAME)
+            return
+        if cls.journal_enabled:
+            cls.append_to_journal({"op": "insert", "booking": booking.to_dict()})
+            return
+
+        existing_data = []
         if os.path.exists(BOOKINGS_FILENAME) and os.path.getsize(BOOKINGS_FILENAME) > 0:
             existing_data = cls.read_from_file(BOOKINGS_FILENAME)
 
-            # Append the new booking data to the existing data
-            existing_data.append(booking.to_dict())
+        # Append the new booking data to the existing data
+        existing_data.append(booking.to_dict())
 
         cls.save_to_file(existing_data, BOOKINGS_FILENAME)
+
+
+    # ========== booking journal ==========
+    # In journal mode every mutation is appended to BOOKINGS_JOURNAL_FILENAME as one JSON
+    # line instead of rewriting bookings.json. bookings.json becomes a snapshot which is
+    # rebuilt in a background thread once the journal holds enough records.
+    # Storage engines with row-level updates (SQLite) do not need the journal.
+    journal_enabled = True
+    _journal_lock = threading.Lock()
+    _compaction_lock = threading.Lock()
+    _journal_records = 0
+    _compaction_pending = False
+    _compaction_thread = None
+
+    @classmethod
+    def update_booking_record(cls, booking_id, fields):
+        """! Update the stored fields of a single booking.
+        @param booking_id (int): The ID of the booking to update.
+        @param fields (dict): The booking fields and their new values.
+        """
+        if cls.journal_enabled and not Base.storage.row_level:
+            cls.append_to_journal({"op": "update", "booking_id": int(booking_id), "fields": fields})
+            return
+
+        cls.update_in_file(BOOKINGS_FILENAME, "booking_id", int(booking_id), lambda booking_info: booking_info.update(fields))
+
+
+    @classmethod
+    def append_to_journal(cls, record):
+        """! Append a booking mutation record to the journal.
+        @param record (dict): The mutation record ("insert" with a booking dict, or "update" with booking_id and fields).
+        """
+        with cls._journal_lock:
+            with open(BOOKINGS_JOURNAL_FILENAME, 'a') as file:
+                file.write(json.dumps(record) + "\n")
+            cls._journal_records += 1
+            needs_compaction = cls._journal_records >= BOOKINGS_JOURNAL_COMPACT_THRESHOLD
+        if needs_compaction:
+            cls.start_compaction()
+
+
+    @classmethod
+    def read_journal(cls, filename):
+        """! Read the mutation records from a journal file.
+        A partially written last line (e.g. after a crash) is ignored.
+        @param filename (str): The journal file to read.
+        @return (list): A list of mutation records.
+        """
+        records = []
+        if not os.path.exists(filename):
+            return records
+        with open(filename, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"Skipping corrupt journal record in {filename}")
+        return records
+
+
+    @classmethod
+    def apply_journal(cls, bookings_info, records):
+        """! Replay journal records on top of a list of booking dictionaries.
+        @param bookings_info (list): Booking dictionaries from the snapshot.
+        @param records (list): Journal records to apply in order.
+        @return (list): The booking dictionaries after replay, in booking ID order.
+        """
+        bookings_by_id = {booking_info["booking_id"]: booking_info for booking_info in bookings_info}
+        for record in records:
+            if record["op"] == "insert":
+                booking_info = record["booking"]
+                bookings_by_id[booking_info["booking_id"]] = booking_info
+            elif record["op"] == "update":
+                booking_info = bookings_by_id.get(record["booking_id"])
+                if booking_info is None:
+                    print(f"Journal update for unknown booking {record['booking_id']}.")
+                    continue
+                booking_info.update(record["fields"])
+        return [bookings_by_id[booking_id] for booking_id in sorted(bookings_by_id)]
+
+
+    @classmethod
+    def read_bookings_from_file(cls):
+        """! Read all bookings: the bookings.json snapshot plus any journal records not yet compacted.
+        @return (list): A list of booking dictionaries.
+        """
+        with cls._compaction_lock:
+            bookings_info = cls.read_from_file(BOOKINGS_FILENAME)
+            # A leftover .compacting file means a compaction was interrupted
+            records = cls.read_journal(BOOKINGS_JOURNAL_FILENAME + ".compacting")
+            records += cls.read_journal(BOOKINGS_JOURNAL_FILENAME)
+        bookings_info = cls.apply_journal(bookings_info, records)
+        if records and Base.storage.row_level:
+            # Fold a journal left over from the JSON engine into the table once
+            cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+            for filename in (BOOKINGS_JOURNAL_FILENAME + ".compacting", BOOKINGS_JOURNAL_FILENAME):
+                if os.path.exists(filename):
+                    os.remove(filename)
+            return bookings_info
+
+        with cls._journal_lock:
+            cls._journal_records = len(records)
+        if cls.journal_enabled and len(records) >= BOOKINGS_JOURNAL_COMPACT_THRESHOLD:
+            cls.start_compaction()
+        return bookings_info
+
+
+    @classmethod
+    def compact_journal(cls):
+        """! Fold the journal into the bookings.json snapshot and start a new, empty journal.
+        The journal is rotated first, so appends carry on while the snapshot is rebuilt.
+        """
+        try:
+            with cls._compaction_lock:
+                compacting_filename = BOOKINGS_JOURNAL_FILENAME + ".compacting"
+                with cls._journal_lock:
+                    if os.path.exists(BOOKINGS_JOURNAL_FILENAME) and not os.path.exists(compacting_filename):
+                        os.replace(BOOKINGS_JOURNAL_FILENAME, compacting_filename)
+                        cls._journal_records = 0
+                if not os.path.exists(compacting_filename):
+                    return
+
+                bookings_info = cls.apply_journal(cls.read_from_file(BOOKINGS_FILENAME), cls.read_journal(compacting_filename))
+                cls.save_to_file(bookings_info, BOOKINGS_FILENAME)
+                # The snapshot must be on disk before the rotated journal is dropped
+                cls.flush_storage()
+                os.remove(compacting_filename)
+        finally:
+            with cls._journal_lock:
+                cls._compaction_pending = False
+
+
+    @classmethod
+    def start_compaction(cls):
+        """! Compact the booking journal in a background thread, unless a compaction is already scheduled.
+        @return (Thread|None): The compaction thread, or None if one is already pending.
+        """
+        with cls._journal_lock:
+            if cls._compaction_pending:
+                return None
+            cls._compaction_pending = True
+            thread = cls._compaction_thread = threading.Thread(target=cls.compact_journal, name="booking-journal-compaction", daemon=True)
+        thread.start()
+        return thread
+
+
+    @classmethod
+    def wait_for_compaction(cls):
+        """! Wait until the last journal compaction started by start_compaction has finished, if there is one."""
+        thread = cls._compaction_thread
+        if thread is not None:
+            thread.join()
     
 
 class Notification(Base):
     """! The Notification class: Represents a notification sent to a user. """
+    __slots__ = ("__notification_id", "__customer", "__subject", "__message", "__date_time", "__booking")
     next_id = 100
-    def __init__(self, customer, subject: str, message: str, date_time: datetime,  booking: Booking = None) -> None:
+    def __init__(self, customer, subject: str, message: str, date_time: datetime,  booking: Booking = None, notification_id = None) -> None:
         """
         Initialize a new Notification.
         @param customer: The customer to whom the notification is sent.
@@ -1616,14 +2509,15 @@ class Notification(Base):
         @type date_time: datetime
         @param booking: The booking associated with the notification (optional).
         @type booking: Booking, optional
+        @param notification_id: The ID of a stored notification; new notifications get the next ID.
+        @type notification_id: int, optional
         """
-        self.__notification_id = Notification.next_id
+        self.__notification_id = Notification.allocate_id(notification_id)
         self.__customer = customer
         self.__message = message
         self.__date_time = date_time
         self.__subject = subject
         self.__booking = booking
-        Notification.next_id += 1
 
     @property
     def notification_id(self):
@@ -1676,20 +2570,15 @@ class Notification(Base):
         if notification is None:
             return
 
-        existing_data = cls.read_from_file(NOTIFICATION_FILENAME)
-
         # Format date_time to include only three decimal places
         date_time_formatted = notification.date_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
 
-        # Append the new notification to the existing data
-        existing_data.append({
+        # Append the new notification to the file
+        cls.append_to_file({
             "notification_id": notification.notification_id,
             "customer_username": notification.customer.username,
             "subject": notification.subject,
             "message": notification.message,
             "date_time": date_time_formatted,
             "booking_id": notification.booking.booking_id if notification.booking else None
-        })
-
-        # Write the updated data back to the file
-        cls.save_to_file(existing_data, NOTIFICATION_FILENAME)
\ No newline at end of file
+        }, NOTIFICATION_FILENAME)
\ No newline at end of file
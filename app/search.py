@@ -0,0 +1,302 @@
+"""! @brief Movie Title Search"""
+
+##
+# @file search.py
+#
+# @brief Movie Title Search Index for Cinema System
+#
+# @section description_search Description
+# The search.py module contains the TitleSearchIndex class, an in-memory n-gram index over
+# the movie titles (and optionally the descriptions) kept by the CinemaController. It answers
+# case-insensitive substring and prefix queries without scanning the catalogue:
+#
+# - Matches are ranked: exact title, title prefix, word prefix, substring of the title, and
+#   finally (if descriptions are indexed) substring of the description, then by title.
+# - Exact and prefix matches come from a sorted list of the titles, word prefix matches from a
+#   sorted list of the title suffixes that start at a word, both found with bisect. With a result
+#   limit the search usually stops there, in O(log n + limit).
+# - Every 1, 2 and 3 character gram of a normalised title maps to the IDs of the movies whose
+#   title contains it. A query of up to 3 characters is a single posting set lookup; a longer
+#   query intersects the posting sets of its trigrams (smallest first) and checks the few
+#   remaining candidates.
+# - Archived (inactive) movies stay in the index and can be left out of the results.
+#
+# @section notes_search Notes
+# - The index is updated incrementally with add, update and remove; the controller calls them
+#   from add_movie and cancel_movie.
+#
+# @section author_cinema Author
+# Created by Elaine Xu on 28/09/2023
+
+# Imports
+import bisect
+import heapq
+import threading
+
+
+## Longest gram kept in the index; longer queries are matched with their trigrams.
+MAX_GRAM_LENGTH = 3
+
+
+def normalise(text):
+    """! Normalise text for searching: case-folded, with runs of whitespace collapsed to one space.
+    @param text (str): The text to normalise.
+    @return (str): The normalised text.
+    """
+    return " ".join(str(text or "").casefold().split())
+
+
+def word_suffixes(text):
+    """! Get the suffixes of a text that start at its second and later words.
+    @param text (str): Normalised text.
+    @return (set): The suffixes.
+    """
+    return {text[index + 1:] for index, character in enumerate(text) if character == " "}
+
+
+def grams(text):
+    """! Get all distinct 1 to MAX_GRAM_LENGTH character grams of a text.
+    @param text (str): Normalised text.
+    @return (set): The grams of the text.
+    """
+    return {text[start:start + length]
+            for length in range(1, MAX_GRAM_LENGTH + 1) for start in range(len(text) - length + 1)}
+
+
+class TitleSearchIndex:
+    """! The TitleSearchIndex class: An incrementally maintained n-gram index over movie titles."""
+
+    def __init__(self, include_descriptions=False):
+        """! Constructor for the TitleSearchIndex class.
+        @param include_descriptions (bool): Whether descriptions are searched too (ranked after title matches).
+        """
+        self.__include_descriptions = include_descriptions
+        self.__movies = {}              # movie ID -> movie
+        self.__titles = {}              # movie ID -> normalised title
+        self.__descriptions = {}        # movie ID -> normalised description
+        self.__title_grams = {}         # gram -> set of movie IDs
+        self.__description_grams = {}   # gram -> set of movie IDs
+        self.__sorted_titles = []       # sorted (normalised title, movie ID)
+        self.__sorted_words = []        # sorted (title suffix starting at a word, movie ID)
+        self.__needs_sort = False       # new entries were appended to the sorted lists
+        self.__active = set()           # IDs of the active movies
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        """! Pickle the index without its lock (see CinemaController.save_snapshot)."""
+        state = self.__dict__.copy()
+        del state["_TitleSearchIndex__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__movies)
+
+    def add(self, movie):
+        """! Add a movie to the index, or re-index it if it is already there.
+        @param movie (Movie): The movie to add.
+        """
+        with self.__lock:
+            self.__remove(movie.id)
+            title = normalise(movie.title)
+            self.__movies[movie.id] = movie
+            self.__titles[movie.id] = title
+            # Appended and sorted on the next lookup, so that loading a catalogue is not quadratic
+            self.__sorted_titles.append((title, movie.id))
+            self.__sorted_words.extend((suffix, movie.id) for suffix in word_suffixes(title))
+            self.__needs_sort = True
+            for gram in grams(title):
+                self.__title_grams.setdefault(gram, set()).add(movie.id)
+            if self.__include_descriptions:
+                description = normalise(movie.description)
+                self.__descriptions[movie.id] = description
+                for gram in grams(description):
+                    self.__description_grams.setdefault(gram, set()).add(movie.id)
+            if movie.is_active:
+                self.__active.add(movie.id)
+
+    def update(self, movie):
+        """! Update the index after a movie changed, e.g. was archived.
+        Only the title and description are indexed, so a status change does not touch the grams.
+        @param movie (Movie): The movie that changed.
+        """
+        with self.__lock:
+            unchanged = (self.__titles.get(movie.id) == normalise(movie.title) and
+                         (not self.__include_descriptions or
+                          self.__descriptions.get(movie.id) == normalise(movie.description)))
+            if unchanged:
+                if movie.is_active:
+                    self.__active.add(movie.id)
+                else:
+                    self.__active.discard(movie.id)
+                return
+        self.add(movie)
+
+    def remove(self, movie):
+        """! Remove a movie from the index.
+        @param movie (Movie): The movie to remove.
+        """
+        with self.__lock:
+            self.__remove(movie.id)
+
+    def __remove(self, movie_id):
+        """! Remove a movie from the index; the caller holds the lock.
+        @param movie_id (int): The ID of the movie to remove.
+        """
+        if self.__movies.pop(movie_id, None) is None:
+            return
+        self.__sort()
+        title = self.__titles[movie_id]
+        for sorted_list, key in [(self.__sorted_titles, title)] + [(self.__sorted_words, suffix) for suffix in word_suffixes(title)]:
+            index = bisect.bisect_left(sorted_list, (key, movie_id))
+            if index < len(sorted_list) and sorted_list[index] == (key, movie_id):
+                del sorted_list[index]
+        for text_by_id, gram_index in ((self.__titles, self.__title_grams),
+                                       (self.__descriptions, self.__description_grams)):
+            text = text_by_id.pop(movie_id, None)
+            if text is None:
+                continue
+            for gram in grams(text):
+                movie_ids = gram_index.get(gram)
+                if movie_ids is not None:
+                    movie_ids.discard(movie_id)
+                    if not movie_ids:
+                        del gram_index[gram]
+        self.__active.discard(movie_id)
+
+    def __sort(self):
+        """! Sort the title and word lists if entries were appended; the caller holds the lock."""
+        if self.__needs_sort:
+            self.__sorted_titles.sort()
+            self.__sorted_words.sort()
+            self.__needs_sort = False
+
+    def __candidates(self, query, gram_index, texts):
+        """! Find the IDs of the movies whose indexed text contains the query; the caller holds the lock.
+        @param query (str): The normalised query.
+        @param gram_index (dict): The gram index to use.
+        @param texts (dict): The normalised texts by movie ID, to check trigram candidates.
+        @return (set): The matching movie IDs.
+        """
+        if len(query) <= MAX_GRAM_LENGTH:
+            return set(gram_index.get(query, ()))
+        postings = []
+        for start in range(len(query) - MAX_GRAM_LENGTH + 1):
+            movie_ids = gram_index.get(query[start:start + MAX_GRAM_LENGTH])
+            if not movie_ids:
+                return set()
+            postings.append(movie_ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for movie_ids in postings[1:]:
+            candidates &= movie_ids
+            if not candidates:
+                return candidates
+        return {movie_id for movie_id in candidates if query in texts[movie_id]}
+
+    def __prefix_matches(self, sorted_list, query):
+        """! Get the movie IDs of the entries of a sorted (text, movie ID) list that start with the query; the caller holds the lock.
+        @param sorted_list (list): The sorted list.
+        @param query (str): The normalised query.
+        @return (generator): The movie IDs in (text, movie ID) order.
+        """
+        index = bisect.bisect_left(sorted_list, (query,))
+        while index < len(sorted_list) and sorted_list[index][0].startswith(query):
+            yield sorted_list[index][1]
+            index += 1
+
+    def estimate(self, query):
+        """! Estimate the number of titles containing the query, without searching.
+        @param query (str): The text to search for (case-insensitive).
+        @return (int): An upper bound of the number of matching titles (the smallest trigram posting set).
+        """
+        query = normalise(query)
+        with self.__lock:
+            if len(query) <= MAX_GRAM_LENGTH:
+                return len(self.__title_grams.get(query, ()))
+            return min(len(self.__title_grams.get(query[start:start + MAX_GRAM_LENGTH], ()))
+                       for start in range(len(query) - MAX_GRAM_LENGTH + 1))
+
+    def matching_ids(self, query):
+        """! Get the IDs of the movies whose title contains the query, in no particular order.
+        @param query (str): The text to search for (case-insensitive).
+        @return (set): The matching movie IDs.
+        """
+        query = normalise(query)
+        with self.__lock:
+            return self.__candidates(query, self.__title_grams, self.__titles) if query else set()
+
+    def title_contains(self, movie_id, query):
+        """! Check whether the title of an indexed movie contains the query.
+        @param movie_id (int): The ID of the movie.
+        @param query (str): The normalised query.
+        @return (bool): True if the normalised title contains the query.
+        """
+        return query in self.__titles.get(movie_id, "")
+
+    def rank_key(self, movie_id, query):
+        """! Get the sort key of a matching movie: match rank (exact, prefix, word prefix, substring), then title.
+        @param movie_id (int): The ID of the movie.
+        @param query (str): The normalised query.
+        @return (tuple): The sort key.
+        """
+        title = self.__titles.get(movie_id, "")
+        if title == query:
+            rank = 0
+        elif title.startswith(query):
+            rank = 1
+        elif (" " + query) in title:
+            rank = 2
+        else:
+            rank = 3
+        return rank, title, movie_id
+
+    def search(self, query, active_only=False, limit=None):
+        """! Search the movies whose title (or description, if indexed) contains the query.
+        @param query (str): The text to search for (case-insensitive).
+        @param active_only (bool): Whether to leave archived movies out.
+        @param limit (int): The maximum number of results (all if not given).
+        @return (list): The matching movies, best match first.
+        """
+        query = normalise(query)
+        if not query or limit == 0:
+            return []
+        with self.__lock:
+            self.__sort()
+            results = []
+            found = set()
+
+            def take(movie_ids):
+                """! Add movie IDs to the results in order until the limit is reached.
+                @return (bool): True if the limit has been reached.
+                """
+                for movie_id in movie_ids:
+                    if movie_id in found or (active_only and movie_id not in self.__active):
+                        continue
+                    found.add(movie_id)
+                    results.append(movie_id)
+                    if limit is not None and len(results) >= limit:
+                        return True
+                return False
+
+            def by_title(movie_ids):
+                """! Order a set of movie IDs by title, keeping only as many as can still be taken."""
+                movie_ids = [movie_id for movie_id in movie_ids if movie_id not in found and
+                             (not active_only or movie_id in self.__active)]
+                key = lambda movie_id: (self.__titles[movie_id], movie_id)
+                if limit is not None:
+                    return heapq.nsmallest(limit - len(results), movie_ids, key=key)
+                return sorted(movie_ids, key=key)
+
+            # Exact title and title prefix matches (an exact title sorts before the longer titles it prefixes)
+            if not take(self.__prefix_matches(self.__sorted_titles, query)):
+                # Matches at the start of a later word
+                if not take(by_title(set(self.__prefix_matches(self.__sorted_words, query)))):
+                    # Matches anywhere in the title, then in the description
+                    if not take(by_title(self.__candidates(query, self.__title_grams, self.__titles))):
+                        if self.__include_descriptions:
+                            take(by_title(self.__candidates(query, self.__description_grams, self.__descriptions)))
+            return [self.__movies[movie_id] for movie_id in results]
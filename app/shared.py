@@ -0,0 +1,261 @@
+"""! @brief Shared Seat State"""
+
+##
+# @file shared.py
+#
+# @brief Seat State Shared by Worker Processes for Cinema System
+#
+# @section description_shared Description
+# The shared.py module contains the SharedSeatState class, which lets several worker processes
+# (e.g. gunicorn -w 4) serve the cinema from one SQLite database (see SQLiteStorage) while each of
+# them keeps the linked objects in memory:
+#
+# - The reservation vector and seat version of every screening live in the screening_seats table.
+#   A seat change runs in a BEGIN IMMEDIATE transaction, which holds SQLite's write lock on the
+#   database file: the worker adopts the stored vector, checks and changes its seats, and writes the
+#   vector back, so no two processes can take the same seat. The screening's seat shard is written
+#   in the same transaction, so the shard never falls behind screening_seats.
+# - Seat holds of pending bookings are kept in the seat_holds table with a wall clock deadline, so
+#   any worker can convert or expire a hold made by another one.
+# - Model IDs are handed out from the id_counters table, so workers never create the same ID.
+# - Every write is recorded in the changes table. A worker checks PRAGMA data_version, which only
+#   changes when another connection has committed, and reads the new changes only then; seat changes
+#   are applied to the screening in memory, and changed rows of the booking, payment, notification,
+#   customer, movie and screening tables are read by their key and applied to the objects in memory.
+#
+# @section notes_shared Notes
+# - A change to any other table, or older changes a worker missed because the change log only keeps
+#   the last CHANGE_LOG_SIZE, reloads all of the worker's data. The reload waits for the requests the
+#   worker is serving and holds off new ones (see CinemaController.reload_database).
+#
+# @section author_cinema Author
+# Created by Elaine Xu on 28/09/2023
+
+# Imports
+from contextlib import contextmanager
+import json
+import os
+import sqlite3
+import threading
+
+
+class SharedSeatState:
+    """! The SharedSeatState class: Seat state, seat holds, booking IDs and change notifications shared through SQLite."""
+
+    ## Number of change log rows kept for workers that have not polled yet
+    CHANGE_LOG_SIZE = 10000
+
+    def __init__(self, database_filename):
+        """! Constructor for the SharedSeatState class.
+        @param database_filename (str): The SQLite database file of the SQLiteStorage engine (created with log_changes).
+        """
+        self.__database_filename = database_filename
+        self.__local = threading.local()
+        self.__seq_lock = threading.Lock()
+        self.create_tables()
+        # Changes up to here are in the data this process loads next
+        self.__last_seq = self.latest_change()
+
+    def __getstate__(self):
+        """! Pickle the database file name only; connections are opened again on demand."""
+        return {"database_filename": self.__database_filename}
+
+    def __setstate__(self, state):
+        self.__init__(state["database_filename"])
+
+    @property
+    def database_filename(self):
+        """! Get the path of the shared SQLite database file.
+        @return (str): The database file path.
+        """
+        return self.__database_filename
+
+    @property
+    def connection(self):
+        """! Get the SQLite connection of the current thread.
+        @return (sqlite3.Connection): The connection, in autocommit mode with explicit transactions.
+        """
+        connection = getattr(self.__local, "connection", None)
+        # A connection opened before a fork (e.g. gunicorn --preload) must not be used by the child process
+        if connection is None or self.__local.pid != os.getpid():
+            connection = sqlite3.connect(self.__database_filename, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+            self.__local.pid = os.getpid()
+            self.__local.data_version = None
+        return connection
+
+    def create_tables(self):
+        """! Create the shared tables if they do not exist yet."""
+        with self.transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS screening_seats (screening_id INTEGER PRIMARY KEY, version INTEGER NOT NULL, reserved BLOB NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS seat_holds (booking_id INTEGER PRIMARY KEY, screening_id INTEGER NOT NULL, seat_ids TEXT NOT NULL, expires_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_seat_holds_expires_at ON seat_holds (expires_at)")
+            connection.execute("CREATE TABLE IF NOT EXISTS id_counters (name TEXT PRIMARY KEY, next_id INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, origin INTEGER NOT NULL, kind TEXT NOT NULL, key TEXT)")
+            connection.execute("CREATE TABLE IF NOT EXISTS documents (filename TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    @contextmanager
+    def transaction(self):
+        """! Run a block in a write transaction, which waits for and then holds the database's write lock.
+        @return (sqlite3.Connection): The connection of the transaction, for the with statement.
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @contextmanager
+    def seats(self, screening):
+        """! Change the seats of a screening against the shared state.
+        The stored reservation vector is adopted first; if the block changes the seats, the new vector and
+        version are stored along with the screening's seat shard, and other workers are notified when the
+        transaction commits.
+        @param screening (Screening): The screening; the caller holds its lock in this process.
+        @return (sqlite3.Connection): The connection of the transaction, for the with statement.
+        """
+        with self.transaction() as connection:
+            row = self.adopt(connection, screening)
+            version = screening.version
+            try:
+                yield connection
+            except BaseException:
+                # The transaction is rolled back, so the seats in memory go back to the stored ones
+                screening.adopt_seats(*row)
+                raise
+            if screening.version != version:
+                _, reserved = screening.seat_snapshot()
+                connection.execute("UPDATE screening_seats SET version = ?, reserved = ? WHERE screening_id = ?",
+                                   (screening.version, reserved, screening.screening_id))
+                self.save_seat_shard(connection, screening)
+                self.notify(connection, "seats", screening.screening_id)
+
+    def save_seat_shard(self, connection, screening):
+        """! Store the seat shard of a screening (see Screening.save_seats_to_file) in the transaction of a seat change.
+        Reading, changing and writing the shard after the transaction would let two workers overwrite each other's seats.
+        @param connection (sqlite3.Connection): The connection of the seat transaction.
+        @param screening (Screening): The screening; the caller holds its lock in this process.
+        """
+        seat_state = dict(screening.seat_state(), screening_id=screening.screening_id)
+        connection.execute("INSERT OR REPLACE INTO documents (filename, data) VALUES (?, ?)",
+                           (screening.seats_filename(screening.screening_id), json.dumps(seat_state)))
+
+    def adopt(self, connection, screening):
+        """! Adopt the stored seats of a screening, or store the screening's seats if there are none yet.
+        @param connection (sqlite3.Connection): The connection to use.
+        @param screening (Screening): The screening.
+        @return (tuple): The stored seat version and reservation vector.
+        """
+        row = connection.execute("SELECT version, reserved FROM screening_seats WHERE screening_id = ?",
+                                 (screening.screening_id,)).fetchone()
+        if row is None:
+            row = screening.seat_snapshot()
+            connection.execute("INSERT INTO screening_seats (screening_id, version, reserved) VALUES (?, ?, ?)",
+                               (screening.screening_id,) + row)
+            return row
+        screening.adopt_seats(*row)
+        return row
+
+    def attach(self, screenings):
+        """! Adopt the stored seats of many screenings in one transaction, e.g. after loading the data.
+        @param screenings (iterable): The screenings.
+        """
+        with self.transaction() as connection:
+            for screening in screenings:
+                self.adopt(connection, screening)
+
+    def refresh(self, screening):
+        """! Adopt the stored seats of a screening after another worker changed them.
+        @param screening (Screening): The screening; the caller holds its lock in this process.
+        """
+        self.adopt(self.connection, screening)
+
+    def add_hold(self, connection, booking_id, screening_id, seat_ids, expires_at):
+        """! Record the seat hold of a pending booking.
+        @param connection (sqlite3.Connection): The connection of the seat transaction.
+        @param booking_id (int): The ID of the booking.
+        @param screening_id (int): The ID of the screening.
+        @param seat_ids (list): The IDs of the held seats.
+        @param expires_at (float): The time.time() at which the hold expires.
+        """
+        connection.execute("INSERT OR REPLACE INTO seat_holds (booking_id, screening_id, seat_ids, expires_at) VALUES (?, ?, ?, ?)",
+                           (booking_id, screening_id, json.dumps(seat_ids), expires_at))
+
+    def take_hold(self, connection, booking_id):
+        """! Remove the seat hold of a booking.
+        @param connection (sqlite3.Connection): The connection of the seat transaction.
+        @param booking_id (int): The ID of the booking.
+        @return (bool): True if the booking had a hold.
+        """
+        return connection.execute("DELETE FROM seat_holds WHERE booking_id = ?", (booking_id,)).rowcount > 0
+
+    def has_hold(self, booking_id):
+        """! Check if a booking has a seat hold, made by any worker.
+        @param booking_id (int): The ID of the booking.
+        @return (bool): True if the booking has a hold.
+        """
+        return self.connection.execute("SELECT 1 FROM seat_holds WHERE booking_id = ?", (booking_id,)).fetchone() is not None
+
+    def due_holds(self, now, limit=100):
+        """! Get the seat holds whose time is up, through the index on their deadline.
+        @param now (float): The current time.time().
+        @param limit (int): The maximum number of holds to return.
+        @return (list): The (booking_id, screening_id, seat_ids) of the expired holds, earliest first.
+        """
+        rows = self.connection.execute("SELECT booking_id, screening_id, seat_ids FROM seat_holds WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                                       (now, limit)).fetchall()
+        return [(booking_id, screening_id, json.loads(seat_ids)) for booking_id, screening_id, seat_ids in rows]
+
+    def next_id(self, name, floor):
+        """! Take the next ID of a counter shared by all workers.
+        @param name (str): The counter name, e.g. "bookings".
+        @param floor (int): The lowest ID to hand out, e.g. one more than the highest ID this process has loaded.
+        @return (int): The ID, never handed out before.
+        """
+        with self.transaction() as connection:
+            row = connection.execute("SELECT next_id FROM id_counters WHERE name = ?", (name,)).fetchone()
+            value = max(floor, row[0] if row else floor)
+            connection.execute("INSERT OR REPLACE INTO id_counters (name, next_id) VALUES (?, ?)", (name, value + 1))
+        return value
+
+    def notify(self, connection, kind, key):
+        """! Record a change for the other workers, and trim the change log to its last CHANGE_LOG_SIZE rows.
+        @param connection (sqlite3.Connection): The connection of the change's transaction.
+        @param kind (str): The kind of change, e.g. "seats".
+        @param key: The changed item, e.g. a screening ID.
+        """
+        seq = connection.execute("INSERT INTO changes (origin, kind, key) VALUES (?, ?, ?)", (os.getpid(), kind, str(key))).lastrowid
+        connection.execute("DELETE FROM changes WHERE seq <= ?", (seq - self.CHANGE_LOG_SIZE,))
+
+    def latest_change(self):
+        """! Get the sequence number of the latest change.
+        @return (int): The sequence number, 0 if there are no changes.
+        """
+        return self.connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def poll(self):
+        """! Get the changes other processes made since the last poll of this process.
+        Costs one PRAGMA when nothing was committed by another connection.
+        @return (list|None): The (kind, key) of the changes in order, or None if some were trimmed before this process saw them.
+        """
+        connection = self.connection
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.__local.data_version:
+            return []
+        self.__local.data_version = data_version
+        with self.__seq_lock:
+            last_seq = self.__last_seq
+            rows = connection.execute("SELECT seq, origin, kind, key FROM changes WHERE seq > ? ORDER BY seq", (last_seq,)).fetchall()
+            if not rows:
+                return []
+            self.__last_seq = rows[-1][0]
+        # Writers commit in sequence order, so a gap means the changes were trimmed before this process saw them
+        if rows[0][0] > last_seq + 1:
+            return None
+        pid = os.getpid()
+        return [(kind, key) for seq, origin, kind, key in rows if origin != pid]
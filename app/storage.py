@@ -0,0 +1,548 @@
+"""! @brief Storage Engines"""
+
+##
+# @file storage.py
+#
+# @brief Storage Engines for Cinema System
+#
+# @section description_storage Description
+# The storage.py module contains the storage engines used by the Base class to persist
+# the cinema data. Every model reads and writes its data through Base.read_from_file and
+# Base.save_to_file, which hand the call over to the engine selected at startup:
+#
+# - JsonStorage: Keeps one JSON file per table in app/database.
+# - WriteBehindStorage: The default engine, a JsonStorage that keeps saved data in memory and
+#   writes dirty files from a background flusher thread, at most once per flush interval.
+# - SQLiteStorage: An embedded SQLite database (WAL mode) with one table per JSON file,
+#   so appending or updating a single record only touches the affected row.
+#
+# @section notes_storage Notes
+# - Tables are addressed by the same filenames the models already use (e.g. BOOKINGS_FILENAME),
+#   so switching engines does not change any model code.
+# - On first use the SQLite engine imports the existing JSON files into their tables.
+# - With log_changes, the SQLite engine also records every write in a `changes` table, which
+#   lets other worker processes sharing the database notice the write (see shared.py). Appends
+#   and updates are recorded with the key of the changed row, so the other workers can read that
+#   row alone; a save of a whole table is recorded with the table only.
+#
+# @section author_cinema Author
+# Created by Elaine Xu on 28/09/2023
+
+# Imports
+from abc import ABC, abstractmethod
+import atexit
+import json
+import os
+import sqlite3
+import threading
+
+
+def copy_document(document):
+    """! Copy a parsed JSON document, so that changes to the copy do not reach the original.
+    Faster than copy.deepcopy for the plain lists, dicts and scalars that json.load returns.
+    @param document: The parsed JSON document.
+    @return: The copy.
+    """
+    if isinstance(document, dict):
+        return {key: copy_document(value) for key, value in document.items()}
+    if isinstance(document, list):
+        return [copy_document(value) for value in document]
+    return document
+
+
+class StorageEngine(ABC):
+    """! The StorageEngine class is an abstract base class for the persistence backends used by Base."""
+
+    ## True if the engine can append and update single records without rewriting the whole table.
+    row_level = False
+
+    @abstractmethod
+    def read(self, filename):
+        """! Read all records stored under a filename.
+        @param filename (str): The data file (table) to read.
+        @return (list): The stored records, or an empty list if there are none.
+        """
+        pass
+
+    @abstractmethod
+    def save(self, data, filename):
+        """! Replace all records stored under a filename.
+        @param data (list): The records to store.
+        @param filename (str): The data file (table) to write.
+        """
+        pass
+
+    def append_record(self, record, filename):
+        """! Append a single record to a table.
+        @param record (dict): The record to append.
+        @param filename (str): The data file (table) to append to.
+        """
+        data = self.read(filename)
+        data.append(record)
+        self.save(data, filename)
+
+    def update_records(self, filename, key, value, modifier):
+        """! Update the records whose key field matches a value.
+        @param filename (str): The data file (table) to update.
+        @param key (str): The name of the key field, e.g. "booking_id".
+        @param value: The key value of the records to update.
+        @param modifier (callable): Called with each matching record dictionary and changes it in place.
+        """
+        data = self.read(filename)
+        for record in data:
+            if record.get(key) == value:
+                modifier(record)
+        self.save(data, filename)
+
+    def find_records(self, filename, key, value):
+        """! Read the records whose key field matches a value.
+        @param filename (str): The data file (table) to read.
+        @param key (str): The name of the key field, e.g. "booking_id".
+        @param value: The key value of the records to read.
+        @return (list): The matching records.
+        """
+        return [record for record in self.read(filename) if record.get(key) == value]
+
+    def flush(self):
+        """! Write any data the engine still holds in memory to durable storage."""
+        pass
+
+    def close(self):
+        """! Release any resources held by the engine."""
+        pass
+
+
+class JsonStorage(StorageEngine):
+    """! The JsonStorage class stores each table as a JSON file on disk.
+    The last parsed document of every file is cached and reused while the file's
+    (st_mtime_ns, st_size) is unchanged, so a read-modify-write of a file this process
+    wrote itself does not parse the file again. Reads return a copy of the cached document
+    and saves cache a copy of the saved one, so callers can never change the cache.
+    """
+
+    def __init__(self):
+        """! Constructor for the JsonStorage class."""
+        self.__cache = {}    # filename -> (st_mtime_ns, st_size, parsed data)
+
+    def read(self, filename):
+        """! Read data from a JSON file and return it.
+        @param filename (str): The JSON file to read.
+        @return (list): A copy of the parsed data, or an empty list if the file does not exist.
+        """
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            print(f"File not found: {filename}")
+            return []
+        cached = self.__cache.get(filename)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return copy_document(cached[2])
+        with open(filename, 'r') as file:
+            data = json.load(file)
+        self.__cache[filename] = (stat.st_mtime_ns, stat.st_size, data)
+        return copy_document(data)
+
+    def save(self, data, filename):
+        """! Save data to a file in JSON format.
+        @param data: The data to save.
+        @param filename (str): The JSON file to write.
+        """
+        self.write_file(json.dumps(data, indent=4), filename, copy_document(data))
+
+    def write_file(self, text, filename, data=None):
+        """! Replace a file with new content. The content is written to a temporary file first,
+        so readers never see a partially written file.
+        @param text (str): The new file content.
+        @param filename (str): The file to write.
+        @param data: The document `text` was encoded from, cached for later reads (optional); the cache keeps it, so it must not be changed afterwards.
+        """
+        temp_filename = filename + ".tmp"
+        try:
+            file = open(temp_filename, 'w')
+        except FileNotFoundError:
+            # First file of a new directory, e.g. a screening seat shard
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            file = open(temp_filename, 'w')
+        with file:
+            file.write(text)
+        os.replace(temp_filename, filename)
+        if data is None:
+            self.__cache.pop(filename, None)
+        else:
+            stat = os.stat(filename)
+            self.__cache[filename] = (stat.st_mtime_ns, stat.st_size, data)
+
+
+class WriteBehindStorage(JsonStorage):
+    """! The WriteBehindStorage class keeps saved data in memory and writes it to the JSON files in the background."""
+
+    def __init__(self, interval=1.0, synchronous=False):
+        """! Constructor for the WriteBehindStorage class.
+        @param interval (float): Seconds between two flushes of the dirty files.
+        @param synchronous (bool): Write every save straight to disk instead (e.g. for tests).
+        """
+        super().__init__()
+        self.__interval = interval
+        self.__synchronous = synchronous
+        self.__pending = {}          # filename -> (data, version) saved but not written yet
+        self.__version = 0
+        self.__lock = threading.Lock()
+        self.__flush_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+        if not synchronous:
+            self.__thread = threading.Thread(target=self.run_flusher, name="write-behind-flusher", daemon=True)
+            self.__thread.start()
+            atexit.register(self.close)
+
+    @property
+    def dirty_files(self):
+        """! Get the files with saved data that has not been written yet.
+        @return (list): The file names.
+        """
+        with self.__lock:
+            return list(self.__pending)
+
+    def read(self, filename):
+        """! Read data, preferring data saved in memory over the file on disk.
+        @param filename (str): The JSON file to read.
+        @return (list): A copy of the data, which the caller may change.
+        """
+        with self.__lock:
+            if filename in self.__pending:
+                return copy_document(self.__pending[filename][0])
+        return super().read(filename)
+
+    def save(self, data, filename):
+        """! Save data in memory and mark the file dirty. The flusher thread writes it later.
+        @param data: The data to save; the engine keeps it, so the caller must not change it afterwards.
+        @param filename (str): The JSON file to write.
+        """
+        if self.__synchronous:
+            return super().save(data, filename)
+        with self.__lock:
+            self.__version += 1
+            self.__pending[filename] = (data, self.__version)
+
+    def append_record(self, record, filename):
+        """! Append a single record to a table.
+        @param record (dict): The record to append.
+        @param filename (str): The data file (table) to append to.
+        """
+        # The whole read-modify-save runs under the lock, so concurrent appends are not lost
+        # and the flusher never serialises the data mid-update
+        with self.__lock:
+            data = self.__current_data(filename)
+            data.append(record)
+            self.__store(data, filename)
+
+    def update_records(self, filename, key, value, modifier):
+        """! Update the records whose key field matches a value.
+        @param filename (str): The data file (table) to update.
+        @param key (str): The name of the key field, e.g. "booking_id".
+        @param value: The key value of the records to update.
+        @param modifier (callable): Called with each matching record dictionary and changes it in place.
+        """
+        with self.__lock:
+            data = self.__current_data(filename)
+            for record in data:
+                if record.get(key) == value:
+                    modifier(record)
+            self.__store(data, filename)
+
+    def __current_data(self, filename):
+        """! Get the data to change in place: the data saved in memory, or else the file on disk.
+        The caller holds the lock.
+        @param filename (str): The JSON file.
+        @return (list): The data.
+        """
+        pending = self.__pending.get(filename)
+        if pending is not None:
+            return pending[0]
+        return super().read(filename)
+
+    def __store(self, data, filename):
+        """! Save changed data, the caller holding the lock.
+        @param data: The data to save.
+        @param filename (str): The JSON file to write.
+        """
+        if self.__synchronous:
+            super().save(data, filename)
+            return
+        self.__version += 1
+        self.__pending[filename] = (data, self.__version)
+
+    def flush(self):
+        """! Write every dirty file to disk once and wait until it is written."""
+        with self.__flush_lock:
+            with self.__lock:
+                # Serialise under the lock, so the data cannot change while it is encoded
+                # and keep a copy for the read cache, since appends change the pending data in place
+                writes = [(filename, json.dumps(data, indent=4), copy_document(data), version)
+                          for filename, (data, version) in self.__pending.items()]
+            for filename, text, data, version in writes:
+                with self.__lock:
+                    # Only cache the document if it was not changed again after it was encoded
+                    is_current = self.__pending.get(filename, (None, None))[1] == version
+                self.write_file(text, filename, data if is_current else None)
+                with self.__lock:
+                    # Keep the entry if it was saved again while it was being written
+                    if self.__pending.get(filename, (None, None))[1] == version:
+                        del self.__pending[filename]
+
+    def run_flusher(self):
+        """! Flush the dirty files every interval until the engine is closed."""
+        while not self.__stopped.wait(self.__interval):
+            try:
+                self.flush()
+            except OSError as error:
+                print(f"Write-behind flush failed: {error}")
+
+    def close(self):
+        """! Stop the flusher thread and write all remaining dirty files."""
+        self.__stopped.set()
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.flush()
+
+
+class SQLiteStorage(StorageEngine):
+    """! The SQLiteStorage class stores each table in an embedded SQLite database."""
+
+    row_level = True
+
+    ## Indexed key columns of each table; the first one is unique. Every table also keeps the full record as JSON in `data`.
+    TABLES = {
+        "admins": ["username"],
+        "bookings": ["booking_id", "customer_username", "screening_id", "payment_id"],
+        "cinema_hall": ["hall_name"],
+        "coupons": ["coupon_code"],
+        "customers": ["username"],
+        "front_desk_staffs": ["username"],
+        "movies": ["movie_id"],
+        "notifications": ["notification_id", "customer_username", "booking_id"],
+        "payments": ["payment_id"],
+        "screenings": ["screening_id", "movie_id"],
+    }
+
+    def __init__(self, database_filename, data_directory=None, document_directories=(), log_changes=False):
+        """! Constructor for the SQLiteStorage class.
+        @param database_filename (str): The path of the SQLite database file.
+        @param data_directory (str): Directory of the JSON files to import into empty tables (optional).
+        @param document_directories (list): Directories whose JSON files are imported as documents (optional).
+        @param log_changes (bool): Record every write in the changes table, for other processes sharing the database.
+        """
+        self.__database_filename = database_filename
+        self.__log_changes = log_changes
+        self.__local = threading.local()
+        self.create_tables()
+        if data_directory:
+            self.import_json_files(data_directory)
+        for directory in document_directories:
+            self.import_documents(directory)
+
+    @property
+    def database_filename(self):
+        """! Get the path of the SQLite database file.
+        @return (str): The database file path.
+        """
+        return self.__database_filename
+
+    @property
+    def connection(self):
+        """! Get the SQLite connection of the current thread.
+        @return (sqlite3.Connection): The connection, opened in WAL mode.
+        """
+        connection = getattr(self.__local, "connection", None)
+        # A connection opened before a fork (e.g. gunicorn --preload) must not be used by the child process
+        if connection is None or self.__local.pid != os.getpid():
+            connection = sqlite3.connect(self.__database_filename, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+            self.__local.pid = os.getpid()
+        return connection
+
+    def create_tables(self):
+        """! Create the tables and their key indexes if they do not exist yet.
+        The first key column of each table gets a UNIQUE index, so a record with a key that is already taken
+        (e.g. an ID handed out twice) is refused with sqlite3.IntegrityError instead of stored next to the other.
+        """
+        with self.connection as connection:
+            for table, columns in self.TABLES.items():
+                column_sql = "".join(f"{column}, " for column in columns)
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {column_sql}data TEXT NOT NULL)")
+                try:
+                    connection.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_{columns[0]} ON {table} ({columns[0]})")
+                    # Replaces the plain index of the key column made by earlier versions
+                    connection.execute(f"DROP INDEX IF EXISTS idx_{table}_{columns[0]}")
+                except sqlite3.IntegrityError:
+                    print(f"Table {table} has duplicate {columns[0]} values; keeping its non-unique index.")
+                    connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{columns[0]} ON {table} ({columns[0]})")
+                for column in columns[1:]:
+                    connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+            # Anything that is not one of the tables above is stored as a single document
+            connection.execute("CREATE TABLE IF NOT EXISTS documents (filename TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            # Change log: one row per write, tagged with the process that made it (see log_change)
+            connection.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, origin INTEGER NOT NULL, kind TEXT NOT NULL, key TEXT)")
+
+    def log_change(self, connection, filename, key=None, value=None):
+        """! Record a write in the changes table, in the transaction of the write, if changes are logged.
+        A change of a single row is recorded as kind "row" with the JSON list [filename, key, value] as its key,
+        any other write as kind "table" with the filename as its key.
+        @param connection (sqlite3.Connection): The connection of the write's transaction.
+        @param filename (str): The data file (table) that was written.
+        @param key (str): The key column of the changed row, None if the whole table was written.
+        @param value: The key value of the changed row.
+        """
+        if not self.__log_changes:
+            return
+        if key is None:
+            connection.execute("INSERT INTO changes (origin, kind, key) VALUES (?, 'table', ?)", (os.getpid(), filename))
+        else:
+            connection.execute("INSERT INTO changes (origin, kind, key) VALUES (?, 'row', ?)",
+                               (os.getpid(), json.dumps([filename, key, value])))
+
+    def import_json_files(self, data_directory):
+        """! Import the JSON file of every empty table.
+        @param data_directory (str): The directory containing the JSON files.
+        """
+        json_storage = JsonStorage()
+        for table in self.TABLES:
+            json_filename = os.path.join(data_directory, table + ".json")
+            if os.path.exists(json_filename) and self.is_empty(table):
+                self.save(json_storage.read(json_filename), json_filename)
+
+    def import_documents(self, directory):
+        """! Import the JSON files of a directory that are not stored as documents yet.
+        @param directory (str): The directory containing the JSON files, e.g. the screening seat shards.
+        """
+        if not os.path.isdir(directory):
+            return
+        json_storage = JsonStorage()
+        with self.connection as connection:
+            for name in sorted(os.listdir(directory)):
+                filename = os.path.join(directory, name)
+                if name.endswith(".json"):
+                    connection.execute("INSERT OR IGNORE INTO documents (filename, data) VALUES (?, ?)",
+                                       (filename, json.dumps(json_storage.read(filename))))
+
+    def is_empty(self, table):
+        """! Check if a table has no rows.
+        @param table (str): The table name.
+        @return (bool): True if the table is empty.
+        """
+        return self.connection.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None
+
+    def table_for(self, filename):
+        """! Get the table name used for a data file.
+        @param filename (str): The data file path, e.g. "app/database/bookings.json".
+        @return (str|None): The table name, or None if the file is stored as a document.
+        """
+        table = os.path.splitext(os.path.basename(filename))[0]
+        return table if table in self.TABLES else None
+
+    def row_values(self, table, record):
+        """! Get the values of a record for the columns of its table.
+        @param table (str): The table name.
+        @param record (dict): The record to store.
+        @return (list): The key column values followed by the record as JSON.
+        """
+        return [record.get(column) for column in self.TABLES[table]] + [json.dumps(record)]
+
+    def insert_sql(self, table):
+        """! Get the INSERT statement for a table.
+        @param table (str): The table name.
+        @return (str): The SQL statement.
+        """
+        columns = self.TABLES[table] + ["data"]
+        placeholders = ", ".join("?" for column in columns)
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def read(self, filename):
+        """! Read all records of a table in insertion order.
+        @param filename (str): The data file (table) to read.
+        @return (list): The stored records.
+        """
+        table = self.table_for(filename)
+        if table is None:
+            row = self.connection.execute("SELECT data FROM documents WHERE filename = ?", (filename,)).fetchone()
+            return json.loads(row[0]) if row else []
+        rows = self.connection.execute(f"SELECT data FROM {table} ORDER BY id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save(self, data, filename):
+        """! Replace all records of a table in one transaction.
+        @param data (list): The records to store.
+        @param filename (str): The data file (table) to write.
+        """
+        table = self.table_for(filename)
+        with self.connection as connection:
+            self.log_change(connection, filename)
+            if table is None:
+                connection.execute("INSERT OR REPLACE INTO documents (filename, data) VALUES (?, ?)", (filename, json.dumps(data)))
+                return
+            connection.execute(f"DELETE FROM {table}")
+            connection.executemany(self.insert_sql(table), [self.row_values(table, record) for record in data])
+
+    def append_record(self, record, filename):
+        """! Insert a single row.
+        @param record (dict): The record to append.
+        @param filename (str): The data file (table) to append to.
+        """
+        table = self.table_for(filename)
+        if table is None:
+            return super().append_record(record, filename)
+        with self.connection as connection:
+            connection.execute(self.insert_sql(table), self.row_values(table, record))
+            key = self.TABLES[table][0]
+            self.log_change(connection, filename, key, record.get(key))
+
+    def update_records(self, filename, key, value, modifier):
+        """! Update the matching rows found through the key column index.
+        The rows are read and written in one BEGIN IMMEDIATE transaction, which holds the database's write lock
+        from the read on, so an update another process makes to the same rows in between cannot be lost.
+        @param filename (str): The data file (table) to update.
+        @param key (str): The name of the key column, e.g. "booking_id".
+        @param value: The key value of the rows to update.
+        @param modifier (callable): Called with each matching record dictionary and changes it in place.
+        """
+        table = self.table_for(filename)
+        if table is None or key not in self.TABLES[table]:
+            return super().update_records(filename, key, value, modifier)
+        with self.connection as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(f"SELECT id, data FROM {table} WHERE {key} = ?", (value,)).fetchall()
+            for row_id, data in rows:
+                record = json.loads(data)
+                modifier(record)
+                assignments = ", ".join(f"{column} = ?" for column in self.TABLES[table] + ["data"])
+                connection.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", self.row_values(table, record) + [row_id])
+            if rows:
+                self.log_change(connection, filename, key, value)
+
+    def find_records(self, filename, key, value):
+        """! Read the rows whose key column matches a value, through the key column index.
+        @param filename (str): The data file (table) to read.
+        @param key (str): The name of the key column, e.g. "booking_id".
+        @param value: The key value of the rows to read.
+        @return (list): The matching records in insertion order.
+        """
+        table = self.table_for(filename)
+        if table is None or key not in self.TABLES[table]:
+            return super().find_records(filename, key, value)
+        rows = self.connection.execute(f"SELECT data FROM {table} WHERE {key} = ? ORDER BY id", (value,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def flush(self):
+        """! Copy the committed writes from the write-ahead log into the database file, and empty the log.
+        Afterwards the database file alone holds the data, as it does once the last connection is closed.
+        """
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """! Close the connection of the current thread."""
+        connection = getattr(self.__local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
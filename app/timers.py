@@ -0,0 +1,143 @@
+"""! @brief Timer Wheel"""
+
+##
+# @file timers.py
+#
+# @brief Hierarchical Timer Wheel for Cinema System
+#
+# @section description_timers Description
+# The timers.py module contains the TimerWheel class, which keeps many timers (e.g. the seat
+# holds of pending bookings) and tells which of them have expired, in O(1) per timer and per
+# tick instead of scanning all timers:
+#
+# - Time is cut into ticks (one second by default). Level 0 of the wheel has one slot per tick
+#   for the next SLOTS ticks; each higher level has one slot per SLOTS slots of the level below.
+# - A timer is put in the slot of the lowest level that covers its deadline. When the clock
+#   reaches the start of a higher level slot, the timers in that slot cascade down a level.
+# - Scheduling and cancelling a timer are dictionary operations; advancing the clock visits one
+#   level 0 slot per tick, plus the higher level slot being cascaded.
+#
+# @section notes_timers Notes
+# - Deadlines are measured with time.monotonic. Timers are not kept in pickles (see
+#   CinemaController.save_snapshot): an unpickled wheel is empty.
+#
+# @section author_cinema Author
+# Created by Elaine Xu on 28/09/2023
+
+# Imports
+import math
+import threading
+import time
+
+
+class TimerWheel:
+    """! The TimerWheel class: A hierarchical timing wheel of keyed timers."""
+
+    def __init__(self, tick=1.0, slots=64, levels=4):
+        """! Constructor for the TimerWheel class.
+        @param tick (float): The length of a tick in seconds, the resolution of the timers.
+        @param slots (int): The number of slots of each level.
+        @param levels (int): The number of levels; timers further away than slots ** levels ticks cascade more than once.
+        """
+        self.__tick = tick
+        self.__slots = slots
+        self.__levels = levels
+        self.__wheels = [[{} for _ in range(slots)] for _ in range(levels)]  # level -> slot -> {key: deadline tick}
+        self.__timers = {}              # key -> (level, slot)
+        self.__current_tick = self.__tick_at(time.monotonic())
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        """! Pickle the wheel settings only; the timers are relative to this process's monotonic clock."""
+        return {"tick": self.__tick, "slots": self.__slots, "levels": self.__levels}
+
+    def __setstate__(self, state):
+        self.__init__(state["tick"], state["slots"], state["levels"])
+
+    def __len__(self):
+        return len(self.__timers)
+
+    def __contains__(self, key):
+        return key in self.__timers
+
+    def __tick_at(self, now):
+        """! Get the tick number of a monotonic time.
+        @param now (float): The time in seconds.
+        @return (int): The tick number.
+        """
+        return int(now // self.__tick)
+
+    def schedule(self, key, delay):
+        """! Start a timer, or restart it if the key already has one.
+        @param key (hashable): The key of the timer, e.g. a booking ID.
+        @param delay (float): The number of seconds until the timer expires.
+        """
+        with self.__lock:
+            self.__cancel(key)
+            self.__place(key, self.__current_tick + max(1, math.ceil(delay / self.__tick)))
+
+    def cancel(self, key):
+        """! Stop a timer.
+        @param key (hashable): The key of the timer.
+        @return (bool): True if the timer was running, False if it had expired or did not exist.
+        """
+        with self.__lock:
+            return self.__cancel(key)
+
+    def __cancel(self, key):
+        """! Stop a timer; the caller holds the lock."""
+        position = self.__timers.pop(key, None)
+        if position is None:
+            return False
+        level, slot = position
+        del self.__wheels[level][slot][key]
+        return True
+
+    def __place(self, key, deadline):
+        """! Put a timer in the slot of the lowest level that covers its deadline; the caller holds the lock.
+        @param key (hashable): The key of the timer.
+        @param deadline (int): The tick at which the timer expires (later than the current tick).
+        """
+        delta = deadline - self.__current_tick
+        level = 0
+        while level < self.__levels - 1 and delta >= self.__slots ** (level + 1):
+            level += 1
+        slot = (deadline // self.__slots ** level) % self.__slots
+        self.__wheels[level][slot][key] = deadline
+        self.__timers[key] = (level, slot)
+
+    def advance(self, now=None):
+        """! Move the clock forward and collect the timers that have expired.
+        @param now (float): The current monotonic time (time.monotonic() if not given).
+        @return (list): The keys of the expired timers, which are removed from the wheel.
+        """
+        target = self.__tick_at(time.monotonic() if now is None else now)
+        expired = []
+        with self.__lock:
+            if not self.__timers:
+                self.__current_tick = max(self.__current_tick, target)
+                return expired
+            while self.__current_tick < target and self.__timers:
+                self.__current_tick += 1
+                tick = self.__current_tick
+                # Cascade the higher level slots that start at this tick, highest first
+                for level in range(self.__levels - 1, 0, -1):
+                    if tick % self.__slots ** level == 0:
+                        self.__rehash(self.__wheels[level][(tick // self.__slots ** level) % self.__slots], expired)
+                self.__rehash(self.__wheels[0][tick % self.__slots], expired)
+            self.__current_tick = max(self.__current_tick, target)
+        return expired
+
+    def __rehash(self, bucket, expired):
+        """! Empty a slot: expire its due timers and put the others back in a lower level; the caller holds the lock.
+        @param bucket (dict): The slot, {key: deadline tick}.
+        @param expired (list): The list to add the keys of the expired timers to.
+        """
+        entries = list(bucket.items())
+        bucket.clear()
+        for key, deadline in entries:
+            del self.__timers[key]
+            if deadline <= self.__current_tick:
+                expired.append(key)
+            else:
+                self.__place(key, deadline)
@@ -2,7 +2,7 @@
 from flask import Blueprint, flash
 from . import LincolnCinema
 from .models import *
-from flask import g, redirect, render_template, request, session, url_for, send_from_directory, abort
+from flask import g, redirect, render_template, request, session, url_for, send_from_directory, abort, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import os
@@ -16,8 +16,6 @@ views = Blueprint('views', __name__)
 
 
 # CONSTANT VARIABLES
-LANGUAGE_LIST = sorted(LincolnCinema.get_language_list())
-GENRE_LIST = sorted(LincolnCinema.get_genre_list())
 ALLOWED_EXTENSIONS = set(['jpg'])
 
 
@@ -26,14 +24,21 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# Make the number of active movies per language and genre available to all templates (for the filter dropdowns)
+@views.app_context_processor
+def inject_movie_facets():
+    return dict(language_counts=LincolnCinema.get_language_counts(active_only=True),
+                genre_counts=LincolnCinema.get_genre_counts(active_only=True))
+
+
 # ========= Authentication Routes =========
 # Route for the home page
 @views.route('/')
 def home():
     # Retrieve a list of all movies, language list, and genre list
     all_movies = LincolnCinema.all_movies
-    language_list = LANGUAGE_LIST
-    genre_list = GENRE_LIST
+    language_list = LincolnCinema.get_language_list(active_only=True)
+    genre_list = LincolnCinema.get_genre_list(active_only=True)
     return render_template('home.html', all_movies=all_movies, language_list=language_list, genre_list=genre_list )
 
 
@@ -41,18 +46,29 @@ def home():
 @views.before_request
 def before_request():
     g.user = None
+    # Pick up the changes of other worker processes, if the seat state is shared
+    LincolnCinema.sync_shared_state()
+    # Keep the data of this process in place until the request is done (released in teardown_request)
+    LincolnCinema.begin_request()
+    g.serving_request = True
+    # Release the seat holds of pending bookings that have run out of time
+    LincolnCinema.expire_holds()
 
     if 'user_username' in session:
-        # Try to find the user in customers, admins, and front_desk_staffs
-        user = next((x for x in LincolnCinema.all_customers if x.username == session['user_username']), None)
-        if user is None:
-            user = next((x for x in LincolnCinema.all_admins if x.username == session['user_username']), None)
-        if user is None:
-            user = next((x for x in LincolnCinema.all_front_desk_staffs if x.username == session['user_username']), None)
+        # Find the user among customers, admins and front desk staffs
+        user, role = LincolnCinema.find_user(session['user_username'])
         if user:
             g.user = user
 
 
+# Define a function to be executed after each request, even one that failed
+@views.teardown_request
+def teardown_request(exception):
+    if g.pop('serving_request', False):
+        LincolnCinema.end_request()
+
+
+
 # Route for the login page
 @views.route('/login', methods=['GET', 'POST'])
 def login():
@@ -67,16 +83,8 @@ def login():
             flash("Both username and password are required.", 'error')
             return redirect(url_for('views.login'))
 
-        user = None
-        try:
-            # Try to find the user in customers, admins, and front_desk_staffs
-            user = next((x for x in LincolnCinema.all_customers if x.username == username), None)
-            if user is None:
-                user = next((x for x in LincolnCinema.all_admins if x.username == username), None)
-            if user is None:
-                user = next((x for x in LincolnCinema.all_front_desk_staffs if x.username == username), None)
-        except StopIteration:
-            user = None
+        # Find the user among customers, admins and front desk staffs
+        user, role = LincolnCinema.find_user(username)
         #  Validate user credentials
         if user is not None and check_password_hash(user.password, password):
             session['user_username'] = user.username
@@ -158,17 +166,7 @@ def logout():
 def view_movie_details(movie_id):
     # check if user logged in and find is user a customer, admin or staff
     if g.user:
-        username = g.user.username
-        customer = LincolnCinema.find_customer(username)
-        admin = LincolnCinema.find_admin(username)
-        staff = LincolnCinema.find_staff(username)
-
-        if customer:
-            user = customer
-        elif admin:
-            user = admin
-        elif staff:
-            user = staff
+        user = g.user
     else:
         # Create a Guest object
         user = Guest()
@@ -177,23 +175,22 @@ def view_movie_details(movie_id):
     movie_id = int(movie_id)
     # find movie object
     movie = LincolnCinema.find_movie(movie_id)
-    # Filter the list of screenings to include only active screenings
-    active_screenings = [screening for screening in movie.screenings if screening.is_active == True]
-    # Get a list of screening dates for the movie
-    screening_date_list = movie.get_screening_date_list()
+    # Get the movie's upcoming active screenings grouped by date, and the list of their dates
+    screenings_by_date = movie.upcoming_screenings_by_date()
+    screening_date_list = list(screenings_by_date)
 
     if isinstance(user, Customer):
         # Customer
-        return render_template('cus_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, active_screenings=active_screenings)
+        return render_template('cus_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, screenings_by_date=screenings_by_date)
     elif isinstance(user, FrontDeskStaff):
         # Front Desk Staff
-        return render_template('staff_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, active_screenings=active_screenings)
+        return render_template('staff_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, screenings_by_date=screenings_by_date)
     elif isinstance(user, Admin):
         # Admin
-        return render_template('admin_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, active_screenings=active_screenings)
+        return render_template('admin_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, screenings_by_date=screenings_by_date)
     elif isinstance(user, Guest):
         # Admin
-        return render_template('guest_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, active_screenings=active_screenings)
+        return render_template('guest_view_movie_details.html', movie=movie, screening_date_list=screening_date_list, screenings_by_date=screenings_by_date)
 
 
 
@@ -203,17 +200,7 @@ def view_movie_details(movie_id):
 def filter_movies():
     # check if user logged in and find is user a customer, admin or staff
     if g.user:
-        username = g.user.username
-        customer = LincolnCinema.find_customer(username)
-        admin = LincolnCinema.find_admin(username)
-        staff = LincolnCinema.find_staff(username)
-
-        if customer:
-            user = customer
-        elif admin:
-            user = admin
-        elif staff:
-            user = staff
+        user = g.user
     else:
         # Create a Guest object
         user = Guest()
@@ -234,8 +221,8 @@ def filter_movies():
 
         # Filter movies based on the selected criteria
         filtered_movies = LincolnCinema.filter_movies(title, selected_language, selected_genre, date_from, date_to, user)
-        language_list = LANGUAGE_LIST
-        genre_list = GENRE_LIST
+        language_list = LincolnCinema.get_language_list(active_only=True)
+        genre_list = LincolnCinema.get_genre_list(active_only=True)
 
         if isinstance(user, Customer):
             # Customer
@@ -275,8 +262,8 @@ def admin_home():
         return redirect(url_for('views.login'))
     # Retrieve a list of all movies, language list, and genre list
     all_movies = LincolnCinema.all_movies
-    language_list = LANGUAGE_LIST
-    genre_list = GENRE_LIST
+    language_list = LincolnCinema.get_language_list(active_only=True)
+    genre_list = LincolnCinema.get_genre_list(active_only=True)
     return render_template('admin_home.html', all_movies=all_movies, language_list=language_list, genre_list=genre_list)
 
 # route for adding a new movie by admin
@@ -387,19 +374,17 @@ def admin_add_screening(movie_id):
         screening = Screening(movie_id, screening_date, start_time, end_time, hall, seats)
 
         # Add the screening to the movie object
-        movie.add_screening(screening)
+        LincolnCinema.add_screening(movie, screening)
 
         # Get the seat data for this screening
         LincolnCinema.save_new_screening_to_json(screening)
 
-        # Get a list of screening dates for the movie
-        screening_date_list = movie.get_screening_date_list()
-        
-        # Filter the list of screenings to include only active screenings
-        active_screenings = [screening for screening in movie.screenings if screening.is_active]
+        # Get the movie's upcoming active screenings grouped by date, and the list of their dates
+        screenings_by_date = movie.upcoming_screenings_by_date()
+        screening_date_list = list(screenings_by_date)
 
          # Redirect to the admin view movie details page
-        return render_template('admin_view_movie_details.html', movie = movie, screening_date_list=screening_date_list, active_screenings=active_screenings)
+        return render_template('admin_view_movie_details.html', movie = movie, screening_date_list=screening_date_list, screenings_by_date=screenings_by_date)
     # Render the admin add screening page with movie and hall information
     return render_template('admin_add_screening.html', movie=movie, movie_duration=movie_duration, hall_name_list=hall_name_list)
 
@@ -408,18 +393,15 @@ def admin_add_screening(movie_id):
 @views.route('screening_booking_details/<movie_id>/<screening_id>')
 def screening_booking_details(movie_id, screening_id):
     movie = LincolnCinema.find_movie(int(movie_id))
-    screening = movie.find_screening(screening_id)
-    all_customers = LincolnCinema.all_customers
+    screening = LincolnCinema.find_screening(screening_id)
     
     # Create lists to store customers who booked the screening and their paid bookings
     customers_who_booked_screening = []
     paid_bookings = []
-    for customer in all_customers:
-        for booking in customer.bookings():
-            if booking.movie.id == int(movie_id) and booking.screening.screening_id == int(screening_id):
-                customers_who_booked_screening.append(customer)
-                if booking.status == 'Paid':
-                    paid_bookings.append(booking)  # Add paid bookings to the list
+    for booking in LincolnCinema.find_screening_bookings(screening_id):
+        customers_who_booked_screening.append(booking.customer)
+        if booking.status == 'Paid':
+            paid_bookings.append(booking)  # Add paid bookings to the list
     
     # Render the admin screening details page with the screening, movie, and related data
     return render_template('admin_screening_details.html', screening=screening, movie=movie,
@@ -447,19 +429,11 @@ def admin_refund_booking(booking_id, username):
     is_success = creditcard_payment.process_refund()
     
     if is_success:
-        reserved_seats_id = []
-        for seat in booking.selected_seats:
-            seat_id = seat.seat_id
-            reserved_seats_id.append(seat_id)
-            for screening_seat in booking.screening.seats:
-                if screening_seat.seat_id == seat_id:
-                    screening_seat.is_reserved = False
-        is_reserved = False       
-        Screening.update_reserved_seats_to_json(screening_id, reserved_seats_id, is_reserved)
+        LincolnCinema.release_seats(booking)
 
         new_status = 'Refunded'
         booking.status = new_status
-        Admin.cancel_booking(booking_id, new_status)
+        LincolnCinema.update_status_to_canceled(booking_id, new_status)
 
         # Create a confirmation notification
         confirmation_message = "Due to the screening cancellation, your booking has been refunded. We apologize for any inconvenience caused."
@@ -481,19 +455,18 @@ def admin_cancel_screening(screening_id, movie_id):
     # Find the screening to cancel
     movie = LincolnCinema.find_movie(movie_id)
 
-    # Find the screening to cancel within the movie
-    screening = movie.find_screening(screening_id)
+    # Find the screening to cancel
+    screening = LincolnCinema.find_screening(screening_id)
 
     if screening:
         # Check if there are reserved seats for the screening
-        has_reserved_seats = any(seat.is_reserved for seat in screening.seats)
+        has_reserved_seats = screening.has_reserved_seats()
 
         if has_reserved_seats:
             flash('There are reserved seats for this screening. Please refund booking first.', 'error')
         else:
             # Set the screening as inactive and update it in JSON
-            screening.is_active = False
-            Screening.update_screening_status_to_inactive_to_json(screening_id)
+            LincolnCinema.cancel_screening(screening_id)
 
             flash(f"Screening ID {screening_id} has been successfully cancelled.", 'success')
     else:
@@ -512,8 +485,8 @@ def customer_home():
         return redirect(url_for('views.login'))
     # Get all movies, language, and genre lists
     all_movies = LincolnCinema.all_movies
-    language_list = LANGUAGE_LIST
-    genre_list = GENRE_LIST
+    language_list = LincolnCinema.get_language_list(active_only=True)
+    genre_list = LincolnCinema.get_genre_list(active_only=True)
     # Render the customer home page with the data
     return render_template('cus_home.html', all_movies=all_movies, language_list=language_list, genre_list=genre_list)
 
@@ -536,11 +509,7 @@ def customer_select_seats(movie_id, screening_date, start_time):
             # Convert the list of dictionaries into a list of lists
             selected_seats_id_list = [str(seat['rowNumber'])+str(seat['seatNumber']) for seat in selected_seats]
             # get seat objects
-            seat_objects = []
-            for seat in screening.seats:
-                for seat_id in selected_seats_id_list:
-                    if seat.seat_id == seat_id:
-                        seat_objects.append(seat)
+            seat_objects = screening.find_seats(selected_seats_id_list)
             num_of_seats = len(seat_objects)
             # caculate total_price
             total_price = 0
@@ -553,16 +522,24 @@ def customer_select_seats(movie_id, screening_date, start_time):
             status = 'Pending'
             # create book object
             new_booking = Booking(customer, movie, screening, num_of_seats, seat_objects, current_date, total_price, status, payment_method)
-            is_booking_repeated = customer.add_booking(new_booking)
+            # Hold the selected seats for the payment, unless someone else has taken or is holding them
+            # Seats chosen from an older seat map are accepted as long as they are still free
+            if not LincolnCinema.hold_seats(new_booking, expected_version=request.form.get('seat_version', type=int)):
+                flash('Seats have become unavailable. Please choose your seats again.', 'error')
+                return redirect(url_for('views.customer_select_seats', movie_id=movie_id, screening_date = screening_date,start_time=start_time ))
+            is_booking_repeated = LincolnCinema.add_booking(customer, new_booking)
             if is_booking_repeated:
                 Booking.save_new_bookings_to_json(new_booking)
             else:
+                LincolnCinema.release_hold(new_booking)
                 flash('You have unpaid booking for this screening', 'error')
                 return redirect(url_for('views.customer_select_seats', movie_id=movie_id, screening_date = screening_date,start_time=start_time ))                
             return render_template('cus_checkout.html', booking=new_booking)
 
-    # Pass the screening object to the seat selection page
-    return render_template('cus_select_seats.html', screening=screening, movie=movie)
+    # Pass the screening object and a consistent seat map with its version to the seat selection page
+    seat_version, seat_map = screening.seat_snapshot()
+    return render_template('cus_select_seats.html', screening=screening, movie=movie,
+                           seat_version=seat_version, seat_map=seat_map)
 
 
 # Route for validating a coupon for a booking
@@ -670,6 +647,10 @@ def customer_credit_card_payment(booking_id):
                             name_on_card=card_holder_name
                         )
                         payment_id = credit_card_payment.payment_id
+                        # Reserve the seats atomically before taking the payment, so two buyers cannot pay for the same seat
+                        if not LincolnCinema.reserve_seats(booking):
+                            flash('Seats have become unavailable. Please start a new booking and choose your seats again.', 'error')
+                            return render_template('cus_home.html')
                         # Process the payment (you may add this logic in CreditCard.process_payment)
                         payment_successful = credit_card_payment.process_payment()
                         print(f'new credit card: {credit_card_payment}')         
@@ -688,11 +669,11 @@ def customer_credit_card_payment(booking_id):
                             payment_method = 'Credit Card'
                             booking.payment_method = payment_method
                             LincolnCinema.update_booking_payment_and_status(booking_id, payment_id, new_status, payment_method)
-                            
-                            LincolnCinema.reserve_seats(booking)
                             # Redirect to a success or confirmation page
                             return redirect(url_for('views.customer_confirm_booking', booking_id=booking_id))
                         else:
+                            # Hold the seats again for a new lease, so the booking expires if it is not paid in time
+                            LincolnCinema.restore_hold(booking)
                             flash('Payment processing failed. Please verify your payment information and try again. If the issue persists, please contact our customer support for assistance.', 'error')
                     else:
                         flash('Card has expired. Please use a valid card.', 'error')
@@ -720,16 +701,15 @@ def customer_cash_payment(booking_id):
     coupon = booking.coupon
     if request.method == 'POST':
         amount = request.form.get('amount')
-        is_seats_available = LincolnCinema.check_seat_availability(booking)
         
         if float(amount) == booking.total_amount:
-            if is_seats_available == True: 
+            # Reserve the seats atomically before marking the booking as paid
+            if LincolnCinema.reserve_seats(booking): 
                 new_status = 'Paid'
                 booking.status = new_status
                 payment_method = 'Cash'
                 booking.payment_method = payment_method
                 LincolnCinema.update_booking_payment_method(booking_id, payment_method, new_status)
-                LincolnCinema.reserve_seats(booking)
 
             else:
                 flash('Seats have become unavailable. Please cancel your booking and start a new booking again.', 'error')
@@ -762,6 +742,7 @@ def customer_cancel_booking(booking_id):
     booking = customer.find_booking(booking_id)
     # Cancel the booking and update its status
     customer.cancel_booking(booking_id)
+    LincolnCinema.release_hold(booking)
     bookings = customer.bookings()
     new_status = 'Canceled'
     LincolnCinema.update_status_to_canceled(booking_id, new_status)
@@ -824,19 +805,15 @@ def staff_home():
     if not g.user:
         return redirect(url_for('views.login'))
     all_movies = LincolnCinema.all_movies
-    language_list = LANGUAGE_LIST
-    genre_list = GENRE_LIST
+    language_list = LincolnCinema.get_language_list(active_only=True)
+    genre_list = LincolnCinema.get_genre_list(active_only=True)
     return render_template('staff_home.html', all_movies=all_movies, language_list=language_list, genre_list=genre_list)
 
 # Routes for staff view all bookings
 @views.route('/staff_view_bookings')
 def staff_view_bookings():
     # get all bookings
-    all_bookings = []
-    all_customers = LincolnCinema.all_customers
-    for customer in all_customers:
-        for booking in customer.bookings():
-            all_bookings.append(booking)    
+    all_bookings = LincolnCinema.all_bookings
     return render_template('staff_view_bookings.html', all_bookings=all_bookings)
 
 
@@ -860,19 +837,11 @@ def staff_refund_booking(booking_id, username):
         print('cash refund')
         is_success =True
         if is_success:
-            reserved_seats_id = []
-            for seat in booking.selected_seats:
-                seat_id = seat.seat_id
-                reserved_seats_id.append(seat_id)
-                for screening_seat in booking.screening.seats:
-                    if screening_seat.seat_id == seat_id:
-                        screening_seat.is_reserved = False
-            is_reserved = False       
-            Screening.update_reserved_seats_to_json(screening_id, reserved_seats_id, is_reserved)
+            LincolnCinema.release_seats(booking)
 
             new_status = 'Refunded'
             booking.status = new_status
-            FrontDeskStaff.cancel_booking(booking_id, new_status)
+            LincolnCinema.update_status_to_canceled(booking_id, new_status)
 
             # Create a confirmation notification
             confirmation_message = "Your booking has been refunded successffully."
@@ -892,19 +861,11 @@ def staff_refund_booking(booking_id, username):
         is_success = creditcard_payment.process_refund()
         
         if is_success:
-            reserved_seats_id = []
-            for seat in booking.selected_seats:
-                seat_id = seat.seat_id
-                reserved_seats_id.append(seat_id)
-                for screening_seat in booking.screening.seats:
-                    if screening_seat.seat_id == seat_id:
-                        screening_seat.is_reserved = False
-            is_reserved = False       
-            Screening.update_reserved_seats_to_json(screening_id, reserved_seats_id, is_reserved)
+            LincolnCinema.release_seats(booking)
 
             new_status = 'Refunded'
             booking.status = new_status
-            FrontDeskStaff.cancel_booking(booking_id, new_status)
+            LincolnCinema.update_status_to_canceled(booking_id, new_status)
 
             # Create a confirmation notification
             confirmation_message = "Your booking has been refunded successffully."
@@ -954,8 +915,10 @@ def staff_select_seats(movie_id, screening_date, start_time):
         customer = LincolnCinema.find_customer(customer_username)
         if not customer_username:
             flash('Please select a Customer', 'error')
+            seat_version, seat_map = screening.seat_snapshot()
             return render_template('staff_select_seats.html', screening=screening, movie=movie,
-                           all_customers_username=all_customers_username)
+                           all_customers_username=all_customers_username,
+                           seat_version=seat_version, seat_map=seat_map)
 
         if not selected_seats:
             flash('Please select at least one seat.', 'error')
@@ -965,11 +928,7 @@ def staff_select_seats(movie_id, screening_date, start_time):
             # Convert the list of dictionaries into a list of lists
             selected_seats_id_list = [str(seat['rowNumber'])+str(seat['seatNumber']) for seat in selected_seats]
             # get seat objects
-            seat_objects = []
-            for seat in screening.seats:
-                for seat_id in selected_seats_id_list:
-                    if seat.seat_id == seat_id:
-                        seat_objects.append(seat)
+            seat_objects = screening.find_seats(selected_seats_id_list)
             num_of_seats = len(seat_objects)
             # caculate total_price
             total_price = 0
@@ -979,17 +938,50 @@ def staff_select_seats(movie_id, screening_date, start_time):
             payment_method = 'Unpaid'
             # create book object
             new_booking = Booking(customer, movie, screening, num_of_seats, seat_objects, current_date, total_price, status, payment_method)
-            is_booking_repeated = customer.add_booking(new_booking)
+            # Hold the selected seats for the payment, unless someone else has taken or is holding them
+            # Seats chosen from an older seat map are accepted as long as they are still free
+            if not LincolnCinema.hold_seats(new_booking, expected_version=request.form.get('seat_version', type=int)):
+                flash('Seats have become unavailable. Please choose your seats again.', 'error')
+                return redirect(url_for('views.staff_select_seats', movie_id=movie_id, screening_date = screening_date,start_time=start_time ))
+            is_booking_repeated = LincolnCinema.add_booking(customer, new_booking)
             if is_booking_repeated:
                 Booking.save_new_bookings_to_json(new_booking)
             else:
+                LincolnCinema.release_hold(new_booking)
                 flash(f'{customer.name} have unpaid booking for this screening', 'error')
                 return redirect(url_for('views.staff_select_seats', movie_id=movie_id, screening_date = screening_date,start_time=start_time ))                
             return render_template('staff_checkout.html', booking=new_booking)
 
-    # Pass the screening object to the seat selection page
+    # Pass the screening object and a consistent seat map with its version to the seat selection page
+    seat_version, seat_map = screening.seat_snapshot()
     return render_template('staff_select_seats.html', screening=screening, movie=movie,
-                           all_customers_username=all_customers_username)
+                           all_customers_username=all_customers_username,
+                           seat_version=seat_version, seat_map=seat_map)
+
+
+# Route for staff to find the best available block of adjacent seats for a group booking
+@views.route('/staff_best_available_seats/<screening_id>')
+def staff_best_available_seats(screening_id):
+    if not isinstance(g.user, FrontDeskStaff):
+        abort(403)
+    screening = LincolnCinema.find_screening(screening_id)
+    if screening is None:
+        abort(404)
+    count = request.args.get('count', type=int)
+    position = request.args.get('position', 'centre')
+    if not count or count < 1 or position not in Screening.SEAT_POSITIONS:
+        return jsonify(error='Please enter the number of seats.'), 400
+    seat_version, seat_ids = LincolnCinema.best_available_seats(screening, count, position,
+                                                                request.args.get('row_from', type=int),
+                                                                request.args.get('row_to', type=int))
+    seats = []
+    for seat_id in seat_ids:
+        row_number, seat_number = screening.layout.coordinates(screening.layout.position(seat_id))
+        # Strings, like the data attributes of the seat map
+        seats.append({'rowNumber': str(row_number), 'seatNumber': str(seat_number)})
+    if not seats:
+        return jsonify(error=f'There are no {count} adjacent seats available.', seats=[], seat_version=seat_version)
+    return jsonify(seats=seats, seat_version=seat_version)
 
 
 # Route for staff to validate a coupon during checkout
@@ -1034,6 +1026,7 @@ def staff_cancel_booking(booking_id, username):
     customer = LincolnCinema.find_customer(username)
     booking = customer.find_booking(booking_id)
     customer.cancel_booking(booking_id)
+    LincolnCinema.release_hold(booking)
     bookings = customer.bookings()
     new_status = 'Canceled'
     LincolnCinema.update_status_to_canceled(booking_id, new_status)
@@ -1080,16 +1073,15 @@ def staff_cash_payment(booking_id, username):
     coupon = booking.coupon
     if request.method == 'POST':
         amount = request.form.get('amount')
-        is_seats_available = LincolnCinema.check_seat_availability(booking)
         
         if float(amount) == booking.total_amount:
-            if is_seats_available == True: 
+            # Reserve the seats atomically before marking the booking as paid
+            if LincolnCinema.reserve_seats(booking): 
                 new_status = 'Paid'
                 booking.status = new_status
                 payment_method = 'Cash'
                 booking.payment_method = payment_method
                 LincolnCinema.update_booking_payment_method(booking_id, payment_method, new_status)
-                LincolnCinema.reserve_seats(booking)
 
             else:
                 flash('Seats have become unavailable. Please cancel booking and start a new booking again.', 'error')
@@ -1111,10 +1103,9 @@ def staff_debit_card_payment(booking_id, username):
     booking = customer.find_booking(int(booking_id))
     coupon = booking.coupon
     amount = request.form.get('amount')
-    is_seats_available = LincolnCinema.check_seat_availability(booking)
     if float(amount) == booking.total_amount:
-        if is_seats_available == True: 
-            LincolnCinema.reserve_seats(booking)
+        # Reserve the seats atomically before marking the booking as paid
+        if LincolnCinema.reserve_seats(booking): 
             new_status = 'Paid'
             booking.status = new_status
             payment_method = 'Cash'
@@ -1191,6 +1182,10 @@ def staff_credit_card_payment(booking_id, username):
                             name_on_card=card_holder_name
                         )
                         payment_id = credit_card_payment.payment_id
+                        # Reserve the seats atomically before taking the payment, so two buyers cannot pay for the same seat
+                        if not LincolnCinema.reserve_seats(booking):
+                            flash('Seats have become unavailable. Please start a new booking and choose your seats again.', 'error')
+                            return render_template('staff_home.html')
                         # Process the payment (you may add this logic in CreditCard.process_payment)
                         payment_successful = credit_card_payment.process_payment()
                         print(f'new credit card: {credit_card_payment}')         
@@ -1209,11 +1204,11 @@ def staff_credit_card_payment(booking_id, username):
                             payment_method = 'Credit Card'
                             booking.payment_method = payment_method
                             LincolnCinema.update_booking_payment_and_status(booking_id, payment_id, new_status, payment_method)
-                            
-                            LincolnCinema.reserve_seats(booking)
                             # Redirect to a success or confirmation page
                             return redirect(url_for('views.staff_confirm_booking', booking_id=booking_id, username=username))
                         else:
+                            # Hold the seats again for a new lease, so the booking expires if it is not paid in time
+                            LincolnCinema.restore_hold(booking)
                             flash('Payment processing failed. Please verify your payment information and try again. If the issue persists, please contact our customer support for assistance.', 'error')
                     else:
                         flash('Card has expired. Please use a valid card.', 'error')
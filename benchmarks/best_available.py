@@ -0,0 +1,131 @@
+"""! @brief Best Available Seats Benchmark"""
+
+##
+# @file best_available.py
+#
+# @brief Best available block search with free runs versus a seat-by-seat scan
+#
+# @section description_best_available Description
+# Fills a synthetic screening to several occupancy levels with random group bookings and times
+# Screening.best_available, which scores a few blocks of each row's free runs, against a scan
+# that checks every block of every row. Both must pick the same block.
+#
+# The benchmark runs in a temporary directory, so the real data files are untouched.
+#
+# Run from the repository root:
+#     python benchmarks/best_available.py [--rows N] [--seats-per-row N] [--count N]
+
+# Imports
+import argparse
+import base64
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package loads the database from app/database relative to the working
+# directory, so import it from an empty directory to leave the real data files untouched
+with tempfile.TemporaryDirectory() as empty_directory, contextlib.redirect_stdout(io.StringIO()):
+    working_directory = os.getcwd()
+    os.chdir(empty_directory)
+    try:
+        from app.models import Base, CinemaHall, Screening
+        Base.flush_storage()
+    finally:
+        os.chdir(working_directory)
+
+OCCUPANCIES = (0.0, 0.5, 0.8, 0.95)
+
+
+def scan_best_available(screening, count):
+    """! Find the best centre block by checking every block of every row, with the scoring of Screening.best_available.
+    @param screening (Screening): The screening.
+    @param count (int): The number of seats.
+    @return (list): The IDs of the seats of the best block, or an empty list.
+    """
+    layout = screening.layout
+    seats_per_row = layout.seats_per_row
+    _, reserved = screening.seat_snapshot()
+    middle_row = (1 + layout.rows) / 2
+    middle_offset = (seats_per_row - count) / 2
+    best = None
+    for row in range(layout.rows):
+        base = row * seats_per_row
+        for offset in range(seats_per_row - count + 1):
+            if any(reserved[base + offset:base + offset + count]):
+                continue
+            start = offset
+            while start > 0 and not reserved[base + start - 1]:
+                start -= 1
+            end = offset + count
+            while end < seats_per_row and not reserved[base + end]:
+                end += 1
+            single_gaps = (offset - start == 1) + (end - count - offset == 1)
+            score = (abs(row + 1 - middle_row), single_gaps, abs(offset - middle_offset), -row, offset)
+            if best is None or score < best[0]:
+                best = (score, base + offset)
+    if best is None:
+        return []
+    return [layout.seat_id(index) for index in range(best[1], best[1] + count)]
+
+
+def fill(screening, occupancy, generator):
+    """! Reserve random groups of 1 to 6 adjacent seats until a share of the seats is taken.
+    @param screening (Screening): The screening.
+    @param occupancy (float): The share of seats to reserve.
+    @param generator (Random): The random generator.
+    """
+    layout = screening.layout
+    target = int(len(layout) * occupancy)
+    taken = 0
+    while taken < target:
+        size = generator.randint(1, 6)
+        row = generator.randrange(layout.rows)
+        offset = generator.randrange(layout.seats_per_row - size + 1)
+        seat_ids = [layout.seat_id(row * layout.seats_per_row + offset + index) for index in range(size)]
+        if screening.are_seats_free(seat_ids):
+            screening.reserve_seats(seat_ids)
+            taken += size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=40, help="number of rows")
+    parser.add_argument("--seats-per-row", type=int, default=30, help="number of seats in each row")
+    parser.add_argument("--count", type=int, default=4, help="size of the group")
+    parser.add_argument("--repeat", type=int, default=200, help="searches per measurement")
+    args = parser.parse_args()
+
+    generator = random.Random(1)
+    print(f"{args.rows} rows of {args.seats_per_row} seats, groups of {args.count}")
+    print(f"{'occupancy':>9} {'free runs us':>13} {'scan us':>10} {'speed-up':>9}")
+    for occupancy in OCCUPANCIES:
+        seat_state = {
+            "rows": args.rows,
+            "seats_per_row": args.seats_per_row,
+            "reserved": base64.b64encode(bytes((args.rows * args.seats_per_row + 7) // 8)).decode("ascii"),
+            "price_tiers": [10.0],
+        }
+        hall = CinemaHall("Hall 1", args.rows * args.seats_per_row)
+        screening = Screening(100, "2023-12-10", "13:50", "16:00", hall, seat_state)
+        fill(screening, occupancy, generator)
+        assert screening.best_available(args.count)[1] == scan_best_available(screening, args.count)
+
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            screening.best_available(args.count)
+        runs_seconds = (time.perf_counter() - start_time) / args.repeat
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            scan_best_available(screening, args.count)
+        scan_seconds = (time.perf_counter() - start_time) / args.repeat
+        print(f"{occupancy:>9.0%} {runs_seconds * 1e6:>13.1f} {scan_seconds * 1e6:>10.1f} {scan_seconds / runs_seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""! @brief Model Memory Report"""
+
+##
+# @file memory_report.py
+#
+# @brief Memory used per model object on a synthetic data set
+#
+# @section description_memory_report Description
+# Builds a synthetic cinema (screenings with their hall seats, bookings, notifications
+# and credit card payments) with the models in app/models.py and reports, for each model,
+# the bytes allocated per object as measured by tracemalloc, the size of the instance
+# itself (the object plus its attribute dictionary, if it has one) and the time taken to
+# create the objects.
+#
+# Run from the repository root:
+#     python benchmarks/memory_report.py [--screenings N] [--bookings N]
+
+# Imports
+from datetime import date, datetime
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package loads the database from app/database relative to the working
+# directory, so import it from an empty directory to leave the real data files untouched
+with tempfile.TemporaryDirectory() as empty_directory, contextlib.redirect_stdout(io.StringIO()):
+    working_directory = os.getcwd()
+    os.chdir(empty_directory)
+    try:
+        from app.models import (Base, Booking, CinemaHall, CinemaHallSeat, CreditCard, Customer, Movie,
+                                Notification, Screening)
+        Base.flush_storage()
+    finally:
+        os.chdir(working_directory)
+
+
+def instance_size(obj):
+    """! Get the size of an object and its attribute dictionary, if it has one.
+    @param obj (object): The object to measure.
+    @return (int): The size in bytes.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def measure(label, count, create):
+    """! Measure the memory allocated while creating objects.
+    @param label (str): The name of the model.
+    @param count (int): The number of objects created.
+    @param create (callable): Creates the objects and returns them.
+    @return (tuple): The objects created and a report row (label, count, bytes per object, instance bytes, seconds).
+    """
+    # Time the creation without tracemalloc, which slows allocation down
+    gc.collect()
+    start_time = time.perf_counter()
+    create()
+    seconds = time.perf_counter() - start_time
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    sample = objects[0] if objects else None
+    instance_bytes = instance_size(sample) if sample is not None else 0
+    return objects, (label, count, (after - before) / max(count, 1), instance_bytes, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--screenings", type=int, default=1000, help="number of screenings (120 seats each)")
+    parser.add_argument("--bookings", type=int, default=20000, help="number of bookings, payments and notifications")
+    args = parser.parse_args()
+
+    hall = CinemaHall("Hall 1", 120)
+    movie = Movie("Synthetic", "English", "Drama", "New Zealand", date(2023, 1, 1), 120, "A synthetic movie")
+    customer = Customer("Synthetic Customer", "1 Main Road", "customer@example.com", "0210000000", "synthetic", "password")
+
+    rows = []
+
+    def create_seats():
+        return [CinemaHallSeat(seat_number, row_number, False, 10.0)
+                for row_number in range(1, 13) for seat_number in range(1, 11)]
+    _, row = measure("CinemaHallSeat", 120, create_seats)
+    rows.append(row)
+
+    # Screenings as loaded from their shards, including everything that holds their seats
+    seat_state = CinemaHallSeat.pack_seats([seat.to_json() for seat in create_seats()], hall.hall_name)
+    def create_screenings():
+        return [Screening(movie.id, "2023-12-10", "13:50", "16:00", hall, seat_state) for _ in range(args.screenings)]
+    screenings, row = measure("Screening (incl. 120 seats)", args.screenings, create_screenings)
+    rows.append(row)
+
+    def create_payments():
+        return [CreditCard(index, 20.0, datetime(2023, 12, 1, 10, 0), None, "1111222233334444", "Visa",
+                           datetime(2030, 12, 1), "Synthetic Customer") for index in range(args.bookings)]
+    payments, row = measure("CreditCard", args.bookings, create_payments)
+    rows.append(row)
+
+    selected_seats = [screening.find_seats(["11", "12"]) for screening in screenings]
+    def create_bookings():
+        return [Booking(customer, movie, screenings[index % len(screenings)], 2,
+                        selected_seats[index % len(screenings)], date(2023, 12, 1), 20.0, "Paid", "Credit Card",
+                        payments[index]) for index in range(args.bookings)]
+    bookings, row = measure("Booking", args.bookings, create_bookings)
+    rows.append(row)
+
+    def create_notifications():
+        return [Notification(customer, "Booking Confirmation", "Your booking has been confirmed.",
+                             datetime(2023, 12, 1, 10, 0), bookings[index]) for index in range(args.bookings)]
+    notifications, row = measure("Notification", args.bookings, create_notifications)
+    rows.append(row)
+
+    print(f"{'model':32} {'objects':>10} {'bytes/object':>14} {'instance bytes':>16} {'create ms':>10}")
+    for label, count, bytes_per_object, instance_bytes, seconds in rows:
+        print(f"{label:32} {count:>10} {bytes_per_object:>14.1f} {instance_bytes:>16} {seconds * 1000:>10.1f}")
+    total = sum(count * bytes_per_object for _, count, bytes_per_object, _, _ in rows[1:])
+    print(f"{'total (without the seat sample)':32} {'':>10} {total / (1 << 20):>11.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
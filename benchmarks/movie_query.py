@@ -0,0 +1,122 @@
+"""! @brief Movie Query Benchmark"""
+
+##
+# @file movie_query.py
+#
+# @brief Combined movie filter latency on a synthetic catalogue
+#
+# @section description_movie_query Description
+# Builds a synthetic catalogue of movies (several languages and genres, release dates over
+# thirty years, a tenth of them archived), indexes it with the MovieCatalogue from
+# app/catalogue.py and reports the median latency of combined filter queries, next to the
+# chained linear passes of the Base.search_movie_* methods.
+#
+# Run from the repository root:
+#     python benchmarks/movie_query.py [--movies N]
+
+# Imports
+from datetime import date, timedelta
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package loads the database from app/database relative to the working
+# directory, so import it from an empty directory to leave the real data files untouched
+with tempfile.TemporaryDirectory() as empty_directory, contextlib.redirect_stdout(io.StringIO()):
+    working_directory = os.getcwd()
+    os.chdir(empty_directory)
+    try:
+        from app.models import Base, Movie
+        from app.catalogue import MovieCatalogue
+        Base.flush_storage()
+    finally:
+        os.chdir(working_directory)
+
+WORDS = ["the", "last", "night", "king", "monkey", "legend", "butterfly", "return", "dark", "star",
+         "river", "city", "ghost", "summer", "winter", "secret", "garden", "eras", "tour", "dragon"]
+LANGUAGES = ["English", "Mandarin", "Spanish", "French", "Hindi", "Japanese", "Korean", "Maori"]
+GENRES = ["Action", "Drama", "Comedy", "Animation", "Horror", "Documentary", "Romance", "Thriller"]
+
+# (label, title, language, genre, date from, date to)
+QUERIES = [
+    ("language", None, "Maori", None, None, None),
+    ("language + genre", None, "English", "Drama", None, None),
+    ("one week", None, None, None, "2010-03-01", "2010-03-07"),
+    ("title + genre", "dragon", None, "Horror", None, None),
+    ("all criteria", "the", "English", "Action", "2000-01-01", "2005-12-31"),
+]
+
+
+def timed(function, repeat):
+    """! Time a function.
+    @param function (callable): The function to time.
+    @param repeat (int): The number of calls.
+    @return (tuple): The median time of a call in milliseconds and the last result.
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(times), result
+
+
+def scan(movies, title, language, genre, date_from, date_to):
+    """! Filter movies with the chained linear passes used before the catalogue indexes.
+    @return (list): The matching movies.
+    """
+    if title:
+        movies = Base.search_movie_title(title, movies)
+    if language:
+        movies = Base.search_movie_lang(language, movies)
+    if genre:
+        movies = Base.search_movie_genre(genre, movies)
+    if date_from and date_to:
+        movies = Base.search_movie_date(date_from, date_to, movies)
+    return movies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movies", type=int, default=50000, help="number of movies in the catalogue")
+    parser.add_argument("--repeat", type=int, default=20, help="number of runs of each query")
+    args = parser.parse_args()
+
+    generator = random.Random(1)
+    movies = []
+    for _ in range(args.movies):
+        title = " ".join(generator.choice(WORDS) for _ in range(generator.randint(1, 4))).upper()
+        release_date = (date(1994, 1, 1) + timedelta(days=generator.randrange(30 * 365))).isoformat()
+        movie = Movie(title, generator.choice(LANGUAGES), generator.choice(GENRES), "New Zealand",
+                      release_date, 120, "")
+        if generator.random() < 0.1:
+            movie.deactivate()
+        movies.append(movie)
+
+    catalogue = MovieCatalogue()
+    start_time = time.perf_counter()
+    for movie in movies:
+        catalogue.add(movie)
+    print(f"indexed {len(catalogue)} movies in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+    print(f"{'query':18} {'results':>8} {'query ms':>9} {'page of 20':>11} {'by date':>8} {'scan ms':>8}")
+    for label, title, language, genre, date_from, date_to in QUERIES:
+        criteria = dict(title=title, language=language, genre=genre, date_from=date_from, date_to=date_to)
+        median, results = timed(lambda: catalogue.query(**criteria), args.repeat)
+        page, _ = timed(lambda: catalogue.query(**criteria, offset=20, limit=20), args.repeat)
+        by_date, _ = timed(lambda: catalogue.query(**criteria, sort="release_date", limit=20), args.repeat)
+        linear, expected = timed(lambda: scan(movies, title, language, genre, date_from, date_to), args.repeat)
+        assert len(results) == len(expected), label
+        print(f"{label:18} {len(results):>8} {median:>9.3f} {page:>11.3f} {by_date:>8.3f} {linear:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
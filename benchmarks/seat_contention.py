@@ -0,0 +1,157 @@
+"""! @brief Seat Contention Benchmark"""
+
+##
+# @file seat_contention.py
+#
+# @brief Concurrent seat reservation correctness and throughput
+#
+# @section description_seat_contention Description
+# Starts many threads (64 by default) that keep trying to book random groups of seats of a
+# few synthetic screenings until every seat is sold, and reports for each reservation mode
+# the number of attempts per second and the number of seats sold more than once:
+#
+# - "per-screening": CinemaController.try_reserve, which checks and reserves under the lock
+#   of the screening.
+# - "global lock": the same check and reservation under one lock shared by all screenings.
+# - "unchecked": the previous two-step flow, check_seat_availability and later reserve_seats
+#   with no lock in between, which can sell a seat twice.
+#
+# Saving the seat state is slowed down by --write-ms to model a synchronous write of the seat
+# shard (see CINEMA_SYNCHRONOUS_WRITES); it happens while the reservation lock is held.
+#
+# The benchmark runs in a temporary directory, so the real data files are untouched.
+#
+# Run from the repository root:
+#     python benchmarks/seat_contention.py [--threads N] [--screenings N]
+
+# Imports
+from datetime import date
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package loads the database from app/database relative to the working
+# directory, so import it from an empty directory to leave the real data files untouched
+with tempfile.TemporaryDirectory() as empty_directory, contextlib.redirect_stdout(io.StringIO()):
+    working_directory = os.getcwd()
+    os.chdir(empty_directory)
+    try:
+        from app.controller import CinemaController
+        from app.models import Base, CinemaHall, CinemaHallSeat, Movie, Screening
+        Base.flush_storage()
+    finally:
+        os.chdir(working_directory)
+
+MODES = ("per-screening", "global lock", "unchecked")
+
+
+def run(mode, args):
+    """! Sell all seats of a set of screenings with concurrent threads.
+    @param mode (str): One of MODES.
+    @param args (Namespace): The command line arguments.
+    @return (tuple): The number of attempts, the elapsed seconds, the number of seats sold and the number sold more than once.
+    """
+    controller = CinemaController()
+    hall = CinemaHall("Hall 1", 120)
+    movie = Movie("Synthetic", "English", "Drama", "New Zealand", date(2023, 1, 1), 120, "")
+    controller.add_movie(movie)
+    screenings = []
+    for _ in range(args.screenings):
+        screening = Screening(movie.id, "2023-12-10", "13:50", "16:00", hall, CinemaHallSeat.initialise_seats(hall, 10.0))
+        controller.add_screening(movie, screening)
+        Screening.save_new_screening_to_json(screening)
+        screenings.append(screening)
+    seat_ids = {screening.screening_id: [seat.seat_id for seat in screening.seats] for screening in screenings}
+
+    global_lock = threading.Lock()
+    sold = {screening.screening_id: [] for screening in screenings}
+    sold_lock = threading.Lock()
+    attempts = [0] * args.threads
+    start_barrier = threading.Barrier(args.threads)
+
+    def reserve(screening, wanted):
+        if mode == "per-screening":
+            return controller.try_reserve(screening, wanted)
+        if mode == "global lock":
+            with global_lock:
+                if not screening.are_seats_free(wanted):
+                    return False
+                Screening.update_reserved_seats_to_json(screening.screening_id, screening.reserve_seats(wanted), True)
+                return True
+        if not screening.are_seats_free(wanted):
+            return False
+        time.sleep(0)  # the payment happens between the check and the reservation
+        Screening.update_reserved_seats_to_json(screening.screening_id, screening.reserve_seats(wanted), True)
+        return True
+
+    def buyer(number):
+        generator = random.Random(number)
+        open_screenings = list(screenings)
+        start_barrier.wait()
+        while open_screenings:
+            screening = generator.choice(open_screenings)
+            # Pick from the seats shown as free, which other buyers may take before this one confirms
+            free_seats = [seat_id for index, seat_id in enumerate(seat_ids[screening.screening_id])
+                          if not screening.is_seat_reserved(index)]
+            if not free_seats:
+                open_screenings.remove(screening)
+                continue
+            wanted = generator.sample(free_seats, min(len(free_seats), generator.randint(1, 4)))
+            attempts[number] += 1
+            if reserve(screening, wanted):
+                with sold_lock:
+                    sold[screening.screening_id].extend(wanted)
+
+    threads = [threading.Thread(target=buyer, args=(number,)) for number in range(args.threads)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start_time
+
+    seats_sold = sum(len(seats) for seats in sold.values())
+    oversold = sum(len(seats) - len(set(seats)) for seats in sold.values())
+    return sum(attempts), seconds, seats_sold, oversold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=64, help="number of concurrent buyers")
+    parser.add_argument("--screenings", type=int, default=16, help="number of screenings (120 seats each)")
+    parser.add_argument("--write-ms", type=float, default=0.5, help="time to save the seat state of a screening")
+    parser.add_argument("--switch-interval", type=float, default=1e-6,
+                        help="interpreter thread switch interval in seconds (small values provoke races)")
+    args = parser.parse_args()
+    sys.setswitchinterval(args.switch_interval)
+
+    save_seats = Screening.update_reserved_seats_to_json
+    def slow_save_seats(screening_id, seat_ids, is_reserved):
+        time.sleep(args.write_ms / 1000)
+        save_seats(screening_id, seat_ids, is_reserved)
+    Screening.update_reserved_seats_to_json = slow_save_seats
+
+    with tempfile.TemporaryDirectory() as data_directory, contextlib.redirect_stdout(io.StringIO()):
+        os.chdir(data_directory)
+        try:
+            rows = [(mode,) + run(mode, args) for mode in MODES]
+            Base.flush_storage()
+        finally:
+            os.chdir(working_directory)
+
+    print(f"{args.threads} threads, {args.screenings} screenings of 120 seats, {args.write_ms} ms per seat state write")
+    print(f"{'mode':14} {'attempts':>9} {'attempts/s':>11} {'seats sold':>11} {'oversold':>9}")
+    for mode, attempts, seconds, seats_sold, oversold in rows:
+        print(f"{mode:14} {attempts:>9} {attempts / seconds:>11.0f} {seats_sold:>11} {oversold:>9}")
+
+
+if __name__ == "__main__":
+    main()
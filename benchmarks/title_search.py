@@ -0,0 +1,94 @@
+"""! @brief Title Search Benchmark"""
+
+##
+# @file title_search.py
+#
+# @brief Title search latency on a synthetic catalogue
+#
+# @section description_title_search Description
+# Builds a synthetic catalogue of movies (a tenth of them archived), indexes it with the
+# TitleSearchIndex from app/search.py and reports the median and worst latency of a set of
+# queries, next to the linear scan of Base.search_movie_title.
+#
+# Run from the repository root:
+#     python benchmarks/title_search.py [--movies N]
+
+# Imports
+from datetime import date
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package loads the database from app/database relative to the working
+# directory, so import it from an empty directory to leave the real data files untouched
+with tempfile.TemporaryDirectory() as empty_directory, contextlib.redirect_stdout(io.StringIO()):
+    working_directory = os.getcwd()
+    os.chdir(empty_directory)
+    try:
+        from app.models import Base, Movie
+        from app.search import TitleSearchIndex
+        Base.flush_storage()
+    finally:
+        os.chdir(working_directory)
+
+WORDS = ["the", "last", "night", "king", "monkey", "legend", "butterfly", "return", "dark", "star",
+         "river", "city", "ghost", "summer", "winter", "secret", "garden", "eras", "tour", "dragon",
+         "island", "journey", "shadow", "empire", "dream", "storm", "silent", "golden", "road", "home"]
+
+QUERIES = ["the", "ki", "dragon", "night king", "secret garden", "xyz", "s", "golden road home"]
+
+
+def timed(function, repeat):
+    """! Time a function.
+    @param function (callable): The function to time.
+    @param repeat (int): The number of calls.
+    @return (tuple): The median and the worst time of a call in milliseconds, and the last result.
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(times), max(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movies", type=int, default=50000, help="number of movies in the catalogue")
+    parser.add_argument("--repeat", type=int, default=20, help="number of runs of each query")
+    args = parser.parse_args()
+
+    generator = random.Random(1)
+    movies = []
+    for _ in range(args.movies):
+        title = " ".join(generator.choice(WORDS) for _ in range(generator.randint(1, 4))).upper()
+        movie = Movie(title, "English", "Drama", "New Zealand", date(2023, 1, 1), 120, "")
+        if generator.random() < 0.1:
+            movie.deactivate()
+        movies.append(movie)
+
+    index = TitleSearchIndex()
+    start_time = time.perf_counter()
+    for movie in movies:
+        index.add(movie)
+    print(f"indexed {len(index)} titles in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+    print(f"{'query':20} {'results':>8} {'index ms':>9} {'worst':>7} {'limit 20':>9} {'active':>7} {'scan ms':>8}")
+    for query in QUERIES:
+        median, worst, results = timed(lambda: index.search(query), args.repeat)
+        limited, _, _ = timed(lambda: index.search(query, limit=20), args.repeat)
+        active, _, _ = timed(lambda: index.search(query, active_only=True, limit=20), args.repeat)
+        scan, _, _ = timed(lambda: Base.search_movie_title(query, movies), args.repeat)
+        print(f"{query:20} {len(results):>8} {median:>9.3f} {worst:>7.3f} {limited:>9.3f} {active:>7.3f} {scan:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
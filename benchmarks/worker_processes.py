@@ -0,0 +1,194 @@
+"""! @brief Worker Processes Benchmark"""
+
+##
+# @file worker_processes.py
+#
+# @brief Seat reservations from several worker processes sharing the seat state
+#
+# @section description_worker_processes Description
+# Starts 1, 2 and 4 worker processes (by default) that share the seat state of a few synthetic
+# screenings through one SQLite database (see SharedSeatState), each with several buyer threads
+# that keep trying to book random groups of seats until every seat is sold. Before each attempt
+# a buyer picks up the other workers' changes with CinemaController.sync_shared_state, as the
+# app does before every request, and chooses from the seats its own copy shows as free.
+#
+# For each number of processes it reports the attempts per second and the number of seats sold
+# more than once, which must be 0. It also reports the cost of sync_shared_state when no other
+# process has changed anything, which every request pays.
+#
+# The benchmark runs in a temporary directory, so the real data files are untouched.
+#
+# Run from the repository root:
+#     python benchmarks/worker_processes.py [--processes 1 2 4] [--threads N] [--screenings N]
+
+# Imports
+from datetime import date
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package loads the database from app/database relative to the working
+# directory, so import it from an empty directory to leave the real data files untouched
+with tempfile.TemporaryDirectory() as empty_directory, contextlib.redirect_stdout(io.StringIO()):
+    working_directory = os.getcwd()
+    os.chdir(empty_directory)
+    try:
+        from app.controller import CinemaController
+        from app.models import Base, CinemaHall, CinemaHallSeat, Movie, Screening
+        from app.shared import SharedSeatState
+        from app.storage import SQLiteStorage
+        Base.flush_storage()
+    finally:
+        os.chdir(working_directory)
+
+DATABASE_FILENAME = "cinema.db"
+
+
+def build_controller(screening_count):
+    """! Create the same synthetic movie and screenings in every process, so that their IDs match.
+    @param screening_count (int): The number of screenings.
+    @return (tuple): The controller and its screenings.
+    """
+    Movie.next_id = Screening.next_id = 100
+    controller = CinemaController()
+    hall = CinemaHall("Hall 1", 120)
+    movie = Movie("Synthetic", "English", "Drama", "New Zealand", date(2023, 1, 1), 120, "")
+    controller.add_movie(movie)
+    screenings = []
+    for _ in range(screening_count):
+        screening = Screening(movie.id, "2023-12-10", "13:50", "16:00", hall, CinemaHallSeat.initialise_seats(hall, 10.0))
+        controller.add_screening(movie, screening)
+        screenings.append(screening)
+    return controller, screenings
+
+
+def worker(data_directory, args, ready, start_event, results):
+    """! Sell seats from one worker process with several buyer threads.
+    @param data_directory (str): The directory of the shared database.
+    @param args (Namespace): The command line arguments.
+    @param ready (Queue): Receives None once the process has loaded its data.
+    @param start_event (Event): Set when all processes are ready.
+    @param results (Queue): Receives the number of attempts and the sold (screening ID, seat ID) pairs.
+    """
+    os.chdir(data_directory)
+    with contextlib.redirect_stdout(io.StringIO()):
+        Base.use_storage(SQLiteStorage(DATABASE_FILENAME, log_changes=True))
+        controller, screenings = build_controller(args.screenings)
+        controller.use_shared_state(SharedSeatState(DATABASE_FILENAME))
+    seat_ids = [seat.seat_id for seat in screenings[0].seats]
+    attempts = [0] * args.threads
+    sold = []
+    sold_lock = threading.Lock()
+
+    def buyer(number):
+        generator = random.Random(os.getpid() * 1000 + number)
+        open_screenings = list(screenings)
+        start_event.wait()
+        while open_screenings:
+            controller.sync_shared_state()
+            screening = generator.choice(open_screenings)
+            free_seats = [seat_id for index, seat_id in enumerate(seat_ids) if not screening.is_seat_reserved(index)]
+            if not free_seats:
+                open_screenings.remove(screening)
+                continue
+            wanted = generator.sample(free_seats, min(len(free_seats), generator.randint(1, 4)))
+            attempts[number] += 1
+            if controller.try_reserve(screening, wanted):
+                with sold_lock:
+                    sold.extend((screening.screening_id, seat_id) for seat_id in wanted)
+
+    threads = [threading.Thread(target=buyer, args=(number,)) for number in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    ready.put(None)
+    for thread in threads:
+        thread.join()
+    results.put((sum(attempts), sold))
+
+
+def run(process_count, args):
+    """! Sell all seats of a set of screenings from several worker processes.
+    @param process_count (int): The number of worker processes.
+    @param args (Namespace): The command line arguments.
+    @return (tuple): The number of attempts, the elapsed seconds, the number of seats sold and the number sold more than once.
+    """
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as data_directory:
+        os.chdir(data_directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                # The seat shards are created once, as the admin adding the screenings would
+                Base.use_storage(SQLiteStorage(DATABASE_FILENAME, log_changes=True))
+                for screening in build_controller(args.screenings)[1]:
+                    Screening.save_new_screening_to_json(screening)
+        finally:
+            os.chdir(working_directory)
+        ready = context.Queue()
+        start_event = context.Event()
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(data_directory, args, ready, start_event, results))
+                     for _ in range(process_count)]
+        for process in processes:
+            process.start()
+        # Start the clock once every process has loaded its data
+        for _ in processes:
+            ready.get()
+        start_time = time.perf_counter()
+        start_event.set()
+        outcomes = [results.get() for _ in processes]
+        seconds = time.perf_counter() - start_time
+        for process in processes:
+            process.join()
+
+    sold = [pair for _, pairs in outcomes for pair in pairs]
+    return sum(attempts for attempts, _ in outcomes), seconds, len(sold), len(sold) - len(set(sold))
+
+
+def sync_cost(args):
+    """! Measure sync_shared_state when no other process has changed anything.
+    @param args (Namespace): The command line arguments.
+    @return (float): The microseconds per call.
+    """
+    with tempfile.TemporaryDirectory() as data_directory:
+        os.chdir(data_directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                Base.use_storage(SQLiteStorage(DATABASE_FILENAME, log_changes=True))
+                controller, _ = build_controller(args.screenings)
+                controller.use_shared_state(SharedSeatState(DATABASE_FILENAME))
+            controller.sync_shared_state()
+            calls = 20000
+            start_time = time.perf_counter()
+            for _ in range(calls):
+                controller.sync_shared_state()
+            return (time.perf_counter() - start_time) / calls * 1e6
+        finally:
+            os.chdir(working_directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="numbers of worker processes to run")
+    parser.add_argument("--threads", type=int, default=4, help="buyer threads per process")
+    parser.add_argument("--screenings", type=int, default=16, help="number of screenings (120 seats each)")
+    args = parser.parse_args()
+
+    rows = [(process_count,) + run(process_count, args) for process_count in args.processes]
+    print(f"{args.screenings} screenings of 120 seats, {args.threads} buyer threads per process")
+    print(f"{'processes':>9} {'attempts':>9} {'attempts/s':>11} {'seats sold':>11} {'oversold':>9}")
+    for process_count, attempts, seconds, seats_sold, oversold in rows:
+        print(f"{process_count:>9} {attempts:>9} {attempts / seconds:>11.0f} {seats_sold:>11} {oversold:>9}")
+    print(f"sync_shared_state with no changes: {sync_cost(args):.1f} us per call")
+
+
+if __name__ == "__main__":
+    main()